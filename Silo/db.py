@@ -0,0 +1,152 @@
+import functools
+import inspect
+import random
+from contextvars import ContextVar
+from pathlib import Path
+from django.db import DEFAULT_DB_ALIAS, connections
+from config import Config
+
+
+# Database settings from Config, so the same code runs on one node with SQLite and
+# on PostgreSQL with a pool and read replicas.
+#
+# SQLite runs in WAL mode, where readers don't wait for the writer, with
+# synchronous=NORMAL (a crash can lose the last transactions but never corrupts the
+# file), a busy timeout instead of immediate "database is locked" errors, and
+# memory-mapped reads. Transactions take the write lock when they begin: one that
+# reads first and writes later can't be failed by another writer in between.
+#
+# PostgreSQL keeps connections open between requests (DB_CONN_MAX_AGE) or, with
+# DB_POOL, borrows them from a psycopg pool per request. DB_REPLICA_HOSTS adds read
+# replicas, used by views marked with @replica_reads.
+
+
+def _sqlite(base_dir: Path) -> dict:
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={Config.DB_SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={Config.DB_SQLITE_BUSY_TIMEOUT}",
+        f"PRAGMA mmap_size={Config.DB_SQLITE_MMAP_SIZE}",
+    ]
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": Config.DB_NAME or base_dir / "db.sqlite3",
+        "CONN_MAX_AGE": Config.DB_CONN_MAX_AGE,
+        "OPTIONS": {
+            "init_command": ";".join(pragmas),
+            "transaction_mode": "IMMEDIATE",
+        },
+    }
+
+
+def _postgres(host: str) -> dict:
+    options: dict = {}
+    if Config.DB_POOL:
+        options["pool"] = {
+            "min_size": Config.DB_POOL_MIN_SIZE,
+            "max_size": Config.DB_POOL_MAX_SIZE,
+        }
+    return {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": Config.DB_NAME or "silo",
+        "USER": Config.DB_USER,
+        "PASSWORD": Config.DB_PASSWORD,
+        "HOST": host,
+        "PORT": Config.DB_PORT,
+        # pooled connections go back to the pool after each request instead
+        "CONN_MAX_AGE": 0 if Config.DB_POOL else Config.DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": options,
+    }
+
+
+def databases(base_dir: Path) -> dict[str, dict]:
+    if Config.DB_ENGINE == "sqlite":
+        return {"default": _sqlite(base_dir)}
+    if Config.DB_ENGINE != "postgres":
+        raise ValueError(
+            f"Unknown DB_ENGINE {Config.DB_ENGINE!r}, expected sqlite or postgres"
+        )
+    configured = {"default": _postgres(Config.DB_HOST)}
+    for i, host in enumerate(Config.DB_REPLICA_HOSTS):
+        # tests run the replicas against the test database
+        configured[f"replica_{i}"] = {**_postgres(host), "TEST": {"MIRROR": "default"}}
+    return configured
+
+
+_replica_reads: ContextVar[bool] = ContextVar("silo_replica_reads", default=False)
+
+
+# Marks a view method read-only, its queries may go to a replica. Writes still go to
+# the primary, and so do reads inside a transaction. Put it on the handler (get,
+# post...) rather than the view, authentication runs before it and may create the
+# user's profile, which a lagging replica wouldn't show yet. Handlers reading what
+# the same client may have just written use first_or_primary, or stay unmarked.
+def replica_reads(method):
+    if inspect.iscoroutinefunction(method):
+
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            token = _replica_reads.set(True)
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        token = _replica_reads.set(True)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+
+    return wrapper
+
+
+# A replica may not have a row written a moment ago, a file downloaded right after
+# its upload was confirmed: a row the replica doesn't have is looked for again on
+# the primary.
+def first_or_primary(queryset):
+    row = queryset.first()
+    if row is None and queryset.db != DEFAULT_DB_ALIAS:
+        row = queryset.using(DEFAULT_DB_ALIAS).first()
+    return row
+
+
+async def afirst_or_primary(queryset):
+    row = await queryset.afirst()
+    if row is None and queryset.db != DEFAULT_DB_ALIAS:
+        row = await queryset.using(DEFAULT_DB_ALIAS).afirst()
+    return row
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.replicas: list[str] = [
+            alias for alias in connections.settings if alias.startswith("replica_")
+        ]
+
+    def db_for_read(self, model, **hints) -> str | None:
+        # related rows come from where their instance was read
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if (
+            not self.replicas
+            or not _replica_reads.get()
+            or connections["default"].in_atomic_block
+        ):
+            return None
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints) -> str | None:
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool | None:
+        return True  # replicas hold the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> bool | None:
+        return db == "default"
@@ -0,0 +1,240 @@
+import bisect
+import hmac
+import ipaddress
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.decorators import sync_and_async_middleware
+from config import Config
+
+
+# Request metrics kept in process and served in Prometheus text format at /metrics:
+# latency per view, queries per request, and time spent per query and in each
+# dependency (JWT verification, JWKS fetches, object-store calls, presigning,
+# access-log writes). Recording one value is a bisect and a few additions under a
+# lock. Each worker process keeps its own numbers, scrape every worker.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], buckets: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., count above the last, sum]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1)
+                series.append(0)
+            series[index] += 1
+            series[-1] += value
+
+    # (number of observations, their sum) per label values
+    def totals(self) -> dict[tuple, tuple[int, float]]:
+        with self._lock:
+            return {
+                labels: (sum(series[:-1]), series[-1])
+                for labels, series in self._series.items()
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> list[str]:
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(snapshot.items()):
+            labels = ",".join(
+                f'{name}="{_escape(value)}"'
+                for name, value in zip(self.labels, label_values)
+            )
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-1]}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_seconds = Histogram(
+    "silo_request_duration_seconds",
+    "Time to produce a response, per view",
+    ("view", "method", "status"),
+    LATENCY_BUCKETS,
+)
+request_queries = Histogram(
+    "silo_request_queries",
+    "Database queries made by a request, per view",
+    ("view",),
+    COUNT_BUCKETS,
+)
+query_seconds = Histogram(
+    "silo_db_query_duration_seconds",
+    "Time per database query",
+    ("database",),
+    LATENCY_BUCKETS,
+)
+dependency_seconds = Histogram(
+    "silo_dependency_duration_seconds",
+    "Time per call to a dependency",
+    ("dependency", "operation"),
+    LATENCY_BUCKETS,
+)
+histograms: list[Histogram] = [
+    request_seconds,
+    request_queries,
+    query_seconds,
+    dependency_seconds,
+]
+
+
+# Times a block as a call to `dependency`:
+#     with metrics.timed("s3", "stat_object"):
+class timed:
+    __slots__ = ("dependency", "operation", "started")
+
+    def __init__(self, dependency: str, operation: str = ""):
+        self.dependency = dependency
+        self.operation = operation
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        if Config.METRICS_ENABLED:
+            dependency_seconds.observe(
+                time.perf_counter() - self.started, self.dependency, self.operation
+            )
+
+
+# queries made so far by the current request, None outside one
+_request_queries: ContextVar[list[int] | None] = ContextVar(
+    "silo_request_queries", default=None
+)
+
+
+def _time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        query_seconds.observe(
+            time.perf_counter() - started, context["connection"].alias
+        )
+        counter = _request_queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+def _on_connection_created(sender, connection, **kwargs) -> None:
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+# every connection, in every thread, times its queries
+def install_query_timing() -> None:
+    connection_created.connect(_on_connection_created, dispatch_uid="silo.metrics")
+    for connection in connections.all(initialized_only=True):
+        _on_connection_created(None, connection)
+
+
+def _record(request, response, started: float, queries: list[int]) -> None:
+    match = request.resolver_match
+    view: str = (match.view_name or match._func_path) if match else "unmatched"
+    request_seconds.observe(
+        time.perf_counter() - started,
+        view,
+        request.method,
+        str(response.status_code),
+    )
+    request_queries.observe(queries[0], view)
+
+
+@sync_and_async_middleware
+def MetricsMiddleware(get_response):
+    install_query_timing()
+    # the query counter is a list the ORM wrapper updates in place, copies of the
+    # context made by sync_to_async share it
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            started = time.perf_counter()
+            queries = [0]
+            token = _request_queries.set(queries)
+            try:
+                response = await get_response(request)
+            finally:
+                _request_queries.reset(token)
+            _record(request, response, started, queries)
+            return response
+
+    else:
+
+        def middleware(request):
+            started = time.perf_counter()
+            queries = [0]
+            token = _request_queries.set(queries)
+            try:
+                response = get_response(request)
+            finally:
+                _request_queries.reset(token)
+            _record(request, response, started, queries)
+            return response
+
+    return middleware
+
+
+def render() -> str:
+    lines: list[str] = []
+    for histogram in histograms:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+_allowed_networks = [
+    ipaddress.ip_network(network, strict=False)
+    for network in Config.METRICS_ALLOWED_NETWORKS
+]
+
+
+def _allowed(request) -> bool:
+    if Config.METRICS_TOKEN:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(
+            token.encode(), Config.METRICS_TOKEN.encode()
+        ):
+            return True
+    try:
+        client = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(client in network for network in _allowed_networks)
+
+
+# the scrape endpoint, see Config.METRICS_TOKEN
+def metrics_view(request) -> HttpResponse:
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4")
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 from config import Config
+from . import db
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -52,6 +53,9 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
+if Config.METRICS_ENABLED:
+    # first, so its timings include the other middleware
+    MIDDLEWARE.insert(0, "Silo.metrics.MetricsMiddleware")
 
 ROOT_URLCONF = "Silo.urls"
 
@@ -76,10 +80,17 @@ WSGI_APPLICATION = "Silo.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# configured from the environment, see Silo/db.py
+DATABASES = db.databases(BASE_DIR)
+DATABASE_ROUTERS = ["Silo.db.ReplicaRouter"]
+# the file listing index carries extra columns on PostgreSQL (files/models.py);
+# SQLite builds it without them, which is fine for development
+SILENCED_SYSTEM_CHECKS = ["models.W040"]
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": Config.CACHE_BACKEND,
+        "LOCATION": Config.CACHE_LOCATION,
     }
 }
 
@@ -0,0 +1,229 @@
+import ipaddress
+from pathlib import Path
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.db import DEFAULT_DB_ALIAS
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from config import Config
+from . import db, metrics
+from .db import ReplicaRouter, afirst_or_primary, first_or_primary, replica_reads
+
+
+class DatabasesTests(SimpleTestCase):
+    def test_sqlite_runs_in_wal_mode(self):
+        with mock.patch.object(Config, "DB_ENGINE", "sqlite"):
+            configured = db.databases(Path("/srv/silo"))
+        self.assertEqual(list(configured), ["default"])
+        default = configured["default"]
+        self.assertEqual(default["NAME"], Path("/srv/silo/db.sqlite3"))
+        self.assertIn("PRAGMA journal_mode=WAL", default["OPTIONS"]["init_command"])
+        self.assertEqual(default["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+
+    def test_postgres_replicas_mirror_the_primary(self):
+        with (
+            mock.patch.object(Config, "DB_ENGINE", "postgres"),
+            mock.patch.object(Config, "DB_HOST", "primary"),
+            mock.patch.object(Config, "DB_REPLICA_HOSTS", ["r1", "r2"]),
+            mock.patch.object(Config, "DB_POOL", False),
+        ):
+            configured = db.databases(Path("/srv/silo"))
+        self.assertEqual(list(configured), ["default", "replica_0", "replica_1"])
+        self.assertEqual(configured["default"]["HOST"], "primary")
+        self.assertEqual(configured["replica_1"]["HOST"], "r2")
+        self.assertEqual(configured["replica_0"]["TEST"], {"MIRROR": "default"})
+        self.assertEqual(configured["default"]["CONN_MAX_AGE"], Config.DB_CONN_MAX_AGE)
+
+    def test_pooled_connections_are_not_kept(self):
+        with (
+            mock.patch.object(Config, "DB_ENGINE", "postgres"),
+            mock.patch.object(Config, "DB_REPLICA_HOSTS", []),
+            mock.patch.object(Config, "DB_POOL", True),
+        ):
+            default = db.databases(Path("/srv/silo"))["default"]
+        self.assertEqual(default["CONN_MAX_AGE"], 0)
+        self.assertEqual(
+            default["OPTIONS"]["pool"],
+            {"min_size": Config.DB_POOL_MIN_SIZE, "max_size": Config.DB_POOL_MAX_SIZE},
+        )
+
+    def test_unknown_engine_is_rejected(self):
+        with (
+            mock.patch.object(Config, "DB_ENGINE", "mysql"),
+            self.assertRaises(ValueError),
+        ):
+            db.databases(Path("/srv/silo"))
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.router.replicas = ["replica_0"]
+
+    def _read(self, **hints):
+        return self.router.db_for_read(None, **hints)
+
+    def test_reads_go_to_the_primary_unless_marked(self):
+        self.assertIsNone(self._read())
+
+    def test_marked_reads_go_to_a_replica(self):
+        self.assertEqual(replica_reads(self._read)(), "replica_0")
+        self.assertIsNone(self._read())
+
+    def test_marked_async_reads_go_to_a_replica(self):
+        async def read():
+            return self._read()
+
+        self.assertEqual(async_to_sync(replica_reads(read))(), "replica_0")
+        self.assertIsNone(self._read())
+
+    def test_reads_in_a_transaction_stay_on_the_primary(self):
+        with mock.patch.object(
+            db.connections["default"], "in_atomic_block", True, create=True
+        ):
+            self.assertIsNone(replica_reads(self._read)())
+
+    def test_related_rows_follow_their_instance(self):
+        instance = mock.Mock()
+        instance._state.db = "replica_0"
+        self.assertEqual(self._read(instance=instance), "replica_0")
+
+    def test_no_replicas_means_the_primary(self):
+        self.router.replicas = []
+        self.assertIsNone(replica_reads(self._read)())
+
+    def test_writes_and_migrations_stay_on_the_primary(self):
+        self.assertIsNone(replica_reads(self.router.db_for_write)(None))
+        self.assertTrue(self.router.allow_migrate("default", "files"))
+        self.assertFalse(self.router.allow_migrate("replica_0", "files"))
+
+
+# a queryset read on one alias, holding the rows each alias has
+class FakeQuerySet:
+    def __init__(self, rows: dict[str, object], alias: str):
+        self.rows = rows
+        self.db = alias
+
+    def first(self):
+        return self.rows.get(self.db)
+
+    async def afirst(self):
+        return self.rows.get(self.db)
+
+    def using(self, alias: str):
+        return FakeQuerySet(self.rows, alias)
+
+
+class FirstOrPrimaryTests(SimpleTestCase):
+    def test_rows_missing_on_the_replica_are_read_from_the_primary(self):
+        queryset = FakeQuerySet({DEFAULT_DB_ALIAS: "row"}, "replica_0")
+        self.assertEqual(first_or_primary(queryset), "row")
+        self.assertEqual(async_to_sync(afirst_or_primary)(queryset), "row")
+
+    def test_replica_rows_are_used(self):
+        queryset = FakeQuerySet({"replica_0": "replica row"}, "replica_0")
+        self.assertEqual(first_or_primary(queryset), "replica row")
+
+    def test_missing_rows_on_the_primary_are_not_read_twice(self):
+        queryset = FakeQuerySet({}, DEFAULT_DB_ALIAS)
+        with mock.patch.object(queryset, "using") as using:
+            self.assertIsNone(first_or_primary(queryset))
+            self.assertIsNone(async_to_sync(afirst_or_primary)(queryset))
+        using.assert_not_called()
+
+
+class HistogramTests(SimpleTestCase):
+    def setUp(self):
+        self.histogram = metrics.Histogram(
+            "silo_test_seconds", "Test timings", ("view",), (0.1, 1)
+        )
+
+    def test_observations_fall_in_cumulative_buckets(self):
+        for value in (0.05, 0.1, 0.5, 3):
+            self.histogram.observe(value, "files")
+        self.assertEqual(self.histogram.totals(), {("files",): (4, 3.65)})
+        lines = self.histogram.render()
+        self.assertIn('silo_test_seconds_bucket{view="files",le="0.1"} 2', lines)
+        self.assertIn('silo_test_seconds_bucket{view="files",le="1"} 3', lines)
+        self.assertIn('silo_test_seconds_bucket{view="files",le="+Inf"} 4', lines)
+        self.assertIn('silo_test_seconds_count{view="files"} 4', lines)
+
+    def test_label_values_are_escaped(self):
+        self.histogram.observe(0.5, 'say "hi"\n')
+        self.assertIn(
+            'silo_test_seconds_count{view="say \\"hi\\"\\n"} 1',
+            self.histogram.render(),
+        )
+
+    def test_clear_drops_every_series(self):
+        self.histogram.observe(0.5, "files")
+        self.histogram.clear()
+        self.assertEqual(self.histogram.totals(), {})
+
+
+class MetricsViewTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _status(self, remote_addr="203.0.113.7", **headers) -> int:
+        request = self.factory.get("/metrics", REMOTE_ADDR=remote_addr, **headers)
+        return metrics.metrics_view(request).status_code
+
+    def test_closed_without_a_token_or_networks(self):
+        with (
+            mock.patch.object(Config, "METRICS_TOKEN", ""),
+            mock.patch.object(metrics, "_allowed_networks", []),
+        ):
+            self.assertEqual(self._status(HTTP_AUTHORIZATION="Bearer "), 403)
+
+    def test_bearer_token_opens_the_endpoint(self):
+        with (
+            mock.patch.object(Config, "METRICS_TOKEN", "scrape-secret"),
+            mock.patch.object(metrics, "_allowed_networks", []),
+        ):
+            self.assertEqual(
+                self._status(HTTP_AUTHORIZATION="Bearer scrape-secret"), 200
+            )
+            self.assertEqual(
+                self._status(HTTP_AUTHORIZATION="bearer scrape-secret"), 200
+            )
+            self.assertEqual(self._status(HTTP_AUTHORIZATION="Bearer wrong"), 403)
+            self.assertEqual(
+                self._status(HTTP_AUTHORIZATION="Basic scrape-secret"), 403
+            )
+            self.assertEqual(self._status(), 403)
+
+    def test_allowed_networks_open_the_endpoint(self):
+        with (
+            mock.patch.object(Config, "METRICS_TOKEN", ""),
+            mock.patch.object(
+                metrics, "_allowed_networks", [ipaddress.ip_network("10.0.0.0/8")]
+            ),
+        ):
+            self.assertEqual(self._status("10.1.2.3"), 200)
+            self.assertEqual(self._status("203.0.113.7"), 403)
+            self.assertEqual(self._status("not-an-address"), 403)
+
+
+class MetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        for histogram in metrics.histograms:
+            histogram.clear()
+
+    def test_requests_are_timed_per_view(self):
+        with mock.patch.object(Config, "METRICS_TOKEN", "scrape-secret"):
+            self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-secret")
+            response = self.client.get(
+                "/metrics", HTTP_AUTHORIZATION="Bearer scrape-secret"
+            )
+        self.assertIn(
+            'silo_request_duration_seconds_count{view="metrics",method="GET",'
+            'status="200"} 1',
+            response.content.decode(),
+        )
+        self.assertEqual(metrics.request_queries.totals()[("metrics",)], (2, 0))
+
+    def test_timed_records_dependency_calls(self):
+        with metrics.timed("s3", "stat_object"):
+            pass
+        count, _ = metrics.dependency_seconds.totals()[("s3", "stat_object")]
+        self.assertEqual(count, 1)
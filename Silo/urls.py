@@ -17,6 +17,8 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
+from config import Config
+from . import metrics
 
 
 urlpatterns = [
@@ -24,3 +26,5 @@ urlpatterns = [
     path("api/users/", include("users.urls")),
     path("api/files/", include("files.urls")),
 ]
+if Config.METRICS_ENABLED:
+    urlpatterns.append(path("metrics", metrics.metrics_view, name="metrics"))
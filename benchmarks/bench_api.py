@@ -0,0 +1,346 @@
+"""
+Throughput, latency, queries and allocations of the file API's main flows, with a
+regression check against a saved baseline.
+
+Runs in process with nothing else running, like bench_async: a throwaway SQLite
+database, a stub JWKS signing RS256 tokens, and the in-memory storage backend, whose
+presigned URLs are served by Silo itself so uploads really PUT their bodies. Each
+scenario runs for --duration seconds on --clients threads, each a client that
+starts its next operation as soon as the previous one finishes:
+
+    upload          POST upload/
+    upload-confirm  POST upload/, PUT the body to the upload URL, POST upload/confirm/
+    download        POST download/
+    share           POST share/create/, POST share/access/<token>/
+
+Every request is reported by its URL name: p50/p95/p99 latency, queries per request
+(from Silo/metrics.py) and the peak memory it allocated, measured afterwards on
+--alloc-samples sequential operations under tracemalloc.
+
+Run from the repository root:
+    python -m benchmarks.bench_api --clients 16 --duration 10 --save baseline.json
+    python -m benchmarks.bench_api --clients 16 --duration 10 --baseline baseline.json
+
+With --baseline the run exits with status 1 when a scenario's req/s drops, or a
+request's p95 or allocations grow, by more than --threshold, or when a request
+makes more queries than before.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from benchmarks.bench_async import (
+    WSGIClient,
+    make_token,
+    setup_database,
+    stub_auth0,
+)
+from django.conf import settings
+from files import access_log, counters
+from Silo import metrics
+
+
+# a request makes more queries on average than in the baseline by more than this
+QUERY_TOLERANCE = 0.5
+
+
+class Session:
+    def __init__(self, client: WSGIClient, token: str, file_id: str | None = None):
+        self.client = client
+        self.token = token
+        self.file_id = file_id  # a confirmed file, for download and share
+        # (url name, status, seconds) of the requests made
+        self.requests: list[tuple[str, int, float]] = []
+        # peak bytes allocated by each request, by url name, while tracemalloc runs
+        self.allocations: dict[str, list[int]] | None = None
+
+    def call(
+        self,
+        name: str,
+        path: str,
+        data: dict | bytes,
+        method: str = "POST",
+        headers: dict[str, str] | None = None,
+    ) -> dict:
+        body = data if isinstance(data, bytes) else json.dumps(data).encode()
+        if self.allocations is not None:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        status, content = self.client.call(path, body, self.token, method, headers)
+        self.requests.append((name, status, time.perf_counter() - start))
+        if self.allocations is not None:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.allocations.setdefault(name, []).append(peak - before)
+        if status >= 400:
+            raise RuntimeError(f"{name} returned {status}: {content[:300]!r}")
+        return json.loads(content) if content and name != "storage-object" else {}
+
+
+def _content() -> bytes:
+    return f"benchmark file {uuid.uuid4()}".encode()  # never deduplicated
+
+
+def upload(session: Session) -> None:
+    content = _content()
+    session.call(
+        "upload",
+        "/api/files/upload/",
+        {
+            "file_name": "benchmark.bin",
+            "file_size": len(content),
+            "checksum": hashlib.sha256(content).hexdigest(),
+        },
+    )
+
+
+def upload_confirm(session: Session) -> str:
+    content = _content()
+    target = session.call(
+        "upload",
+        "/api/files/upload/",
+        {
+            "file_name": "benchmark.bin",
+            "file_size": len(content),
+            "checksum": hashlib.sha256(content).hexdigest(),
+        },
+    )
+    url = urlsplit(target["upload_url"])
+    session.call(
+        "storage-object",
+        f"{url.path}?{url.query}",
+        content,
+        method="PUT",
+        headers=target["upload_headers"],
+    )
+    session.call(
+        "confirm-upload", "/api/files/upload/confirm/", {"file_id": target["file_id"]}
+    )
+    return target["file_id"]
+
+
+def download(session: Session) -> None:
+    session.call("download", "/api/files/download/", {"file_id": session.file_id})
+
+
+def share(session: Session) -> None:
+    link = session.call(
+        "create-shared-link",
+        "/api/files/share/create/",
+        {"file_id": session.file_id, "permission": "DOWNLOAD"},
+    )
+    session.call(
+        "access-shared-link", f"/api/files/share/access/{link['token']}/", b"{}"
+    )
+
+
+SCENARIOS = {
+    "upload": upload,
+    "upload-confirm": upload_confirm,
+    "download": download,
+    "share": share,
+}
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+# runs `operation` from `clients` threads for `duration` seconds; returns the
+# requests/s of the scenario and per URL name its latencies and error count
+def measure(operation, sessions: list[Session], clients: int, duration: float):
+    deadline = time.perf_counter() + duration
+    errors: dict[str, int] = {}
+    lock = threading.Lock()
+
+    def client_loop(session: Session) -> None:
+        while time.perf_counter() < deadline:
+            try:
+                operation(session)
+            except RuntimeError:
+                name = session.requests[-1][0]
+                with lock:
+                    errors[name] = errors.get(name, 0) + 1
+
+    for histogram in metrics.histograms:
+        histogram.clear()
+    runs = [
+        Session(session.client, session.token, session.file_id)
+        for session in (sessions * clients)[:clients]
+    ]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client_loop, runs))
+    elapsed = time.perf_counter() - started
+
+    latencies: dict[str, list[float]] = {}
+    for run in runs:
+        for name, _, seconds in run.requests:
+            latencies.setdefault(name, []).append(seconds)
+    total = sum(len(values) for values in latencies.values())
+    return total / elapsed, latencies, errors
+
+
+# median peak bytes allocated per request, by URL name, over `samples` operations run
+# one at a time after a few untraced ones; the median leaves out requests that
+# happened to overlap a background flush
+def measure_allocations(operation, session: Session, samples: int) -> dict[str, float]:
+    traced = Session(session.client, session.token, session.file_id)
+    for _ in range(5):
+        operation(traced)
+    traced.allocations = {}
+    tracemalloc.start()
+    try:
+        for _ in range(samples):
+            operation(traced)
+    finally:
+        tracemalloc.stop()
+    return {
+        name: statistics.median(values) for name, values in traced.allocations.items()
+    }
+
+
+def run_scenario(name: str, sessions: list[Session], args) -> dict:
+    operation = SCENARIOS[name]
+    requests_per_second, latencies, errors = measure(
+        operation, sessions, args.clients, args.duration
+    )
+    queries = {
+        labels[0]: total / count
+        for labels, (count, total) in metrics.request_queries.totals().items()
+        if count
+    }
+    allocations = measure_allocations(operation, sessions[0], args.alloc_samples)
+
+    print(f"{name:<16} {requests_per_second:8.0f} req/s")
+    result = {"requests_per_second": requests_per_second, "requests": {}}
+    for request, values in latencies.items():
+        values.sort()
+        stats = {
+            "count": len(values),
+            "errors": errors.get(request, 0),
+            "p50": _percentile(values, 0.50),
+            "p95": _percentile(values, 0.95),
+            "p99": _percentile(values, 0.99),
+            "queries": queries.get(request),
+            "alloc_kib": allocations.get(request, 0) / 1024,
+        }
+        result["requests"][request] = stats
+        print(
+            f"  {request:<20} p50 {stats['p50'] * 1000:7.2f} ms"
+            f"  p95 {stats['p95'] * 1000:7.2f} ms  p99 {stats['p99'] * 1000:7.2f} ms"
+            f"  {_format(stats['queries'], '5.1f')} queries"
+            f"  {stats['alloc_kib']:8.1f} KiB"
+            f"  {stats['count']} requests  {stats['errors']} errors"
+        )
+    return result
+
+
+def _format(value: float | None, spec: str) -> str:
+    return "    -" if value is None else format(value, spec)
+
+
+# what got worse than `baseline` by more than `threshold`, as readable lines
+def regressions(baseline: dict, results: dict, threshold: float) -> list[str]:
+    found: list[str] = []
+
+    def check(label: str, before, after, higher_is_worse: bool = True) -> None:
+        if before is None or after is None or not before:
+            return
+        change = (after - before) / before
+        if (change if higher_is_worse else -change) > threshold:
+            found.append(f"{label}: {before:.4g} -> {after:.4g} ({change:+.0%})")
+
+    for scenario, result in results.items():
+        before = baseline.get(scenario)
+        if before is None:
+            continue
+        check(
+            f"{scenario} req/s",
+            before["requests_per_second"],
+            result["requests_per_second"],
+            higher_is_worse=False,
+        )
+        for request, stats in result["requests"].items():
+            previous = before["requests"].get(request)
+            if previous is None:
+                continue
+            label = f"{scenario} {request}"
+            check(f"{label} p95", previous["p95"], stats["p95"])
+            check(f"{label} KiB", previous["alloc_kib"], stats["alloc_kib"])
+            if (
+                previous["queries"] is not None
+                and stats["queries"] is not None
+                and stats["queries"] > previous["queries"] + QUERY_TOLERANCE
+            ):
+                found.append(
+                    f"{label} queries: {previous['queries']:.1f}"
+                    f" -> {stats['queries']:.1f}"
+                )
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--scenario",
+        choices=sorted(SCENARIOS),
+        action="append",
+        help="repeat for several, default all",
+    )
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)  # per scenario
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--alloc-samples", type=int, default=50)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results saved by --save")
+    parser.add_argument("--threshold", type=float, default=0.2)  # 0.2 = 20% worse
+    args = parser.parse_args()
+
+    settings.ALLOWED_HOSTS = ["testserver"]
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        setup_database(os.path.join(directory, "benchmark.sqlite3"))
+        pem = stub_auth0()
+        client = WSGIClient(threads=1)
+        sessions = []
+        for user in range(args.users):
+            session = Session(client, make_token(pem, f"auth0|benchmark-{user}"))
+            session.file_id = upload_confirm(session)
+            sessions.append(session)
+        print(
+            f"{args.clients} clients, {args.users} users, {args.duration:.0f}s"
+            " per scenario"
+        )
+        for name in args.scenario or SCENARIOS:
+            results[name] = run_scenario(name, sessions, args)
+        # flush what's buffered while the database is still there
+        access_log.writer.stop()
+        counters.link_downloads.stop()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(baseline, results, args.threshold)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
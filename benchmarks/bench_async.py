@@ -0,0 +1,317 @@
+"""
+Requests/s and latency of the sync (WSGI) and async (ASGI) file API under many
+concurrent clients.
+
+Runs in process against a throwaway SQLite database, with a stub JWKS and the
+in-memory storage backend, so it needs nothing running. The sync stack is
+Django's WSGI handler on a pool of worker threads, as under a threaded WSGI
+server; the async stack is the ASGI handler on the event loop. Each
+client sends its next request as soon as the previous one is answered, and
+latency includes the time spent queued for a worker. --db-latency-ms adds a
+delay to every query, standing in for a database across the network.
+
+Run from the repository root:
+    python -m benchmarks.bench_async --clients 1000 --duration 10
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+for name, value in {
+    "DJANGO_SETTINGS_MODULE": "Silo.settings",
+    "SECRET_KEY": "benchmark",
+    "AUTH0_DOMAIN": "benchmark.invalid",
+    "AUTH0_AUDIENCE": "https://silo.benchmark",
+    "MINIO_ENDPOINT": "http://localhost:9000",
+    "MINIO_ACCESS_KEY": "benchmark",
+    "MINIO_SECRET_KEY": "benchmark-secret",
+    "MINIO_BUCKET_NAME": "silo",
+    "MINIO_SECURE": "false",
+    "STORAGE_BACKEND": "memory",
+    # many threads write at once, wait longer for the write lock than a server would
+    "DB_SQLITE_BUSY_TIMEOUT": "30000",
+}.items():
+    os.environ.setdefault(name, value)
+
+import django  # noqa: E402
+
+django.setup()
+
+from cryptography.hazmat.primitives import serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.core.handlers.asgi import ASGIHandler  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from jose import jwt  # noqa: E402
+from config import Config  # noqa: E402
+from files import access_log, counters  # noqa: E402
+from users import auth0_jwt  # noqa: E402
+
+
+ENDPOINTS = {
+    # name: (sync path, async path), "{}" is filled with a shared link token
+    "download": ("/api/files/download/", "/api/files/async/download/"),
+    "share": ("/api/files/share/access/{}/", "/api/files/async/share/access/{}/"),
+}
+
+
+def _b64(number: int) -> str:
+    raw = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def stub_auth0() -> str:
+    # signs tokens with a local key and serves its JWKS, returns the private key
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    numbers = key.public_key().public_numbers()
+    jwks = {
+        "keys": [
+            {
+                "kty": "RSA",
+                "kid": "benchmark",
+                "use": "sig",
+                "n": _b64(numbers.n),
+                "e": _b64(numbers.e),
+            }
+        ]
+    }
+    auth0_jwt.jwks_cache.fetcher = lambda: jwks
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+
+
+def make_token(pem: str, sub: str) -> str:
+    issued = int(time.time())
+    claims = {
+        "sub": sub,
+        "aud": Config.AUTH0_AUDIENCE,
+        "iss": f"https://{Config.AUTH0_DOMAIN}/",
+        "iat": issued,
+        "exp": issued + 24 * 3600,
+    }
+    return jwt.encode(claims, pem, algorithm="RS256", headers={"kid": "benchmark"})
+
+
+def setup_database(path: str) -> None:
+    # WAL and immediate transactions come from the settings, see Silo/db.py
+    connection.settings_dict["TEST"]["NAME"] = path
+    connection.creation.create_test_db(verbosity=0)
+
+
+# delays every query on connections opened from now on
+def add_db_latency(seconds: float) -> None:
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def on_connect(sender, connection, **kwargs):
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    connection_created.connect(on_connect, weak=False)
+
+
+class WSGIClient:
+    def __init__(self, threads: int):
+        self.handler = WSGIHandler()
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def call(
+        self,
+        path: str,
+        body: bytes,
+        token: str,
+        method: str = "POST",
+        headers: dict[str, str] | None = None,
+    ) -> tuple[int, bytes]:
+        path, _, query = path.partition("?")
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "HTTP_AUTHORIZATION": f"Bearer {token}",
+            "REMOTE_ADDR": "127.0.0.1",
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": io.StringIO(),
+        }
+        for name, value in (headers or {}).items():
+            environ[f"HTTP_{name.upper().replace('-', '_')}"] = value
+        status: list[str] = []
+        response = self.handler(environ, lambda s, headers: status.append(s))
+        try:
+            content = b"".join(response)
+        finally:
+            response.close()
+        return int(status[0].split()[0]), content
+
+    async def request(self, path: str, body: bytes, token: str) -> int:
+        loop = asyncio.get_running_loop()
+        status, _ = await loop.run_in_executor(self.pool, self.call, path, body, token)
+        return status
+
+
+class ASGIClient:
+    def __init__(self):
+        self.handler = ASGIHandler()
+
+    async def request(self, path: str, body: bytes, token: str) -> int:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "headers": [
+                (b"authorization", f"Bearer {token}".encode()),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        status: list[int] = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.Future()  # the client never disconnects
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        await self.handler(scope, receive, send)
+        return status[0]
+
+
+# one file per user, confirmed through the sync API; returns (link token, bearer
+# token, request body) for each
+def prepare(endpoint: str, users: int, pem: str) -> list[tuple[str, str, bytes]]:
+    client = WSGIClient(threads=1)
+    Config.UPLOAD_VERIFY_CHECKSUM = False
+    Config.SHARED_LINK_BUFFERED_COUNTS = True  # SQLite serializes the UPDATEs
+
+    def post(path: str, token: str, data: dict) -> dict:
+        status, content = client.call(path, json.dumps(data).encode(), token)
+        assert status == 200, content[:3000]
+        return json.loads(content)
+
+    targets = []
+    for user in range(users):
+        token = make_token(pem, f"auth0|benchmark-{user}")
+        content = f"benchmark file {user}".encode()
+        file_id = post(
+            "/api/files/upload/",
+            token,
+            {
+                "file_name": f"file-{user}.bin",
+                "file_size": len(content),
+                "checksum": hashlib.sha256(content).hexdigest(),
+            },
+        )["file_id"]
+        post("/api/files/upload/confirm/", token, {"file_id": file_id})
+        if endpoint == "download":
+            targets.append(("", token, json.dumps({"file_id": file_id}).encode()))
+        else:
+            link = post(
+                "/api/files/share/create/",
+                token,
+                {"file_id": file_id, "permission": "DOWNLOAD"},
+            )
+            targets.append((link["token"], token, b"{}"))
+    return targets
+
+
+async def run(client, path: str, targets, clients: int, duration: float) -> None:
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client_loop(index: int) -> None:
+        nonlocal errors
+        link_token, token, body = targets[index % len(targets)]
+        url = path.format(link_token)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = await client.request(url, body, token)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    count = len(latencies)
+    p50 = latencies[count // 2] if count else 0
+    p99 = latencies[min(count - 1, int(count * 0.99))] if count else 0
+    label = type(client).__name__.removesuffix("Client").lower()
+    print(
+        f"{label:<6} {count / elapsed:8.0f} req/s  p50 {p50 * 1000:8.1f} ms"
+        f"  p99 {p99 * 1000:8.1f} ms  {count} requests  {errors} errors"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="download")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0)  # seconds per stack
+    parser.add_argument("--threads", type=int, default=32)  # sync worker threads
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    settings.ALLOWED_HOSTS = ["testserver"]
+    with tempfile.TemporaryDirectory() as directory:
+        setup_database(os.path.join(directory, "benchmark.sqlite3"))
+        pem = stub_auth0()
+        targets = prepare(args.endpoint, args.users, pem)
+        if args.db_latency_ms:
+            add_db_latency(args.db_latency_ms / 1000)
+        sync_path, async_path = ENDPOINTS[args.endpoint]
+        print(
+            f"{args.endpoint}: {args.clients} clients, {args.duration:.0f}s per stack,"
+            f" {args.threads} sync threads, {args.db_latency_ms} ms per query"
+        )
+        asyncio.run(
+            run(
+                WSGIClient(args.threads),
+                sync_path,
+                targets,
+                args.clients,
+                args.duration,
+            )
+        )
+        asyncio.run(run(ASGIClient(), async_path, targets, args.clients, args.duration))
+        # flush what's buffered while the database is still there
+        access_log.writer.stop()
+        counters.link_downloads.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Throughput of the reference content-defined chunker in files/chunking.py.
+
+Run from the repository root:
+    python -m benchmarks.bench_chunking --size-mb 64
+"""
+
+import argparse
+import io
+import os
+import time
+from files.chunking import FastCDC
+
+
+def measure(label: str, size: int, fn) -> None:
+    start = time.perf_counter()
+    chunks = list(fn())
+    elapsed = time.perf_counter() - start
+    average = size / len(chunks) if chunks else 0
+    print(
+        f"{label:<14} {size / elapsed / 1e6:8.1f} MB/s"
+        f"  {len(chunks):6d} chunks  avg {average / 1024:8.1f} KiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--min-kb", type=int, default=256)
+    parser.add_argument("--avg-kb", type=int, default=1024)
+    parser.add_argument("--max-kb", type=int, default=4096)
+    args = parser.parse_args()
+
+    chunker = FastCDC(args.min_kb * 1024, args.avg_kb * 1024, args.max_kb * 1024)
+    size = args.size_mb * 1024 * 1024
+    data = os.urandom(size)
+
+    measure("in memory", size, lambda: chunker.chunks(data))
+    measure("stream", size, lambda: chunker.chunk_stream(io.BytesIO(data)))
+
+    # how much of a lightly edited copy would have to be uploaded again
+    edited = data[: size // 2] + b"edit" + data[size // 2 :]
+    before = {chunk.checksum for chunk in chunker.chunks(data)}
+    after = list(chunker.chunks(edited))
+    changed = sum(c.length for c in after if c.checksum not in before)
+    print(f"4-byte insert   {changed / 1024:8.1f} KiB of {len(edited) / 2**20:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
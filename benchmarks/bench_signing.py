@@ -0,0 +1,66 @@
+"""
+Presigned URL signing rate of files/signing.py, compared with the Minio SDK.
+
+Run from the repository root:
+    python -m benchmarks.bench_signing --count 100000
+"""
+
+import argparse
+import time
+from datetime import timedelta
+from minio import Minio
+from files.signing import PresignedURLSigner
+
+
+ENDPOINT = "http://localhost:9000"
+ACCESS_KEY = "benchmark"
+SECRET_KEY = "benchmark-secret"
+REGION = "us-east-1"
+
+
+def measure(label: str, count: int, sign) -> None:
+    start = time.perf_counter()
+    for i in range(count):
+        sign(f"uploads/1/{i:08d}-4a6f-b2a1_report.pdf")
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<24} {count / elapsed:10.0f} URLs/s"
+        f"  {elapsed / count * 1e6:6.2f} us/URL"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    signer = PresignedURLSigner(
+        ENDPOINT, ACCESS_KEY, SECRET_KEY, region=REGION, secure=False
+    )
+    measure("signer GET", args.count, lambda name: signer.presign("GET", "silo", name))
+    measure(
+        "signer PUT part",
+        args.count,
+        lambda name: signer.presign(
+            "PUT", "silo", name, extra_query={"partNumber": "7", "uploadId": "abc"}
+        ),
+    )
+
+    # region pinned, so the SDK doesn't go to the network either
+    client = Minio(
+        ENDPOINT.replace("http://", ""),
+        access_key=ACCESS_KEY,
+        secret_key=SECRET_KEY,
+        secure=False,
+        region=REGION,
+    )
+    expires = timedelta(hours=1)
+    measure(
+        "minio presigned_get",
+        args.count // 10,
+        lambda name: client.presigned_get_object("silo", name, expires=expires),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from django.test import SimpleTestCase
+from .bench_api import QUERY_TOLERANCE, regressions
+
+
+def _scenario(rps: float = 100, p95: float = 0.01, kib: float = 20, queries=3.0):
+    return {
+        "requests_per_second": rps,
+        "requests": {
+            "upload": {"p95": p95, "alloc_kib": kib, "queries": queries},
+        },
+    }
+
+
+class RegressionTests(SimpleTestCase):
+    def setUp(self):
+        self.baseline = {"upload": _scenario()}
+
+    def test_same_results_pass(self):
+        self.assertEqual(regressions(self.baseline, self.baseline, 0.1), [])
+
+    def test_changes_within_the_threshold_pass(self):
+        results = {"upload": _scenario(rps=95, p95=0.0105, kib=21)}
+        self.assertEqual(regressions(self.baseline, results, 0.1), [])
+
+    def test_fewer_requests_per_second_are_reported(self):
+        results = {"upload": _scenario(rps=80)}
+        self.assertEqual(
+            regressions(self.baseline, results, 0.1), ["upload req/s: 100 -> 80 (-20%)"]
+        )
+
+    def test_slower_and_larger_requests_are_reported(self):
+        results = {"upload": _scenario(p95=0.02, kib=30)}
+        self.assertEqual(
+            regressions(self.baseline, results, 0.1),
+            [
+                "upload upload p95: 0.01 -> 0.02 (+100%)",
+                "upload upload KiB: 20 -> 30 (+50%)",
+            ],
+        )
+
+    def test_improvements_pass(self):
+        results = {"upload": _scenario(rps=200, p95=0.005, kib=10, queries=1.0)}
+        self.assertEqual(regressions(self.baseline, results, 0.1), [])
+
+    def test_extra_queries_are_reported(self):
+        within = {"upload": _scenario(queries=3.0 + QUERY_TOLERANCE)}
+        self.assertEqual(regressions(self.baseline, within, 0.1), [])
+        extra = {"upload": _scenario(queries=4.0)}
+        self.assertEqual(
+            regressions(self.baseline, extra, 0.1),
+            ["upload upload queries: 3.0 -> 4.0"],
+        )
+
+    def test_unknown_queries_are_not_compared(self):
+        results = {"upload": _scenario(queries=None)}
+        self.assertEqual(regressions(self.baseline, results, 0.1), [])
+
+    def test_scenarios_and_requests_missing_from_the_baseline_are_skipped(self):
+        results = {
+            "upload": _scenario(),
+            "share": _scenario(rps=1),
+        }
+        results["upload"]["requests"]["upload-confirm"] = {
+            "p95": 10,
+            "alloc_kib": 10_000,
+            "queries": 50.0,
+        }
+        self.assertEqual(regressions(self.baseline, results, 0.1), [])
+
+    def test_zero_baselines_are_not_compared(self):
+        baseline = {"upload": _scenario(rps=0, kib=0)}
+        self.assertEqual(regressions(baseline, {"upload": _scenario()}, 0.1), [])
@@ -0,0 +1,19 @@
+# Model field choices, kept apart from config.py so models don't depend on settings
+# they don't use.
+
+FILE_TYPE_CHOICES: list[tuple[str, str]] = [
+    ("image/jpeg", "JPEG Image"),
+    ("image/png", "PNG Image"),
+    ("application/pdf", "PDF Document"),
+    ("text/plain", "Plain Text"),
+    ("application/zip", "ZIP Archive"),
+    ("video/mp4", "MP4 Video"),
+    ("audio/mpeg", "MP3 Audio"),
+    ("application/vnd.ms-excel", "Excel Spreadsheet"),
+]
+
+PLAN_CHOICES: list[tuple[str, str]] = [
+    ("free", "Free"),
+    ("pro", "Pro"),
+    ("enterprise", "Enterprise"),
+]
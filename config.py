@@ -1,11 +1,65 @@
 from dotenv import load_dotenv
 import os
-from minio import Minio
+import socket
+import threading
 
 
 load_dotenv()
 
 
+# A value built on first access in each process. Worker processes forked from a
+# parent that already used it build their own, so they never share its sockets.
+class _ProcessLocal:
+    def __init__(self, factory):
+        self.factory = factory
+        self._value = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def __get__(self, instance, owner):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._value = self.factory()
+                    self._pid = os.getpid()
+        return self._value
+
+
+# Implemented Minio official sdk instead of boto3 for simplicity, as we only need basic S3 operations. Also, Minio sdk is more lightweight. No extra overhead and dependencies.
+def _make_s3_client():
+    # imported here, the SDK takes a while to import and not every process needs it
+    import certifi
+    import urllib3
+    from minio import Minio
+
+    if not Config.MINIO_ENDPOINT:
+        raise RuntimeError("MINIO_ENDPOINT is not set")
+    socket_options = list(urllib3.connection.HTTPConnection.default_socket_options)
+    if Config.MINIO_KEEPALIVE:
+        socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    http_client = urllib3.PoolManager(
+        num_pools=1,
+        maxsize=Config.MINIO_POOL_SIZE,
+        timeout=urllib3.Timeout(
+            connect=Config.MINIO_CONNECT_TIMEOUT, read=Config.MINIO_READ_TIMEOUT
+        ),
+        socket_options=socket_options,
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+        retries=urllib3.Retry(
+            total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]
+        ),
+    )
+    return Minio(
+        Config.MINIO_ENDPOINT.replace("http://", "").replace("https://", ""),
+        access_key=Config.MINIO_ACCESS_KEY,
+        secret_key=Config.MINIO_SECRET_KEY,
+        secure=Config.MINIO_SECURE,
+        region=Config.MINIO_REGION,  # no region lookup on the first request
+        http_client=http_client,
+    )
+
+
 class Config:
     AUTH0_ALGORITHMS: list[str] = ["RS256"]
     AUTH0_DOMAIN: str = os.getenv("AUTH0_DOMAIN")
@@ -15,33 +69,232 @@ class Config:
     DEBUG: bool = os.getenv("DEBUG", "False").lower() in ("true", "1", "t")
     AUTH0_AUDIENCE: str = os.getenv("AUTH0_AUDIENCE")
     AUTH0_IDENTIFIER: str = os.getenv("AUTH0_IDENTIFIER")
+    # signing keys are cached in process, see users/auth0_jwt.py
+    AUTH0_JWKS_URL: str = os.getenv(
+        "AUTH0_JWKS_URL", f"https://{AUTH0_DOMAIN}/.well-known/jwks.json"
+    )
+    AUTH0_JWKS_TTL: int = int(os.getenv("AUTH0_JWKS_TTL", "600"))  # seconds
+    AUTH0_JWKS_MIN_REFRESH_INTERVAL: int = int(
+        os.getenv("AUTH0_JWKS_MIN_REFRESH_INTERVAL", "30")
+    )  # seconds between refetches triggered by unknown kids
+    AUTH0_JWKS_TIMEOUT: float = float(os.getenv("AUTH0_JWKS_TIMEOUT", "5"))
+    # verified token payloads kept per worker process, 0 disables the cache
+    AUTH0_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH0_TOKEN_CACHE_SIZE", "10000"))
+    # sub -> (User, UserProfile) resolution, see users/principals.py
+    PRINCIPAL_CACHE_TTL: int = int(os.getenv("PRINCIPAL_CACHE_TTL", "300"))  # seconds
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+    # also share resolved ids between workers through Django's cache framework
+    PRINCIPAL_CACHE_SHARED: bool = os.getenv(
+        "PRINCIPAL_CACHE_SHARED", "False"
+    ).lower() in ("true", "1", "t")
+    # Django's cache, e.g. django.core.cache.backends.redis.RedisCache at
+    # redis://cache:6379/0. The default keeps a separate cache in every worker
+    # process: the shared link cache is off with it, and link password attempt
+    # limits and remembered checks are per worker, so with several workers set a
+    # shared one; see files/link_cache.py and files/link_passwords.py
+    CACHE_BACKEND: str = os.getenv(
+        "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+    )
+    CACHE_LOCATION: str = os.getenv("CACHE_LOCATION", "")
+    CACHE_SHARED: bool = CACHE_BACKEND.rsplit(".", 1)[-1] not in (
+        "LocMemCache",
+        "DummyCache",
+    )
 
+    # database, see Silo/db.py: "sqlite" (default) or "postgres"
+    DB_ENGINE: str = os.getenv("DB_ENGINE", "sqlite")
+    DB_NAME: str | None = os.getenv("DB_NAME")  # SQLite file or PostgreSQL database
+    DB_HOST: str = os.getenv("DB_HOST", "localhost")
+    DB_PORT: str = os.getenv("DB_PORT", "5432")
+    DB_USER: str = os.getenv("DB_USER", "")
+    DB_PASSWORD: str = os.getenv("DB_PASSWORD", "")
+    # comma-separated PostgreSQL read replicas, same database and credentials
+    DB_REPLICA_HOSTS: list[str] = [
+        host.strip()
+        for host in os.getenv("DB_REPLICA_HOSTS", "").split(",")
+        if host.strip()
+    ]
+    # seconds a connection is reused across requests, 0 closes it after each one
+    DB_CONN_MAX_AGE: int = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+    # PostgreSQL connection pool (needs psycopg[pool]) instead of persistent
+    # connections
+    DB_POOL: bool = os.getenv("DB_POOL", "False").lower() in ("true", "1", "t")
+    DB_POOL_MIN_SIZE: int = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+    DB_POOL_MAX_SIZE: int = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    DB_SQLITE_SYNCHRONOUS: str = os.getenv("DB_SQLITE_SYNCHRONOUS", "NORMAL")
+    DB_SQLITE_BUSY_TIMEOUT: int = int(
+        os.getenv("DB_SQLITE_BUSY_TIMEOUT", "5000")
+    )  # milliseconds
+    DB_SQLITE_MMAP_SIZE: int = int(
+        os.getenv("DB_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))
+    )  # bytes
+    # request and dependency timings served at /metrics, see Silo/metrics.py
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "True").lower() in (
+        "true",
+        "1",
+        "t",
+    )
+    # who may scrape /metrics: requests with "Authorization: Bearer <METRICS_TOKEN>",
+    # and, opt-in, any client in METRICS_ALLOWED_NETWORKS (comma separated CIDRs).
+    # Behind a reverse proxy every client comes from the proxy's address, so only
+    # list networks that reach Silo directly. With neither set /metrics is closed
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    METRICS_ALLOWED_NETWORKS: list[str] = [
+        network.strip()
+        for network in os.getenv("METRICS_ALLOWED_NETWORKS", "").split(",")
+        if network.strip()
+    ]
+    # where file contents live, see files/storage.py: "minio", "local" (a directory
+    # on this node) or "memory" (this process, for tests and benchmarks)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "minio")
+    STORAGE_LOCAL_ROOT: str = os.getenv(
+        "STORAGE_LOCAL_ROOT", os.path.join(os.path.dirname(__file__), "storage")
+    )
+    # base URL clients reach Silo at, for the URLs the local and memory backends sign
+    STORAGE_PUBLIC_URL: str = os.getenv("STORAGE_PUBLIC_URL", "http://localhost:8000")
     MINIO_ENDPOINT: str = os.getenv("MINIO_ENDPOINT")
     MINIO_ACCESS_KEY: str = os.getenv("MINIO_ACCESS_KEY")
     MINIO_SECRET_KEY: str = os.getenv("MINIO_SECRET_KEY")
     MINIO_BUCKET_NAME: str = os.getenv("MINIO_BUCKET_NAME")
     MINIO_SECURE: bool = os.getenv("MINIO_SECURE", "True").lower() in ("true", "1", "t")
-    s3_client = Minio(
-        MINIO_ENDPOINT.replace("http://", "").replace("https://", ""),
-        access_key=MINIO_ACCESS_KEY,
-        secret_key=MINIO_SECRET_KEY,
-        secure=MINIO_SECURE,
-    )
-    # Implemented Minio official sdk instead of boto3 for simplicity, as we only need basic S3 operations. Also, Minio sdk is more lightweight. No extra overhead and dependencies.
-
-    FILE_TYPE_CHOICES: list[tuple[str, str]] = [
-        ("image/jpeg", "JPEG Image"),
-        ("image/png", "PNG Image"),
-        ("application/pdf", "PDF Document"),
-        ("text/plain", "Plain Text"),
-        ("application/zip", "ZIP Archive"),
-        ("video/mp4", "MP4 Video"),
-        ("audio/mpeg", "MP3 Audio"),
-        ("application/vnd.ms-excel", "Excel Spreadsheet"),
-    ]
-
-    PLAN_CHOICES: list[tuple[str, str]] = [
-        ("free", "Free"),
-        ("pro", "Pro"),
-        ("enterprise", "Enterprise"),
-    ]
+    # pinned so presigned URLs are signed locally without a region lookup
+    MINIO_REGION: str = os.getenv("MINIO_REGION", "us-east-1")
+    PRESIGNED_URL_EXPIRY: int = int(
+        os.getenv("PRESIGNED_URL_EXPIRY", "3600")
+    )  # seconds
+    # memoized shared-file GET URLs are handed out until this many seconds before
+    # they expire, see files/storage.py
+    PRESIGNED_URL_REUSE_MARGIN: int = int(
+        os.getenv("PRESIGNED_URL_REUSE_MARGIN", "600")
+    )
+    PRESIGNED_URL_CACHE_SIZE: int = int(os.getenv("PRESIGNED_URL_CACHE_SIZE", "10000"))
+    # threads that make blocking object-store calls for the async views, see
+    # files/blocking.py; defaults to the size of the client's connection pool
+    ASYNC_STORE_WORKERS: int = int(
+        os.getenv("ASYNC_STORE_WORKERS", os.getenv("MINIO_POOL_SIZE", "10"))
+    )
+    # serve downloads through Silo instead of presigned URLs, for deployments where
+    # MinIO isn't reachable by clients; needs the ASGI server, see files/streaming.py
+    DOWNLOAD_PROXY: bool = os.getenv("DOWNLOAD_PROXY", "False").lower() in (
+        "true",
+        "1",
+        "t",
+    )
+    DOWNLOAD_PROXY_CHUNK_SIZE: int = int(
+        os.getenv("DOWNLOAD_PROXY_CHUNK_SIZE", str(256 * 1024))
+    )
+    DOWNLOAD_PROXY_BUFFERS: int = int(os.getenv("DOWNLOAD_PROXY_BUFFERS", "64"))
+    # upload integrity, see files/integrity.py: presigned PUTs carry a signed SHA-256
+    # header the object store verifies, and confirming checks the object with a HEAD
+    UPLOAD_VERIFY_CHECKSUM: bool = os.getenv(
+        "UPLOAD_VERIFY_CHECKSUM", "True"
+    ).lower() in ("true", "1", "t")
+    UPLOAD_VERIFY_WORKERS: int = int(os.getenv("UPLOAD_VERIFY_WORKERS", "8"))
+    # accept uploads streamed through Silo, hashed on the way
+    UPLOAD_PROXY: bool = os.getenv("UPLOAD_PROXY", "False").lower() in (
+        "true",
+        "1",
+        "t",
+    )
+    # the client is built on first use in each process, see _ProcessLocal
+    MINIO_POOL_SIZE: int = int(os.getenv("MINIO_POOL_SIZE", "10"))  # connections
+    MINIO_CONNECT_TIMEOUT: float = float(os.getenv("MINIO_CONNECT_TIMEOUT", "10"))
+    MINIO_READ_TIMEOUT: float = float(os.getenv("MINIO_READ_TIMEOUT", "300"))
+    # TCP keep-alive probes on pooled connections, so idle ones dropped by a load
+    # balancer are noticed
+    MINIO_KEEPALIVE: bool = os.getenv("MINIO_KEEPALIVE", "True").lower() in (
+        "true",
+        "1",
+        "t",
+    )
+    s3_client = _ProcessLocal(_make_s3_client)
+    MULTIPART_PART_SIZE: int = int(
+        os.getenv("MULTIPART_PART_SIZE", str(8 * 1024 * 1024))
+    )  # in bytes, raised automatically for files that would exceed 10,000 parts
+    MULTIPART_MAX_URLS_PER_REQUEST: int = int(
+        os.getenv("MULTIPART_MAX_URLS_PER_REQUEST", "1000")
+    )
+    # unconfirmed uploads older than this are reaped by `manage.py reap_upload_sessions`
+    UPLOAD_SESSION_TTL: int = int(os.getenv("UPLOAD_SESSION_TTL", "86400"))  # seconds
+    # "user" reuses a user's own identical objects, "global" any user's, "off" none
+    DEDUP_SCOPE: str = os.getenv("DEDUP_SCOPE", "user")
+    # content-defined chunking, see files/chunking.py
+    CDC_MIN_CHUNK_SIZE: int = int(os.getenv("CDC_MIN_CHUNK_SIZE", str(256 * 1024)))
+    CDC_AVG_CHUNK_SIZE: int = int(os.getenv("CDC_AVG_CHUNK_SIZE", str(1024 * 1024)))
+    CDC_MAX_CHUNK_SIZE: int = int(os.getenv("CDC_MAX_CHUNK_SIZE", str(4 * 1024 * 1024)))
+    CDC_MAX_CHUNKS: int = int(os.getenv("CDC_MAX_CHUNKS", "100000"))  # per file
+    BATCH_MAX_FILES: int = int(os.getenv("BATCH_MAX_FILES", "1000"))  # per request
+    # files per page of the file listing, and the most a client may ask for
+    FILE_LIST_PAGE_SIZE: int = int(os.getenv("FILE_LIST_PAGE_SIZE", "100"))
+    FILE_LIST_MAX_PAGE_SIZE: int = int(os.getenv("FILE_LIST_MAX_PAGE_SIZE", "1000"))
+    # change feed for sync clients, see files/changes.py
+    CHANGE_FEED_PAGE_SIZE: int = int(os.getenv("CHANGE_FEED_PAGE_SIZE", "500"))
+    CHANGE_FEED_MAX_PAGE_SIZE: int = int(os.getenv("CHANGE_FEED_MAX_PAGE_SIZE", "1000"))
+    CHANGE_FEED_MAX_WAIT: int = int(os.getenv("CHANGE_FEED_MAX_WAIT", "30"))  # seconds
+    # how often a long poll checks for changes made by other processes; changes made
+    # in the same process wake it at once
+    CHANGE_FEED_POLL_INTERVAL: float = float(
+        os.getenv("CHANGE_FEED_POLL_INTERVAL", "1")
+    )
+    # `manage.py compact_file_changes` drops changes superseded for longer than this,
+    # and deletions older than CHANGE_FEED_TOMBSTONE_TTL (clients further behind resync)
+    CHANGE_FEED_COMPACT_AFTER: int = int(
+        os.getenv("CHANGE_FEED_COMPACT_AFTER", "86400")
+    )  # seconds
+    CHANGE_FEED_TOMBSTONE_TTL: int = int(
+        os.getenv("CHANGE_FEED_TOMBSTONE_TTL", str(30 * 86400))
+    )  # seconds
+    # storage quota per plan in bytes, 0 means unlimited
+    PLAN_QUOTAS: dict[str, int] = {
+        "free": int(os.getenv("PLAN_QUOTA_FREE", str(5 * 1024**3))),
+        "pro": int(os.getenv("PLAN_QUOTA_PRO", str(1024**4))),
+        "enterprise": int(os.getenv("PLAN_QUOTA_ENTERPRISE", "0")),
+    }
+    # >0 spreads storage_used increments over this many rows per user, folded back
+    # into UserProfile.storage_used by `manage.py reconcile_storage_usage`
+    STORAGE_COUNTER_SHARDS: int = int(os.getenv("STORAGE_COUNTER_SHARDS", "0"))
+    # access logs are written in batches by a background thread, see files/access_log.py;
+    # a crash loses at most ACCESS_LOG_FLUSH_INTERVAL seconds of events
+    ACCESS_LOG_ASYNC: bool = os.getenv("ACCESS_LOG_ASYNC", "True").lower() in (
+        "true",
+        "1",
+        "t",
+    )
+    ACCESS_LOG_BATCH_SIZE: int = int(os.getenv("ACCESS_LOG_BATCH_SIZE", "500"))
+    ACCESS_LOG_FLUSH_INTERVAL: float = float(
+        os.getenv("ACCESS_LOG_FLUSH_INTERVAL", "2")
+    )
+    ACCESS_LOG_MAX_QUEUE: int = int(os.getenv("ACCESS_LOG_MAX_QUEUE", "50000"))
+    ACCESS_LOG_SLOW_FLUSH: float = float(os.getenv("ACCESS_LOG_SLOW_FLUSH", "1"))  # s
+    ACCESS_LOG_SPILL_DIR: str = os.getenv("ACCESS_LOG_SPILL_DIR", "")  # empty = off
+    # access logs are kept in monthly partitions, see `manage.py prune_access_logs`
+    ACCESS_LOG_RETENTION_MONTHS: int = int(
+        os.getenv("ACCESS_LOG_RETENTION_MONTHS", "12")
+    )
+    ACCESS_LOG_HOURLY_RETENTION_DAYS: int = int(
+        os.getenv("ACCESS_LOG_HOURLY_RETENTION_DAYS", "35")
+    )
+    # 0 keeps daily rollups forever
+    ACCESS_LOG_DAILY_RETENTION_DAYS: int = int(
+        os.getenv("ACCESS_LOG_DAILY_RETENTION_DAYS", "0")
+    )
+    # count downloads of shared links without a download limit in process and write
+    # them every SHARED_LINK_COUNT_FLUSH_INTERVAL seconds, see files/counters.py
+    SHARED_LINK_BUFFERED_COUNTS: bool = os.getenv(
+        "SHARED_LINK_BUFFERED_COUNTS", "False"
+    ).lower() in ("true", "1", "t")
+    SHARED_LINK_COUNT_FLUSH_INTERVAL: float = float(
+        os.getenv("SHARED_LINK_COUNT_FLUSH_INTERVAL", "10")
+    )
+    # shared link metadata cache, see files/link_cache.py; only with a CACHE_BACKEND
+    # shared by all workers, 0 turns it off
+    SHARED_LINK_CACHE_TTL: int = int(os.getenv("SHARED_LINK_CACHE_TTL", "300"))
+    SHARED_LINK_NEGATIVE_TTL: int = int(os.getenv("SHARED_LINK_NEGATIVE_TTL", "60"))
+    # shared link passwords, see files/link_passwords.py
+    SHARED_LINK_VERIFY_TTL: int = int(os.getenv("SHARED_LINK_VERIFY_TTL", "600"))
+    SHARED_LINK_PASSWORD_ATTEMPTS: int = int(
+        os.getenv("SHARED_LINK_PASSWORD_ATTEMPTS", "10")
+    )  # per link and window
+    SHARED_LINK_PASSWORD_WINDOW: int = int(
+        os.getenv("SHARED_LINK_PASSWORD_WINDOW", "60")
+    )  # seconds
@@ -0,0 +1,274 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Iterable
+from asgiref.sync import sync_to_async
+from django.db import (
+    DatabaseError,
+    IntegrityError,
+    close_old_connections,
+    connection,
+    transaction,
+)
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+from config import Config
+from Silo import metrics
+from . import partitions, rollups
+from .models import File, UserAgent
+
+
+logger = logging.getLogger(__name__)
+
+
+# FileAccessLog rows are written off the request path. Views enqueue events in
+# process and a background thread inserts them into the monthly partitions and the
+# rollups (files/partitions.py, files/rollups.py) whenever ACCESS_LOG_BATCH_SIZE
+# events are waiting or ACCESS_LOG_FLUSH_INTERVAL seconds have passed, so a crash
+# loses at most that window. When a flush fails or is slower than
+# ACCESS_LOG_SLOW_FLUSH, batches are appended to a JSON lines file under
+# ACCESS_LOG_SPILL_DIR instead (if set) until the database keeps up again; spilled
+# events are loaded back with `manage.py load_access_log_spill`.
+class AccessLogWriter:
+    def __init__(
+        self,
+        batch_size: int = Config.ACCESS_LOG_BATCH_SIZE,
+        flush_interval: float = Config.ACCESS_LOG_FLUSH_INTERVAL,
+        max_queue: int = Config.ACCESS_LOG_MAX_QUEUE,
+        spill_dir: str = Config.ACCESS_LOG_SPILL_DIR,
+        slow_flush: float = Config.ACCESS_LOG_SLOW_FLUSH,
+        background: bool = Config.ACCESS_LOG_ASYNC,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.slow_flush = slow_flush
+        self.background = background
+        self.dropped = 0  # events lost because the queue was full
+        self._queue: deque[dict[str, Any]] = deque()
+        self._wakeup = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._stopping = False
+        self._spill_until = 0.0  # monotonic time until which batches go to disk
+
+    def enqueue(self, events: list[dict[str, Any]]) -> None:
+        if not events:
+            return
+        if not self.background:
+            self._write(events)
+            return
+
+        self._ensure_thread()
+        with self._wakeup:
+            overflow = len(self._queue) + len(events) - self.max_queue
+            if overflow > 0:
+                # shed the oldest events rather than block the request
+                for _ in range(min(overflow, len(self._queue))):
+                    self._queue.popleft()
+                self.dropped += overflow
+                logger.warning("Access log queue full, dropped %d event(s)", overflow)
+            self._queue.extend(events[-self.max_queue :])
+            if len(self._queue) >= self.batch_size:
+                self._wakeup.notify()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            while True:
+                with self._wakeup:
+                    batch = [
+                        self._queue.popleft()
+                        for _ in range(min(self.batch_size, len(self._queue)))
+                    ]
+                if not batch:
+                    return
+                self._write(batch)
+
+    def stop(self, timeout: float = 10) -> None:
+        # drain what is queued, called at interpreter exit
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        self.flush()
+
+    def _ensure_thread(self) -> None:
+        # the thread doesn't survive a fork, start one per worker process
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._wakeup:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="access-log-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            while not self._stopping:
+                with self._wakeup:
+                    if len(self._queue) < self.batch_size:
+                        self._wakeup.wait(self.flush_interval)
+                try:
+                    close_old_connections()
+                    self.flush()
+                except Exception:
+                    logger.exception("Access log flush failed")
+        finally:
+            connection.close()
+
+    def _write(self, events: list[dict[str, Any]]) -> None:
+        if self.spill_dir is not None and time.monotonic() < self._spill_until:
+            self._spill(events)
+            return
+
+        started = time.monotonic()
+        try:
+            with metrics.timed("access_log", "insert"):
+                insert_events(events)
+        except DatabaseError:
+            if self.spill_dir is None:
+                raise
+            logger.exception("Access log insert failed, spilling to disk")
+            self._spill_until = time.monotonic() + self.flush_interval
+            self._spill(events)
+            return
+        if time.monotonic() - started > self.slow_flush:
+            self._spill_until = time.monotonic() + self.flush_interval
+
+    def _spill(self, events: list[dict[str, Any]]) -> None:
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        path = self.spill_dir / f"access-log-{os.getpid()}.jsonl"
+        with open(path, "a", encoding="utf-8") as spill:
+            for event in events:
+                spill.write(json.dumps(event, default=str) + "\n")
+
+
+# process-wide cache of interned User-Agent ids
+_user_agents: dict[str, int] = {}
+USER_AGENT_CACHE_SIZE = 10000
+
+
+def _user_agent_ids(user_agents: set[str]) -> dict[str, int]:
+    ids: dict[str, int] = {
+        ua: _user_agents[ua] for ua in user_agents if ua in _user_agents
+    }
+    missing = [ua for ua in user_agents if ua not in ids]
+    if missing:
+        UserAgent.objects.bulk_create(
+            [UserAgent(user_agent=ua) for ua in missing], ignore_conflicts=True
+        )
+        ids.update(
+            UserAgent.objects.filter(user_agent__in=missing).values_list(
+                "user_agent", "id"
+            )
+        )
+        # the batch keeps its ids, only the cache starts over when full
+        if len(_user_agents) + len(missing) > USER_AGENT_CACHE_SIZE:
+            _user_agents.clear()
+        _user_agents.update((ua, ids[ua]) for ua in missing)
+    return ids
+
+
+# writes events into their monthly partitions and the rollups, in one transaction
+def insert_events(events: list[dict[str, Any]]) -> None:
+    if not events:
+        return
+    by_month: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    for event in events:
+        by_month[partitions.month_of(event["timestamp"])].append(event)
+    for month in by_month:
+        partitions.ensure_partition(month)  # DDL, outside the transaction
+    agents = _user_agent_ids({e["user_agent"] for e in events if e["user_agent"]})
+
+    def write(stats_events: list[dict[str, Any]]) -> None:
+        with transaction.atomic():
+            for month, month_events in by_month.items():
+                model = partitions.partition_model(month)
+                model.objects.bulk_create(
+                    [
+                        model(
+                            file_id=event["file_id"],
+                            user_id=event["user_id"],
+                            ip_address=event["ip_address"],
+                            user_agent_id=agents.get(event["user_agent"]),
+                            action=event["action"],
+                            timestamp=event["timestamp"],
+                        )
+                        for event in month_events
+                    ],
+                    batch_size=500,
+                )
+            rollups.record(events, stats_events)
+
+    try:
+        write(events)
+    except IntegrityError:
+        # files deleted since the event was queued get no per-file totals
+        existing = set(
+            File.objects.filter(
+                id__in={event["file_id"] for event in events}
+            ).values_list("id", flat=True)
+        )
+        write([event for event in events if event["file_id"] in existing])
+
+
+# turns spilled JSON back into model field values
+def decode_event(line: str) -> dict[str, Any]:
+    event = json.loads(line)
+    event["file_id"] = uuid.UUID(event["file_id"])
+    event["timestamp"] = parse_datetime(event["timestamp"])
+    return event
+
+
+writer = AccessLogWriter()
+atexit.register(writer.stop)
+
+
+def log_access(
+    request,
+    file_ids: Iterable,
+    action: str,
+    user_id: int | None = None,
+) -> None:
+    ip_address: str | None = request.META.get("REMOTE_ADDR")
+    user_agent: str = request.META.get("HTTP_USER_AGENT", "")[:255]
+    timestamp = now()
+    writer.enqueue(
+        [
+            {
+                "file_id": file_id,
+                "user_id": user_id if user_id is not None else request.profile.id,
+                "action": action,
+                "ip_address": ip_address,
+                "user_agent": user_agent,
+                "timestamp": timestamp,
+            }
+            for file_id in file_ids
+        ]
+    )
+
+
+# for async views: enqueueing doesn't block, only the synchronous mode needs a thread
+async def alog_access(
+    request,
+    file_ids: Iterable,
+    action: str,
+    user_id: int | None = None,
+) -> None:
+    if writer.background:
+        log_access(request, file_ids, action, user_id)
+    else:
+        await sync_to_async(log_access)(request, file_ids, action, user_id)
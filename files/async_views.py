@@ -0,0 +1,273 @@
+import asyncio
+import json
+import uuid
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import classonlymethod
+from django.utils.timezone import now
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from config import Config
+from Silo.db import afirst_or_primary, replica_reads
+from . import (
+    access_log,
+    blocking,
+    changes,
+    integrity,
+    link_cache,
+    services,
+    storage,
+)
+from .models import File, FileChangeSequence
+from .serializers import (
+    ChangeFeedQuerySerializer,
+    FileDownloadRequestSerializer,
+    FileDownloadResponseSerializer,
+    FileIdSerializer,
+    FileUploadConfirmSerializer,
+    FileUploadRequestSerializer,
+)
+
+
+# Async variants of the upload, download and share endpoints for running Silo under
+# ASGI (Silo/asgi.py), mounted under async/ with the same requests and responses as
+# the DRF views in files/views.py. Single queries use the async ORM, multi-statement
+# transactions run through sync_to_async, and blocking object-store calls through
+# the bounded pool of files/blocking.py. A request waiting on the database or the
+# store then costs a coroutine instead of a worker thread.
+# See benchmarks/bench_async.py.
+
+
+class AsyncAPIView(View):
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # authenticated with bearer tokens, not cookies, like the DRF views
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs) -> HttpResponse:
+        if not await sync_to_async(services.authenticate)(request):
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."}, status=401
+            )
+        try:
+            self.data = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"detail": "JSON parse error"}, status=400)
+        if not isinstance(self.data, dict):
+            return JsonResponse({"detail": "Expected a JSON object"}, status=400)
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncGetUploadURLView(AsyncAPIView):
+    async def post(self, request) -> HttpResponse:
+        serializer = FileUploadRequestSerializer(data=self.data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+        data = serializer.validated_data
+
+        if not await sync_to_async(services.has_room)(request, data["file_size"]):
+            return JsonResponse({"detail": "Storage quota exceeded"}, status=403)
+
+        file_obj: File = File(
+            id=uuid.uuid4(),
+            owner_id=request.profile,
+            file_name=data["file_name"],
+            file_size=data["file_size"],
+            checksum=data["checksum"],
+            file_type=data.get("file_type"),
+        )
+        if await sync_to_async(services.link_duplicate)(request, file_obj):
+            return JsonResponse(
+                {
+                    "file_id": str(file_obj.id),
+                    "upload_url": None,
+                    "upload_headers": {},
+                    "file_path": file_obj.file_path,
+                    "already_present": True,
+                }
+            )
+
+        file_obj.file_path = (
+            f"uploads/{request.profile.id}/{uuid.uuid4()}_{data['file_name']}"
+        )
+        await sync_to_async(services.create_file)(file_obj)
+
+        upload_url, upload_headers = services.upload_target(request, file_obj)
+        return JsonResponse(
+            {
+                "file_id": str(file_obj.id),
+                "upload_url": upload_url,
+                "upload_headers": upload_headers,
+                "file_path": file_obj.file_path,
+                "already_present": False,
+            }
+        )
+
+
+class AsyncConfirmUploadView(AsyncAPIView):
+    async def post(self, request) -> HttpResponse:
+        serializer = FileIdSerializer(data=self.data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+
+        file_obj: File | None = await File.objects.filter(
+            id=serializer.validated_data["file_id"], owner_id=request.profile
+        ).afirst()
+        if file_obj is None:
+            return JsonResponse({"detail": "File not found"}, status=404)
+
+        if file_obj.upload_id or file_obj.chunked:
+            return JsonResponse(
+                {"detail": "Multipart and chunked uploads have their own confirm"},
+                status=409,
+            )
+
+        if (
+            Config.UPLOAD_VERIFY_CHECKSUM
+            and not file_obj.uploaded
+            and not await blocking.run(integrity.verify_object, file_obj)
+        ):
+            return JsonResponse(
+                {"detail": "Uploaded object is missing or doesn't match the file"},
+                status=409,
+            )
+
+        await sync_to_async(services.mark_uploaded)(
+            request, file_obj, verified=Config.UPLOAD_VERIFY_CHECKSUM
+        )
+        return JsonResponse(FileUploadConfirmSerializer(file_obj).data)
+
+
+class AsyncGetDownloadURLView(AsyncAPIView):
+    @replica_reads
+    async def post(self, request) -> HttpResponse:
+        serializer = FileDownloadRequestSerializer(data=self.data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+
+        file_obj: File | None = await afirst_or_primary(
+            File.objects.filter(
+                id=serializer.validated_data["file_id"],
+                owner_id=request.profile,
+                uploaded=True,
+            )
+        )
+        if file_obj is None:
+            return JsonResponse({"detail": "File not found"}, status=404)
+
+        if file_obj.chunked:
+            return JsonResponse(
+                {"detail": "Chunked files are downloaded through their manifest"},
+                status=409,
+            )
+
+        if Config.DOWNLOAD_PROXY:
+            download_url: str = services.stream_url(request, file_obj)
+        else:
+            download_url = storage.presigned_get_url(file_obj.file_path)
+            await access_log.alog_access(request, [file_obj.id], "DOWNLOAD")
+
+        response_data: dict[str, str | int] = {
+            "download_url": download_url,
+            "file_name": file_obj.file_name,
+            "file_size": file_obj.file_size,
+        }
+        return JsonResponse(FileDownloadResponseSerializer(response_data).data)
+
+
+class AsyncAccessSharedLinkView(AsyncAPIView):
+    async def post(self, request, token: str) -> HttpResponse:
+        password: str = self.data.get("password")
+
+        shared_link: link_cache.SharedLinkInfo | None = await sync_to_async(
+            link_cache.resolve
+        )(token)
+        if shared_link is None:
+            return JsonResponse({"detail": "Invalid link"}, status=404)
+
+        current = now()
+        if shared_link.expires_at and shared_link.expires_at <= current:
+            return JsonResponse({"detail": "Link expired"}, status=403)
+
+        error = await sync_to_async(services.check_link_password)(
+            shared_link, token, password
+        )
+        if error is not None:
+            detail, status, headers = error
+            return JsonResponse({"detail": detail}, status=status, headers=headers)
+
+        if shared_link.chunked:
+            return JsonResponse(
+                {"detail": "Chunked files are downloaded through their manifest"},
+                status=409,
+            )
+
+        detail: str | None = await sync_to_async(services.count_link_download)(
+            shared_link, current
+        )
+        if detail is not None:
+            return JsonResponse({"detail": detail}, status=403)
+
+        download_url: str = services.shared_download_url(request, shared_link)
+        await access_log.alog_access(
+            request, [shared_link.file_id], "SHARE", user_id=shared_link.owner_id
+        )
+        return JsonResponse({"download_url": download_url})
+
+
+# Changes to the user's files after `cursor`, see files/changes.py. With `wait` the
+# request is held open until there is a change or the time is up (long poll), and
+# costs a coroutine meanwhile. Each change carries the file's current state, or
+# null once it is deleted; a 410 means changes after the cursor were compacted
+# away, and the client lists its files again and continues from the given cursor.
+class ChangeFeedView(AsyncAPIView):
+    async def get(self, request) -> HttpResponse:
+        serializer = ChangeFeedQuerySerializer(data=request.GET.dict())
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+        data = serializer.validated_data
+        cursor: int = data["cursor"]
+        owner_id: int = request.profile.id
+
+        loop = asyncio.get_running_loop()
+        deadline: float = loop.time() + data["wait"]
+        while True:
+            rows, has_more, floor = await sync_to_async(changes.since)(
+                owner_id, cursor, data["limit"]
+            )
+            if cursor < floor:
+                latest: int = (
+                    await FileChangeSequence.objects.filter(user_id=owner_id)
+                    .values_list("last_seq", flat=True)
+                    .afirst()
+                    or 0
+                )
+                return JsonResponse(
+                    {
+                        "detail": "Cursor predates the feed, list the files again",
+                        "cursor": latest,
+                    },
+                    status=410,
+                )
+            remaining: float = deadline - loop.time()
+            if rows or remaining <= 0:
+                break
+            await changes.waiters.wait(
+                owner_id, min(remaining, Config.CHANGE_FEED_POLL_INTERVAL)
+            )
+
+        files: dict = {
+            row["id"]: row
+            async for row in File.objects.filter(
+                id__in={row["file_id"] for row in rows}, owner_id=owner_id
+            ).values(*services.FILE_LIST_FIELDS)
+        }
+        for row in rows:
+            row["file"] = files.get(row["file_id"])
+        return JsonResponse(
+            {
+                "changes": rows,
+                "cursor": rows[-1]["seq"] if rows else cursor,
+                "has_more": has_more,
+            }
+        )
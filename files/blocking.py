@@ -0,0 +1,19 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from config import Config
+
+
+# Blocking object-store calls made by async views run on this bounded pool instead
+# of the event loop's default executor. A slow store then backs requests up in the
+# pool's queue rather than growing threads, and connections, without limit.
+
+executor = ThreadPoolExecutor(
+    max_workers=Config.ASYNC_STORE_WORKERS, thread_name_prefix="silo-store"
+)
+
+
+async def run(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, partial(fn, *args, **kwargs)
+    )
@@ -0,0 +1,138 @@
+import asyncio
+import threading
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Exists, F, Max, OuterRef
+from django.db.models.functions import Greatest
+from django.utils.timezone import now
+from .models import FileChange, FileChangeSequence
+
+
+# Change feed for sync clients: every create, confirm, delete, share and unshare of a
+# user's files appends FileChange rows numbered from the user's own sequence, so a
+# client holding the last seq it saw fetches only what changed since (GET
+# /api/files/changes/). Rows are written in the transaction of the change itself.
+# Taking the seq updates the user's FileChangeSequence row, which stays locked until
+# commit, so a user's changes commit in seq order and a reader never skips one that
+# commits late. The row is separate from the profile, so profile updates and quota
+# charges don't queue behind a user's open changes.
+#
+# Each row means "this file changed, here is its current state"; compaction
+# (`manage.py compact_file_changes`) keeps only the latest row per file once the
+# older ones have aged, and eventually drops deletions too, raising the user's
+# floor so clients that far behind are told to list their files again.
+
+
+def record(owner_id: int, kind: str, file_ids: list) -> None:
+    if not file_ids:
+        return
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError("changes must be recorded in the transaction making them")
+    sequence = FileChangeSequence.objects.filter(user_id=owner_id)
+    if not sequence.update(last_seq=F("last_seq") + len(file_ids)):
+        # the user's first change; a concurrent first one may create the row first
+        FileChangeSequence.objects.get_or_create(user_id=owner_id)
+        sequence.update(last_seq=F("last_seq") + len(file_ids))
+    last: int = sequence.values_list("last_seq", flat=True).get()
+    first: int = last - len(file_ids) + 1
+    FileChange.objects.bulk_create(
+        [
+            FileChange(user_id=owner_id, seq=first + i, file_id=file_id, kind=kind)
+            for i, file_id in enumerate(file_ids)
+        ]
+    )
+    transaction.on_commit(lambda: waiters.notify(owner_id))
+
+
+# (changes after `cursor` oldest first, whether there are more, the user's floor)
+def since(owner_id: int, cursor: int, limit: int) -> tuple[list[dict], bool, int]:
+    floor: int = (
+        FileChangeSequence.objects.filter(user_id=owner_id)
+        .values_list("floor", flat=True)
+        .first()
+        or 0
+    )
+    rows: list[dict] = list(
+        FileChange.objects.filter(user_id=owner_id, seq__gt=cursor)
+        .order_by("seq")
+        .values("seq", "kind", "file_id", "created_at")[: limit + 1]
+    )
+    return rows[:limit], len(rows) > limit, floor
+
+
+# Long polls waiting for a user's changes in this process, woken when one commits.
+# Waiters on other processes find changes on their next poll.
+class Waiters:
+    def __init__(self):
+        self._waiting: dict[int, list[tuple]] = {}
+        self._lock = threading.Lock()
+
+    def notify(self, owner_id: int) -> None:
+        with self._lock:
+            waiting = self._waiting.pop(owner_id, [])
+        for loop, event in waiting:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # the waiter's loop is gone
+
+    # returns on a change of the user's or after `timeout` seconds
+    async def wait(self, owner_id: int, timeout: float) -> None:
+        entry = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiting.setdefault(owner_id, []).append(entry)
+        try:
+            await asyncio.wait_for(entry[1].wait(), timeout)
+        except TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                waiting = self._waiting.get(owner_id)
+                if waiting and entry in waiting:
+                    waiting.remove(entry)
+                    if not waiting:
+                        del self._waiting[owner_id]
+
+
+waiters = Waiters()
+
+
+# deletes rows older than `older_than` seconds that a later row of the same file
+# supersedes, in batches; returns how many
+def compact(older_than: int, batch_size: int = 1000) -> int:
+    superseded = FileChange.objects.filter(
+        created_at__lt=now() - timedelta(seconds=older_than)
+    ).filter(
+        Exists(
+            FileChange.objects.filter(
+                user_id=OuterRef("user_id"),
+                file_id=OuterRef("file_id"),
+                seq__gt=OuterRef("seq"),
+            )
+        )
+    )
+    removed = 0
+    while ids := list(superseded.values_list("id", flat=True)[:batch_size]):
+        FileChange.objects.filter(id__in=ids).delete()
+        removed += len(ids)
+    return removed
+
+
+# deletes deletions older than `older_than` seconds and raises their users' floors;
+# returns how many
+def expire_tombstones(older_than: int, batch_size: int = 1000) -> int:
+    tombstones = FileChange.objects.filter(
+        kind=FileChange.Kind.DELETE,
+        created_at__lt=now() - timedelta(seconds=older_than),
+    )
+    removed = 0
+    while ids := list(tombstones.values_list("id", flat=True)[:batch_size]):
+        with transaction.atomic():
+            batch = FileChange.objects.filter(id__in=ids)
+            for owner_id, seq in batch.values_list("user_id").annotate(Max("seq")):
+                FileChangeSequence.objects.filter(user_id=owner_id).update(
+                    floor=Greatest("floor", seq)
+                )
+            batch.delete()
+        removed += len(ids)
+    return removed
@@ -0,0 +1,113 @@
+import hashlib
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator
+from config import Config
+
+
+# Reference content-defined chunker (FastCDC, Xia et al. 2016) for clients of the
+# chunked upload API. Cut points depend only on the bytes around them, so an edit
+# shifts the boundaries of the chunks it touches and every other chunk keeps its
+# hash, and only those few chunks have to be uploaded again.
+#
+# The gear hash is sequential, so there is nothing to vectorize in pure Python; the
+# speed comes from FastCDC's own tricks: no hashing inside the first `min_size` bytes
+# of a chunk, a single table lookup, shift and add per byte, and normalized chunking
+# (a stricter mask before `avg_size`, a looser one after) instead of a second pass.
+
+_MASK_64 = (1 << 64) - 1
+
+# 256 fixed pseudo-random 64-bit values, every client must use the same table
+GEAR: tuple[int, ...] = tuple(
+    int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "big") for i in range(256)
+)
+
+
+def _spread_mask(bits: int) -> int:
+    # `bits` ones spread evenly over the top 48 bits, which depend on the last 48+ bytes
+    positions = (63 - (i * 48) // bits for i in range(bits))
+    mask = 0
+    for position in positions:
+        mask |= 1 << position
+    return mask
+
+
+@dataclass(frozen=True)
+class Chunk:
+    offset: int
+    length: int
+    checksum: str  # SHA-256 hex digest
+
+
+class FastCDC:
+    def __init__(
+        self,
+        min_size: int = Config.CDC_MIN_CHUNK_SIZE,
+        avg_size: int = Config.CDC_AVG_CHUNK_SIZE,
+        max_size: int = Config.CDC_MAX_CHUNK_SIZE,
+    ):
+        if not 0 < min_size <= avg_size <= max_size:
+            raise ValueError("Chunk sizes must satisfy 0 < min <= avg <= max")
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        bits = max(avg_size.bit_length() - 1, 3)
+        self.mask_s = _spread_mask(bits + 2)  # harder to match, before avg_size
+        self.mask_l = _spread_mask(bits - 2)  # easier to match, after avg_size
+
+    # length of the chunk starting at data[0], data holds at most max_size bytes
+    def cut(self, data: bytes) -> int:
+        size = len(data)
+        if size <= self.min_size:
+            return size
+        normal = min(self.avg_size, size)
+        gear = GEAR
+        h = 0
+
+        i = self.min_size
+        mask = self.mask_s
+        for byte in data[self.min_size : normal]:
+            h = ((h << 1) + gear[byte]) & _MASK_64
+            i += 1
+            if not h & mask:
+                return i
+
+        mask = self.mask_l
+        for byte in data[normal:size]:
+            h = ((h << 1) + gear[byte]) & _MASK_64
+            i += 1
+            if not h & mask:
+                return i
+        return size
+
+    def chunks(self, data: bytes) -> Iterator[Chunk]:
+        view = memoryview(data)
+        offset = 0
+        while offset < len(data):
+            length = self.cut(bytes(view[offset : offset + self.max_size]))
+            yield Chunk(
+                offset,
+                length,
+                hashlib.sha256(view[offset : offset + length]).hexdigest(),
+            )
+            offset += length
+
+    # bounded-memory chunking of a file object, holds about 2 * max_size bytes
+    def chunk_stream(
+        self, stream: BinaryIO, read_size: int | None = None
+    ) -> Iterator[Chunk]:
+        read_size = read_size or self.max_size
+        buffer = b""
+        offset = 0
+        eof = False
+        while True:
+            while not eof and len(buffer) < self.max_size:
+                data = stream.read(read_size)
+                if not data:
+                    eof = True
+                buffer += data
+            if not buffer:
+                return
+            length = self.cut(buffer[: self.max_size])
+            yield Chunk(offset, length, hashlib.sha256(buffer[:length]).hexdigest())
+            offset += length
+            buffer = buffer[length:]
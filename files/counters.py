@@ -0,0 +1,87 @@
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+from django.db import close_old_connections, connection
+from django.db.models import F, Model
+from config import Config
+from .models import SharedFileLink
+
+
+logger = logging.getLogger(__name__)
+
+
+# Counter increments buffered in process and written by a background thread every
+# `flush_interval` seconds as one UPDATE per row, so a row hit by every request (a
+# viral shared link) is written a few times a minute instead of on every hit.
+# Increments not flushed yet are lost if the process dies.
+class BufferedCounter:
+    def __init__(self, model: type[Model], field: str, flush_interval: float):
+        self.model = model
+        self.field = field
+        self.flush_interval = flush_interval
+        self._pending: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+
+    def add(self, pk, n: int = 1) -> None:
+        self._ensure_thread()
+        with self._lock:
+            self._pending[pk] += n
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        items = list(pending.items())
+        for i, (pk, n) in enumerate(items):
+            try:
+                self.model.objects.filter(pk=pk).update(
+                    **{self.field: F(self.field) + n}
+                )
+            except Exception:
+                # keep this row's increments and the ones not tried yet for the
+                # next flush
+                with self._lock:
+                    self._pending.update(dict(items[i:]))
+                raise
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(self.flush_interval + 5)
+        self.flush()
+
+    def _ensure_thread(self) -> None:
+        # the thread doesn't survive a fork, start one per worker process
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name=f"{self.field}-counter", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.wait(self.flush_interval):
+                try:
+                    close_old_connections()
+                    self.flush()
+                except Exception:
+                    logger.exception("Counter flush failed")
+        finally:
+            connection.close()
+
+
+# downloads of shared links without a download limit, see AccessSharedLinkView
+link_downloads = BufferedCounter(
+    SharedFileLink, "download_count", Config.SHARED_LINK_COUNT_FLUSH_INTERVAL
+)
+atexit.register(link_downloads.stop)
@@ -0,0 +1,179 @@
+import uuid
+from django.db import transaction
+from django.db.models import F
+from config import Config
+from users.models import UserProfile
+from .models import File, FileChunk, StoredObject
+
+
+# Content-addressed storage: an upload whose SHA-256 and size match an object that is
+# already stored creates a File pointing at that object instead of a new upload.
+#
+# The checksum is supplied by the client, so anyone who knows a file's hash could
+# claim its content. DEDUP_SCOPE therefore defaults to "user", where only the owner's
+# own objects are reused; "global" shares objects between users, "off" disables it.
+# With "global" only objects whose content the server checked against the checksum
+# (StoredObject.verified) are reused, so nobody can plant other content under a
+# popular file's hash; unverified uploads, like multipart ones, are never shared.
+
+
+def _scope_owner(profile: UserProfile) -> UserProfile | None:
+    return profile if Config.DEDUP_SCOPE == "user" else None
+
+
+# raw owner id of a File's scope, without loading the profile
+def _scope_owner_id(file_obj: File) -> int | None:
+    return file_obj.owner_id_id if Config.DEDUP_SCOPE == "user" else None
+
+
+# objects an upload of `profile` may reuse
+def _reusable(profile: UserProfile):
+    objects = StoredObject.objects.filter(owner=_scope_owner(profile), ref_count__gt=0)
+    return objects if Config.DEDUP_SCOPE == "user" else objects.filter(verified=True)
+
+
+def find_stored_object(
+    profile: UserProfile, checksum: str, file_size: int
+) -> StoredObject | None:
+    if Config.DEDUP_SCOPE == "off":
+        return None
+    return _reusable(profile).filter(checksum=checksum, file_size=file_size).first()
+
+
+# stored objects matching any of the (checksum, file_size) keys, in one query per batch
+def find_stored_objects(
+    profile: UserProfile, keys: set[tuple[str, int]]
+) -> dict[tuple[str, int], StoredObject]:
+    if Config.DEDUP_SCOPE == "off" or not keys:
+        return {}
+    found: dict[tuple[str, int], StoredObject] = {}
+    checksums = sorted({checksum for checksum, _ in keys})
+    for i in range(0, len(checksums), IN_BATCH_SIZE):
+        for stored in _reusable(profile).filter(
+            checksum__in=checksums[i : i + IN_BATCH_SIZE]
+        ):
+            key = (stored.checksum, stored.file_size)
+            if key in keys:
+                found.setdefault(key, stored)
+    return found
+
+
+# saves a new File pointing at an existing object, returns False if the object went away
+def link_existing(file_obj: File, stored: StoredObject) -> bool:
+    with transaction.atomic():
+        updated = StoredObject.objects.filter(id=stored.id, ref_count__gt=0).update(
+            ref_count=F("ref_count") + 1
+        )
+        if not updated:
+            return False
+        file_obj.stored_object = stored
+        file_obj.file_path = stored.storage_path
+        file_obj.save(force_insert=True)
+    return True
+
+
+# registers the object of a freshly confirmed upload so later uploads can reuse it;
+# `verified` when the server checked its content against the checksum
+def register_upload(file_obj: File, verified: bool) -> None:
+    if file_obj.stored_object_id is not None or file_obj.chunked:
+        return
+    file_obj.stored_object = StoredObject.objects.create(
+        id=uuid.uuid4(),
+        owner_id=_scope_owner_id(file_obj),
+        checksum=file_obj.checksum,
+        file_size=file_obj.file_size,
+        storage_path=file_obj.file_path,
+        ref_count=1,
+        verified=verified,
+    )
+    file_obj.save(update_fields=["stored_object"])
+
+
+def register_uploads(file_objs: list[File], verified: bool) -> None:
+    new: list[File] = [
+        f for f in file_objs if f.stored_object_id is None and not f.chunked
+    ]
+    for file_obj in new:
+        file_obj.stored_object = StoredObject(
+            id=uuid.uuid4(),
+            owner_id=_scope_owner_id(file_obj),
+            checksum=file_obj.checksum,
+            file_size=file_obj.file_size,
+            storage_path=file_obj.file_path,
+            ref_count=1,
+            verified=verified,
+        )
+    StoredObject.objects.bulk_create(
+        [f.stored_object for f in new], batch_size=IN_BATCH_SIZE
+    )
+    File.objects.bulk_update(new, ["stored_object"], batch_size=IN_BATCH_SIZE)
+
+
+# drops the File's reference, returns the storage path to delete if it was the last
+def release(file_obj: File) -> str | None:
+    if file_obj.chunked:
+        return None  # chunks are released with the manifest rows
+    if file_obj.stored_object_id is None:
+        return file_obj.file_path  # never confirmed, or uploaded before dedup
+    with transaction.atomic():
+        stored = StoredObject.objects.select_for_update().get(
+            id=file_obj.stored_object_id
+        )
+        stored.ref_count -= 1
+        file_obj.stored_object = None
+        file_obj.save(update_fields=["stored_object"])
+        if stored.ref_count > 0:
+            stored.save(update_fields=["ref_count"])
+            return None
+        stored.delete()
+    return stored.storage_path
+
+
+# Chunk-level deduplication for chunked files. Chunks are stored once per scope under
+# a path derived from their hash, so the path alone identifies identical content.
+
+IN_BATCH_SIZE = 900  # stay under SQLite's bound parameter limit
+
+
+def chunk_storage_path(profile: UserProfile, checksum: str) -> str:
+    if Config.DEDUP_SCOPE == "global":
+        return f"chunks/{checksum}"
+    return f"chunks/{profile.id}/{checksum}"
+
+
+# the subset of chunk paths whose content is already stored. Runs in the transaction
+# writing the manifest that will reuse them: the rows found are locked, so deleting
+# their file waits for the new manifest to commit, and then doesn't see the chunks
+# as orphaned
+def present_chunk_paths(paths: set[str]) -> set[str]:
+    if Config.DEDUP_SCOPE == "off":
+        return set()
+    present: set[str] = set()
+    paths = sorted(paths)
+    for i in range(0, len(paths), IN_BATCH_SIZE):
+        # instances rather than values_list, which would lock the joined files too
+        present.update(
+            chunk.storage_path
+            for chunk in FileChunk.objects.select_for_update(of=("self",))
+            .filter(
+                storage_path__in=paths[i : i + IN_BATCH_SIZE],
+                file_id__chunked=True,
+                uploaded=True,
+            )
+            .only("storage_path")
+        )
+    return present
+
+
+# the subset of chunk paths no manifest refers to any more, safe to delete
+def orphaned_chunk_paths(paths: set[str]) -> set[str]:
+    referenced: set[str] = set()
+    paths = sorted(paths)
+    for i in range(0, len(paths), IN_BATCH_SIZE):
+        referenced.update(
+            FileChunk.objects.filter(
+                storage_path__in=paths[i : i + IN_BATCH_SIZE],
+                file_id__chunked=True,
+            ).values_list("storage_path", flat=True)
+        )
+    return set(paths) - referenced
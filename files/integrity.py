@@ -0,0 +1,110 @@
+import base64
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+from config import Config
+from . import multipart, storage
+from .models import File
+
+
+# Checks that what lands in the bucket is what the client declared, without reading
+# objects back. Presigned PUT URLs sign an x-amz-checksum-sha256 header carrying
+# File.checksum, so the object store computes the SHA-256 while receiving the body
+# and rejects a mismatch; confirming an upload then only needs a HEAD to see that
+# the object exists with the declared size (and checksum, where the store reports
+# it). Uploads proxied through Silo are hashed as they stream past instead.
+# Multipart uploads from clients aren't covered: S3 only keeps per-part checksums.
+
+CHECKSUM_HEADER = "x-amz-checksum-sha256"
+READ_SIZE = 1024 * 1024
+
+
+def _checksum_b64(checksum: str) -> str:
+    return base64.b64encode(bytes.fromhex(checksum)).decode()
+
+
+# headers the client must send with its PUT, signed into the URL
+def upload_headers(checksum: str) -> dict[str, str]:
+    if not Config.UPLOAD_VERIFY_CHECKSUM:
+        return {}
+    return {CHECKSUM_HEADER: _checksum_b64(checksum)}
+
+
+def presigned_put(object_name: str, checksum: str) -> tuple[str, dict[str, str]]:
+    headers = upload_headers(checksum)
+    return storage.presigned_put_url(object_name, headers=headers or None), headers
+
+
+def object_matches(object_name: str, size: int, checksum: str) -> bool:
+    try:
+        stat = storage.backend().stat(object_name)
+    except storage.StorageError:
+        return False
+    if stat is None or stat.size != size:
+        return False
+    # the PUT was only accepted with the signed checksum, a store that doesn't
+    # report it back is trusted on size
+    return stat.checksum is None or stat.checksum == _checksum_b64(checksum)
+
+
+def verify_object(file_obj: File) -> bool:
+    return object_matches(file_obj.file_path, file_obj.file_size, file_obj.checksum)
+
+
+# keys of the (key, object_name, size, checksum) items whose objects match, the
+# HEADs run concurrently
+def verify_objects(items: list[tuple]) -> set:
+    if not items:
+        return set()
+    with ThreadPoolExecutor(
+        max_workers=min(Config.UPLOAD_VERIFY_WORKERS, len(items))
+    ) as executor:
+        results = executor.map(lambda item: object_matches(*item[1:]), items)
+        return {item[0] for item, ok in zip(items, results) if ok}
+
+
+# Streams `stream` into an open multipart upload of the file's object, hashing it on
+# the way, and completes the upload if the body matches the file's size and
+# checksum. Otherwise the upload is aborted and the reason returned. Holds at most
+# one part plus one read in memory.
+def stream_upload(
+    stream: BinaryIO | None, file_obj: File, upload_id: str
+) -> str | None:
+    part_size: int = file_obj.part_size or multipart.part_size_for(file_obj.file_size)
+    digest = hashlib.sha256()
+    etags: dict[int, str] = {}
+    received = 0
+    part = bytearray()
+
+    def flush(data: bytes) -> None:
+        index = len(etags)
+        etags[index] = multipart.upload_part(file_obj.file_path, upload_id, index, data)
+
+    try:
+        while stream is not None:
+            data = stream.read(READ_SIZE)
+            if not data:
+                break
+            received += len(data)
+            if received > file_obj.file_size:
+                multipart.abort_multipart_upload(file_obj.file_path, upload_id)
+                return "Body is larger than the declared file size"
+            digest.update(data)
+            part += data
+            if len(part) >= part_size:
+                flush(bytes(part[:part_size]))
+                del part[:part_size]
+
+        if received != file_obj.file_size:
+            multipart.abort_multipart_upload(file_obj.file_path, upload_id)
+            return "Body is smaller than the declared file size"
+        if digest.hexdigest() != file_obj.checksum.lower():
+            multipart.abort_multipart_upload(file_obj.file_path, upload_id)
+            return "Checksum mismatch"
+        if part or not etags:
+            flush(bytes(part))  # the last part may be short, or empty for an empty file
+        multipart.complete_multipart_upload(file_obj.file_path, upload_id, etags)
+    except Exception:
+        multipart.abort_multipart_upload(file_obj.file_path, upload_id)
+        raise
+    return None
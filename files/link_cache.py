@@ -0,0 +1,82 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+from django.core.cache import cache
+from config import Config
+from .models import SharedFileLink
+
+
+# Shared link metadata by token, kept in Django's cache so opening a link doesn't
+# query SharedFileLink and File. Unknown tokens are cached too (negative caching)
+# and malformed ones are rejected before any lookup, so scanning for tokens doesn't
+# reach the database. Entries are dropped when a link is saved or deleted, see
+# files/signals.py. download_count isn't cached, the view counts with a conditional
+# UPDATE.
+#
+# Every worker has to drop the entry of a revoked link, so the cache is only used
+# when Config.CACHE_BACKEND is shared between them; with a per-process cache other
+# workers would keep serving the link for SHARED_LINK_CACHE_TTL seconds.
+
+_TOKEN = re.compile(r"[A-Za-z0-9_-]{16,255}")  # secrets.token_urlsafe() output
+_MISSING = "missing"
+ENABLED: bool = Config.CACHE_SHARED and Config.SHARED_LINK_CACHE_TTL > 0
+
+
+@dataclass(frozen=True)
+class SharedLinkInfo:
+    id: UUID
+    owner_id: int
+    file_id: UUID
+    file_path: str
+    chunked: bool
+    expires_at: datetime | None
+    max_downloads: int | None
+    password_hash: str | None
+    permission: str
+
+
+def _cache_key(token: str) -> str:
+    # tokens are secrets, keep them out of the cache's keyspace
+    return f"silo:link:{hashlib.sha256(token.encode()).hexdigest()}"
+
+
+def resolve(token: str) -> SharedLinkInfo | None:
+    if not token or _TOKEN.fullmatch(token) is None:
+        return None
+    key = _cache_key(token)
+    cached = cache.get(key) if ENABLED else None
+    if cached == _MISSING:
+        return None
+    if cached is not None:
+        return cached
+
+    try:
+        link: SharedFileLink = SharedFileLink.objects.select_related("file_id").get(
+            token=token
+        )
+    except SharedFileLink.DoesNotExist:
+        if ENABLED:
+            cache.set(key, _MISSING, Config.SHARED_LINK_NEGATIVE_TTL)
+        return None
+
+    info = SharedLinkInfo(
+        id=link.id,
+        owner_id=link.owner_id,
+        file_id=link.file_id.id,
+        file_path=link.file_id.file_path,
+        chunked=link.file_id.chunked,
+        expires_at=link.expires_at,
+        max_downloads=link.max_downloads,
+        password_hash=link.password_hash,
+        permission=link.permission,
+    )
+    if ENABLED:
+        cache.set(key, info, Config.SHARED_LINK_CACHE_TTL)
+    return info
+
+
+def invalidate(token: str) -> None:
+    if ENABLED:
+        cache.delete(_cache_key(token))
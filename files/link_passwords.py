@@ -0,0 +1,78 @@
+import hashlib
+import hmac
+import re
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+from config import Config
+from .link_cache import SharedLinkInfo, invalidate
+from .models import SharedFileLink
+
+
+# Shared link passwords are hashed with Django's password hashers (PBKDF2 with
+# 1,000,000 iterations by default, see PASSWORD_HASHERS), which cost a few hundred
+# milliseconds of CPU per check on purpose, on the request's thread. To keep that off
+# repeat downloads, a successful check is remembered for SHARED_LINK_VERIFY_TTL
+# seconds per link and password; to keep guessing from burning CPU, a link allows
+# SHARED_LINK_PASSWORD_ATTEMPTS checks per SHARED_LINK_PASSWORD_WINDOW seconds.
+#
+# Both live in Django's cache. With the default per-process CACHE_BACKEND every
+# worker keeps its own, so a link allows that many attempts per worker and each
+# worker pays for its own first check: run several workers with a shared
+# CACHE_BACKEND such as Redis, see Config.CACHE_BACKEND.
+
+_LEGACY_HASH = re.compile(r"[0-9a-f]{64}")  # unsalted SHA-256 of older links
+
+
+def hash_password(password: str) -> str:
+    return make_password(password)
+
+
+def _verified_key(link: SharedLinkInfo, password: str) -> str:
+    # keyed with SECRET_KEY so the cache never holds a plain hash of the password,
+    # and with the stored hash so a password change invalidates it
+    digest = salted_hmac(
+        "silo.link-password",
+        f"{link.id}\0{link.password_hash}\0{password}",
+        algorithm="sha256",
+    ).hexdigest()
+    return f"silo:link-verified:{digest}"
+
+
+def recently_verified(link: SharedLinkInfo, password: str) -> bool:
+    return cache.get(_verified_key(link, password)) is not None
+
+
+def remember(link: SharedLinkInfo, password: str) -> None:
+    cache.set(_verified_key(link, password), 1, Config.SHARED_LINK_VERIFY_TTL)
+
+
+# counts a password check against the link's budget, False when it is spent
+def allow_attempt(link: SharedLinkInfo) -> bool:
+    key = f"silo:link-attempts:{link.id}"
+    cache.add(key, 0, Config.SHARED_LINK_PASSWORD_WINDOW)
+    try:
+        attempts = cache.incr(key)
+    except ValueError:
+        # expired between add() and incr()
+        cache.set(key, 1, Config.SHARED_LINK_PASSWORD_WINDOW)
+        attempts = 1
+    return attempts <= Config.SHARED_LINK_PASSWORD_ATTEMPTS
+
+
+# constant-time check of `password`; hashes of older links and hashes made with
+# outdated hasher settings are upgraded on success
+def verify(link: SharedLinkInfo, token: str, password: str) -> bool:
+    def upgrade(raw_password: str) -> None:
+        SharedFileLink.objects.filter(id=link.id).update(
+            password_hash=make_password(raw_password)
+        )
+        invalidate(token)  # update() sends no signals
+
+    if _LEGACY_HASH.fullmatch(link.password_hash):
+        digest = hashlib.sha256(password.encode()).hexdigest()
+        if not hmac.compare_digest(digest, link.password_hash):
+            return False
+        upgrade(password)
+        return True
+    return check_password(password, link.password_hash, setter=upgrade)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from config import Config
+from files import changes
+
+
+# Run periodically (cron, systemd timer, ...) to keep the change feed from growing
+# with every change ever made, see files/changes.py.
+class Command(BaseCommand):
+    help = "Drop superseded and expired entries of the file change feed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=Config.CHANGE_FEED_COMPACT_AFTER,
+            help="Age in seconds after which superseded changes are dropped",
+        )
+        parser.add_argument(
+            "--tombstone-ttl",
+            type=int,
+            default=Config.CHANGE_FEED_TOMBSTONE_TTL,
+            help="Age in seconds after which deletions are dropped",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Rows deleted per query"
+        )
+
+    def handle(self, *args, **options):
+        superseded = changes.compact(options["older_than"], options["batch_size"])
+        expired = changes.expire_tombstones(
+            options["tombstone_ttl"], options["batch_size"]
+        )
+        self.stdout.write(
+            f"Dropped {superseded} superseded change(s) and {expired} deletion(s)"
+        )
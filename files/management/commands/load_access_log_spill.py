@@ -0,0 +1,47 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from config import Config
+from files.access_log import decode_event, insert_events
+
+
+# Loads access log events that the writer spilled to disk while the database was
+# slow or unavailable. A file is renamed before it is read, so a worker still
+# spilling starts a new one instead of appending to a file being loaded.
+class Command(BaseCommand):
+    help = "Insert spilled access log events into the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--spill-dir",
+            default=Config.ACCESS_LOG_SPILL_DIR,
+            help="Directory the access log writer spills to",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Rows inserted per query"
+        )
+
+    def handle(self, *args, **options):
+        if not options["spill_dir"]:
+            raise CommandError("No spill directory, set ACCESS_LOG_SPILL_DIR")
+        spill_dir = Path(options["spill_dir"])
+
+        # *.loading files are left over from an interrupted run
+        for path in sorted(spill_dir.glob("*.jsonl")):
+            path.rename(path.with_name(path.name + ".loading"))
+        loaded = 0
+        for path in sorted(spill_dir.glob("*.jsonl.loading")):
+            batch: list[dict] = []
+            with open(path, encoding="utf-8") as spill:
+                for line in spill:
+                    if not line.strip():
+                        continue
+                    batch.append(decode_event(line))
+                    if len(batch) >= options["batch_size"]:
+                        insert_events(batch)
+                        loaded += len(batch)
+                        batch = []
+            insert_events(batch)
+            loaded += len(batch)
+            path.unlink()
+
+        self.stdout.write(f"Loaded {loaded} access log event(s)")
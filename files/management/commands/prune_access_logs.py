@@ -0,0 +1,59 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from config import Config
+from files import partitions, rollups
+
+
+# Run periodically (cron, systemd timer, ...). Access log partitions older than the
+# retention window are dropped as whole tables; the rollups are small enough to
+# prune with DELETEs.
+class Command(BaseCommand):
+    help = "Drop expired access log partitions and prune old rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=Config.ACCESS_LOG_RETENTION_MONTHS,
+            help="Monthly partitions to keep, the current month included",
+        )
+        parser.add_argument(
+            "--hourly-days",
+            type=int,
+            default=Config.ACCESS_LOG_HOURLY_RETENTION_DAYS,
+            help="Days of hourly rollups to keep",
+        )
+        parser.add_argument(
+            "--daily-days",
+            type=int,
+            default=Config.ACCESS_LOG_DAILY_RETENTION_DAYS,
+            help="Days of daily rollups to keep, 0 keeps them all",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report expired partitions"
+        )
+
+    def handle(self, *args, **options):
+        current = now()
+        # months are compared as YYYYMM strings
+        index = current.year * 12 + current.month - 1 - max(options["months"] - 1, 0)
+        oldest_kept = f"{index // 12:04d}{index % 12 + 1:02d}"
+        expired = [m for m in partitions.existing_months() if m < oldest_kept]
+
+        if options["dry_run"]:
+            self.stdout.write(f"Would drop {len(expired)} partition(s): {expired}")
+            return
+
+        for month in expired:
+            partitions.drop_partition(month)
+        hourly, daily = rollups.prune(
+            current - timedelta(days=options["hourly_days"]),
+            (current - timedelta(days=options["daily_days"])).date()
+            if options["daily_days"] > 0
+            else None,
+        )
+        self.stdout.write(
+            f"Dropped {len(expired)} partition(s), pruned {hourly} hourly "
+            f"and {daily} daily rollup row(s)"
+        )
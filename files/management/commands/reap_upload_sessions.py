@@ -0,0 +1,84 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+from config import Config
+from files import changes, dedup, multipart, storage
+from files.models import File, FileChange, FileChunk
+
+
+# Run periodically (cron, systemd timer, ...) to abort uploads that were started but
+# never confirmed, so their parts, objects and chunks no other file uses stop taking
+# up space in the bucket.
+class Command(BaseCommand):
+    help = "Abort stale unconfirmed uploads and free their storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=Config.UPLOAD_SESSION_TTL,
+            help="Age in seconds after which an unconfirmed upload is stale",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Rows reaped per query"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report stale uploads"
+        )
+
+    def handle(self, *args, **options):
+        cutoff = now() - timedelta(seconds=options["older_than"])
+        stale = File.objects.filter(uploaded=False, uploaded_at__lt=cutoff).only(
+            "id", "owner_id", "file_path", "upload_id", "chunked"
+        )
+
+        reaped = 0
+        while True:
+            if options["dry_run"]:
+                reaped += len(stale[: options["batch_size"]])
+                break
+            with transaction.atomic():
+                # rows a confirm holds are skipped, and the rows read are locked so
+                # none gets confirmed before it is deleted; only what is deleted
+                # here has its storage freed
+                batch: list[File] = list(
+                    stale.select_for_update(skip_locked=True)[: options["batch_size"]]
+                )
+                if not batch:
+                    break
+                by_owner: dict[int, list] = defaultdict(list)
+                for file_obj in batch:
+                    by_owner[file_obj.owner_id_id].append(file_obj.id)
+                for owner_id, file_ids in by_owner.items():
+                    changes.record(owner_id, FileChange.Kind.DELETE, file_ids)
+                chunk_paths: set[str] = set(
+                    FileChunk.objects.filter(
+                        file_id__in=[f.id for f in batch if f.chunked]
+                    ).values_list("storage_path", flat=True)
+                )
+                File.objects.filter(
+                    id__in=[f.id for f in batch], uploaded=False
+                ).delete()
+            for file_obj in batch:
+                if file_obj.chunked:
+                    continue  # its chunks are freed below
+                try:
+                    if file_obj.upload_id:
+                        multipart.abort_multipart_upload(
+                            file_obj.file_path, file_obj.upload_id
+                        )
+                    else:
+                        # a single PUT may have landed without being confirmed
+                        storage.backend().delete(file_obj.file_path)
+                except storage.StorageError as e:
+                    if e.code != "NoSuchUpload":
+                        raise
+            # chunks uploaded for these manifests that no other manifest uses
+            for path in dedup.orphaned_chunk_paths(chunk_paths):
+                storage.backend().delete(path)
+            reaped += len(batch)
+
+        verb = "Found" if options["dry_run"] else "Reaped"
+        self.stdout.write(f"{verb} {reaped} stale upload(s)")
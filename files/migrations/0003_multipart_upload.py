@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0002_file_file_type"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="part_size",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="upload_id",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="filechunk",
+            name="etag",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0003_multipart_upload"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredObject",
+            fields=[
+                ("id", models.UUIDField(primary_key=True, serialize=False)),
+                ("checksum", models.CharField(max_length=64)),
+                ("file_size", models.BigIntegerField()),
+                ("storage_path", models.CharField(max_length=255, unique=True)),
+                ("ref_count", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stored_objects",
+                        to="users.userprofile",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="stored_object",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="files",
+                to="files.storedobject",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="storedobject",
+            index=models.Index(
+                fields=["checksum", "file_size"], name="files_store_checksu_80f1f2_idx"
+            ),
+        ),
+    ]
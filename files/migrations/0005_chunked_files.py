@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0004_stored_object"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="chunked",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name="filechunk",
+            name="checksum",
+            field=models.CharField(db_index=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name="filechunk",
+            name="storage_path",
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0005_chunked_files"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fileaccesslog",
+            name="action",
+            field=models.CharField(
+                choices=[
+                    ("UPLOAD", "Upload"),
+                    ("DOWNLOAD", "Download"),
+                    ("DELETE", "Delete"),
+                    ("SHARE", "Share"),
+                ],
+                default="UPLOAD",
+                max_length=10,
+            ),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0006_fileaccesslog_action"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="fileaccesslog",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0007_fileaccesslog_timestamp_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserAgent",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("user_agent", models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="AccessLogDaily",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("day", models.DateField()),
+                ("file_id", models.UUIDField()),
+                ("user_id", models.IntegerField()),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("UPLOAD", "Upload"),
+                            ("DOWNLOAD", "Download"),
+                            ("DELETE", "Delete"),
+                            ("SHARE", "Share"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("count", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["file_id", "day"], name="files_acces_file_id_23ddeb_idx"
+                    )
+                ],
+                "unique_together": {("day", "file_id", "user_id", "action")},
+            },
+        ),
+        migrations.CreateModel(
+            name="AccessLogHourly",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("hour", models.DateTimeField()),
+                ("file_id", models.UUIDField()),
+                ("user_id", models.IntegerField()),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("UPLOAD", "Upload"),
+                            ("DOWNLOAD", "Download"),
+                            ("DELETE", "Delete"),
+                            ("SHARE", "Share"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("count", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "unique_together": {("hour", "file_id", "user_id", "action")},
+            },
+        ),
+        migrations.CreateModel(
+            name="FileAccessStats",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("UPLOAD", "Upload"),
+                            ("DOWNLOAD", "Download"),
+                            ("DELETE", "Delete"),
+                            ("SHARE", "Share"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("count", models.BigIntegerField(default=0)),
+                (
+                    "file_id",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="access_stats",
+                        to="files.file",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("file_id", "action")},
+            },
+        ),
+    ]
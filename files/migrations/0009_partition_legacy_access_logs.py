@@ -0,0 +1,167 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:25
+
+from collections import Counter
+from datetime import timezone
+from django.apps.registry import Apps
+from django.db import migrations, models
+
+
+# Moves rows of the old single files_fileaccesslog table into monthly partitions and
+# the rollups. Partition tables are outside the migration state, so their model is
+# frozen here as it was at this migration instead of importing files.partitions.
+TABLE_PREFIX = "files_fileaccesslog_"
+BATCH_SIZE = 1000
+
+
+def _partition_model(registry: Apps, month: str) -> type[models.Model]:
+    name = f"FileAccessLog{month}"
+    try:
+        return registry.get_model("files", name)
+    except LookupError:
+        pass
+    meta = type(
+        "Meta",
+        (),
+        {
+            "apps": registry,
+            "app_label": "files",
+            "db_table": TABLE_PREFIX + month,
+            "managed": False,
+            # same names files.partitions gives the live partitions' indexes
+            "indexes": [
+                models.Index(fields=["timestamp"], name=f"files_{name.lower()}_ts"),
+                models.Index(
+                    fields=["file_id", "timestamp"], name=f"files_{name.lower()}_ft"
+                ),
+            ],
+        },
+    )
+    return type(
+        name,
+        (models.Model,),
+        {
+            "__module__": __name__,
+            "Meta": meta,
+            "id": models.BigAutoField(primary_key=True),
+            "file_id": models.UUIDField(),
+            "user_id": models.IntegerField(),
+            "ip_address": models.GenericIPAddressField(null=True, blank=True),
+            # files.UserAgent id, without a constraint
+            "user_agent_id": models.IntegerField(null=True),
+            "action": models.CharField(max_length=10),
+            "timestamp": models.DateTimeField(),
+        },
+    )
+
+
+def _ensure_partition(schema_editor, model: type[models.Model]) -> None:
+    table = model._meta.db_table
+    if table in schema_editor.connection.introspection.table_names():
+        return
+    schema_editor.create_model(model)
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+
+
+# adds counts to rollup rows, creating missing ones (INSERT ... ON CONFLICT)
+def _increment(schema_editor, model, key_fields: list[str], counts: Counter) -> None:
+    if not counts:
+        return
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in key_fields]
+    table = quote(model._meta.db_table)
+    columns = ", ".join(quote(field.column) for field in fields)
+    count = quote("count")
+    sql = (
+        f"INSERT INTO {table} ({columns}, {count}) "
+        f"VALUES ({', '.join(['%s'] * (len(fields) + 1))}) "
+        f"ON CONFLICT ({columns}) DO UPDATE SET {count} = {table}.{count} + EXCLUDED.{count}"
+    )
+    params = [
+        [
+            field.get_db_prep_value(value, connection)
+            for field, value in zip(fields, key)
+        ]
+        + [n]
+        for key, n in counts.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _copy_batch(apps, schema_editor, registry: Apps, rows: list[tuple]) -> None:
+    UserAgent = apps.get_model("files", "UserAgent")
+    AccessLogHourly = apps.get_model("files", "AccessLogHourly")
+    AccessLogDaily = apps.get_model("files", "AccessLogDaily")
+    FileAccessStats = apps.get_model("files", "FileAccessStats")
+
+    agents = {row[3][:255] for row in rows if row[3]}
+    UserAgent.objects.bulk_create(
+        [UserAgent(user_agent=agent) for agent in agents], ignore_conflicts=True
+    )
+    agent_ids = dict(
+        UserAgent.objects.filter(user_agent__in=agents).values_list("user_agent", "id")
+    )
+
+    by_month: dict[type[models.Model], list] = {}
+    hourly: Counter = Counter()
+    daily: Counter = Counter()
+    totals: Counter = Counter()
+    for file_id, user_id, ip_address, user_agent, action, timestamp in rows:
+        timestamp = timestamp.astimezone(timezone.utc)
+        model = _partition_model(registry, timestamp.strftime("%Y%m"))
+        by_month.setdefault(model, []).append(
+            model(
+                file_id=file_id,
+                user_id=user_id,
+                ip_address=ip_address,
+                user_agent_id=agent_ids.get((user_agent or "")[:255]),
+                action=action,
+                timestamp=timestamp,
+            )
+        )
+        key = (file_id, user_id, action)
+        hourly[(timestamp.replace(minute=0, second=0, microsecond=0), *key)] += 1
+        daily[(timestamp.date(), *key)] += 1
+        totals[(file_id, action)] += 1  # legacy rows cascade with their file
+
+    for model, logs in by_month.items():
+        _ensure_partition(schema_editor, model)
+        model.objects.bulk_create(logs, batch_size=500)
+    _increment(
+        schema_editor, AccessLogHourly, ["hour", "file_id", "user_id", "action"], hourly
+    )
+    _increment(
+        schema_editor, AccessLogDaily, ["day", "file_id", "user_id", "action"], daily
+    )
+    _increment(schema_editor, FileAccessStats, ["file_id", "action"], totals)
+
+
+def copy_legacy_logs(apps, schema_editor):
+    LegacyLog = apps.get_model("files", "FileAccessLog")
+    registry = Apps()
+    rows = LegacyLog.objects.order_by("id").values_list(
+        "file_id_id", "user_id_id", "ip_address", "user_agent", "action", "timestamp"
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            _copy_batch(apps, schema_editor, registry, batch)
+            batch = []
+    if batch:
+        _copy_batch(apps, schema_editor, registry, batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0008_access_log_partitions"),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_legacy_logs, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name="FileAccessLog",
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0009_partition_legacy_access_logs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sharedfilelink",
+            name="permission",
+            field=models.CharField(
+                choices=[("DOWNLOAD", "Download"), ("VIEW", "View")],
+                default="DOWNLOAD",
+                max_length=10,
+            ),
+        ),
+    ]
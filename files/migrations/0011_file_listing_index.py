@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0010_sharedfilelink_permission"),
+        ("users", "0002_storage_usage_shard"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="file",
+            index=models.Index(
+                fields=["owner_id", "uploaded", "uploaded_at", "id"],
+                include=("file_name", "file_size", "file_type", "checksum"),
+                name="files_file_listing",
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0011_file_listing_index"),
+        ("users", "0003_change_feed_sequence"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileChange",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("seq", models.BigIntegerField()),
+                ("file_id", models.UUIDField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("CREATE", "Create"),
+                            ("CONFIRM", "Confirm"),
+                            ("DELETE", "Delete"),
+                            ("SHARE", "Share"),
+                            ("UNSHARE", "Unshare"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="file_changes",
+                        to="users.userprofile",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "file_id", "seq"],
+                        name="files_filec_user_id_567f17_idx",
+                    ),
+                    models.Index(
+                        fields=["created_at"], name="files_filec_created_258e8b_idx"
+                    ),
+                ],
+                "unique_together": {("user", "seq")},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0012_file_change"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="storedobject",
+            name="verified",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:42
+
+from django.db import migrations, models
+
+
+TABLE_PREFIX = "files_fileaccesslog_"
+
+
+# UserProfile ids are 64-bit. The monthly partitions aren't in the migration state,
+# widen the column of the ones that exist; later ones are created from the model.
+def widen_partition_user_ids(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return  # SQLite integers are 64-bit already
+    for table in connection.introspection.table_names():
+        month = table[len(TABLE_PREFIX) :]
+        if table.startswith(TABLE_PREFIX) and len(month) == 6 and month.isdigit():
+            schema_editor.execute(
+                f"ALTER TABLE {schema_editor.quote_name(table)} "
+                "ALTER COLUMN user_id TYPE bigint"
+            )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0013_storedobject_verified"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="accesslogdaily",
+            name="user_id",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name="accessloghourly",
+            name="user_id",
+            field=models.BigIntegerField(),
+        ),
+        migrations.RunPython(widen_partition_user_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# moves the users' change feed positions off their profiles
+def copy_sequences(apps, schema_editor):
+    UserProfile = apps.get_model("users", "UserProfile")
+    FileChangeSequence = apps.get_model("files", "FileChangeSequence")
+    profiles = (
+        UserProfile.objects.exclude(change_seq=0, change_floor=0)
+        .order_by("id")
+        .values_list("id", "change_seq", "change_floor")
+    )
+    FileChangeSequence.objects.bulk_create(
+        (
+            FileChangeSequence(user_id=user_id, last_seq=last_seq, floor=floor)
+            for user_id, last_seq, floor in profiles.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+def restore_sequences(apps, schema_editor):
+    UserProfile = apps.get_model("users", "UserProfile")
+    FileChangeSequence = apps.get_model("files", "FileChangeSequence")
+    for user_id, last_seq, floor in FileChangeSequence.objects.values_list(
+        "user_id", "last_seq", "floor"
+    ).iterator():
+        UserProfile.objects.filter(id=user_id).update(
+            change_seq=last_seq, change_floor=floor
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0014_access_log_user_id_bigint"),
+        ("users", "0003_change_feed_sequence"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileChangeSequence",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="change_sequence",
+                        serialize=False,
+                        to="users.userprofile",
+                    ),
+                ),
+                ("last_seq", models.BigIntegerField(default=0)),
+                ("floor", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(copy_sequences, restore_sequences),
+    ]
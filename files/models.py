@@ -1,6 +1,34 @@
 from django.db import models
+from django.utils.timezone import now
 from users.models import UserProfile
-from config import Config
+from choices import FILE_TYPE_CHOICES
+
+
+# A stored blob in the bucket, shared by every File with the same content. Files are
+# deduplicated by SHA-256 and size, and the object is removed when its last File is.
+class StoredObject(models.Model):
+    id = models.UUIDField(primary_key=True)
+    # set when deduplication is scoped per user, see Config.DEDUP_SCOPE
+    owner = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name="stored_objects",
+        null=True,
+        blank=True,
+    )
+    checksum = models.CharField(max_length=64)  # SHA-256 checksum
+    file_size = models.BigIntegerField()  # in bytes
+    storage_path = models.CharField(max_length=255, unique=True)
+    ref_count = models.IntegerField(default=0)  # Files pointing at this object
+    # the server checked the content against the checksum, see files/dedup.py
+    verified = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.storage_path} ({self.ref_count} refs)"
+
+    class Meta:
+        indexes = [models.Index(fields=["checksum", "file_size"])]
 
 
 class File(models.Model):
@@ -16,12 +44,37 @@ class File(models.Model):
     # to avoid duplicate uploads
     checksum = models.CharField(max_length=64, db_index=True)  # SHA-256 checksum
     file_type = models.CharField(
-        max_length=50, null=True, blank=True, choices=Config.FILE_TYPE_CHOICES
+        max_length=50, null=True, blank=True, choices=FILE_TYPE_CHOICES
     )  # MIME type
+    # set while an S3 multipart upload is in progress, see files/multipart.py
+    upload_id = models.CharField(max_length=255, null=True, blank=True)
+    part_size = models.BigIntegerField(null=True, blank=True)  # in bytes
+    # content is stored as deduplicated chunks, the FileChunk rows are its manifest
+    chunked = models.BooleanField(default=False)
+    # set once uploaded, file_path is then the stored object's path
+    stored_object = models.ForeignKey(
+        StoredObject,
+        on_delete=models.RESTRICT,
+        related_name="files",
+        null=True,
+        blank=True,
+    )
 
     def __str__(self):
         return f"{self.file_name} ({self.file_size} bytes)"
 
+    class Meta:
+        indexes = [
+            # file listing, newest first with a keyset cursor, see FileListView;
+            # the listed columns ride along on PostgreSQL (ignored elsewhere), so
+            # a page is read from the index alone
+            models.Index(
+                fields=["owner_id", "uploaded", "uploaded_at", "id"],
+                include=["file_name", "file_size", "file_type", "checksum"],
+                name="files_file_listing",
+            )
+        ]
+
 
 # for bigger files
 class FileChunk(models.Model):
@@ -32,8 +85,15 @@ class FileChunk(models.Model):
     chunk_index = models.IntegerField()  # index of the chunk
     chunk_size = models.BigIntegerField()  # in bytes
     uploaded_at = models.DateTimeField(auto_now_add=True)
-    checksum = models.CharField(max_length=64)  # SHA-256 checksum of the chunk
-    storage_path = models.CharField(max_length=255)  # path in storage backend
+    checksum = models.CharField(
+        max_length=64, db_index=True
+    )  # SHA-256 checksum of the chunk
+    storage_path = models.CharField(
+        max_length=255, db_index=True
+    )  # path in storage backend, shared by identical chunks of chunked files
+    etag = models.CharField(
+        max_length=64, null=True, blank=True
+    )  # ETag returned by S3 for a multipart part
     uploaded = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -44,28 +104,89 @@ class FileChunk(models.Model):
         unique_together = ("file_id", "chunk_index")
 
 
-class FileAccessLog(models.Model):
+# Interned User-Agent strings, log rows keep only the id
+class UserAgent(models.Model):
     id = models.AutoField(primary_key=True)
-    file_id = models.ForeignKey(
-        File, on_delete=models.CASCADE, related_name="access_logs", db_index=True
-    )
-    user_id = models.ForeignKey(
-        UserProfile,
-        on_delete=models.CASCADE,
-        related_name="file_access_logs",
-        db_index=True,
-    )
+    user_agent = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.user_agent
+
+
+# One row per access. The rows live in monthly tables (files_fileaccesslog_YYYYMM),
+# see files/partitions.py; this model only describes their columns. File and user
+# are plain ids rather than foreign keys, partitions outlive the files they mention
+# and are dropped whole by `manage.py prune_access_logs`.
+class FileAccessLog(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    file_id = models.UUIDField()
+    user_id = models.BigIntegerField()  # UserProfile id
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.CharField(max_length=255, null=True, blank=True)
-    action = models.enums.TextChoices("Action", "UPLOAD DOWNLOAD DELETE SHARE")
-    timestamp = models.DateTimeField(auto_now_add=True)
-    token = models.CharField(
-        max_length=255, null=True, blank=True
-    )  # for sharing via token links
+    user_agent = models.ForeignKey(
+        UserAgent,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        null=True,
+    )
+    Action = models.enums.TextChoices("Action", "UPLOAD DOWNLOAD DELETE SHARE")
+    action = models.CharField(max_length=10, choices=Action.choices)
+    # set when the event happens, rows are inserted later in batches
+    timestamp = models.DateTimeField(default=now)
 
     def __str__(self):
         return f"{self.user_id} {self.action} {self.file_id} at {self.timestamp}"
 
+    class Meta:
+        abstract = True
+        indexes = [
+            models.Index(fields=["timestamp"], name="%(app_label)s_%(class)s_ts"),
+            models.Index(
+                fields=["file_id", "timestamp"], name="%(app_label)s_%(class)s_ft"
+            ),
+        ]
+
+
+# Access counts per hour, file, user and action, kept for
+# Config.ACCESS_LOG_HOURLY_RETENTION_DAYS
+class AccessLogHourly(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    hour = models.DateTimeField()
+    file_id = models.UUIDField()
+    user_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=FileAccessLog.Action.choices)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("hour", "file_id", "user_id", "action")
+
+
+# Access counts per day, file, user and action
+class AccessLogDaily(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    day = models.DateField()
+    file_id = models.UUIDField()
+    user_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=FileAccessLog.Action.choices)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("day", "file_id", "user_id", "action")
+        indexes = [models.Index(fields=["file_id", "day"])]
+
+
+# All-time access counts per file and action, one indexed lookup per file
+class FileAccessStats(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    file_id = models.ForeignKey(
+        File, on_delete=models.CASCADE, related_name="access_stats"
+    )
+    action = models.CharField(max_length=10, choices=FileAccessLog.Action.choices)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("file_id", "action")
+
 
 class SharedFileLink(models.Model):
     id = models.UUIDField(primary_key=True)
@@ -85,10 +206,56 @@ class SharedFileLink(models.Model):
     expires_at = models.DateTimeField(null=True, blank=True)  # null means never expires
     max_downloads = models.IntegerField(null=True, blank=True)  # null means unlimited
     download_count = models.IntegerField(default=0)
-    permission = models.enums.TextChoices("Permission", "DOWNLOAD VIEW")
+    Permission = models.enums.TextChoices("Permission", "DOWNLOAD VIEW")
+    permission = models.CharField(
+        max_length=10, choices=Permission.choices, default=Permission.DOWNLOAD
+    )
     password_hash = models.CharField(
         max_length=255, null=True, blank=True
     )  # to make it password protected
 
     def __str__(self):
         return f"Shared link for {self.file_id} by {self.owner}"
+
+
+# A user's position in the change feed, in a row of its own so that numbering
+# changes locks only this row and not the user's profile, see files/changes.py
+class FileChangeSequence(models.Model):
+    user = models.OneToOneField(
+        UserProfile,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="change_sequence",
+    )
+    # last seq handed out to the user's FileChange rows
+    last_seq = models.BigIntegerField(default=0)
+    # cursors below this missed changes removed by compaction and must resync
+    floor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} at #{self.last_seq}"
+
+
+# Per-user change log read by sync clients, see files/changes.py. seq comes from
+# FileChangeSequence in the transaction making the change, so a user's changes
+# become visible in seq order.
+class FileChange(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="file_changes"
+    )
+    seq = models.BigIntegerField()
+    file_id = models.UUIDField()  # not a foreign key, the row outlives a deleted file
+    Kind = models.enums.TextChoices("Kind", "CREATE CONFIRM DELETE SHARE UNSHARE")
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    created_at = models.DateTimeField(default=now)
+
+    def __str__(self):
+        return f"{self.user_id} #{self.seq} {self.kind} {self.file_id}"
+
+    class Meta:
+        unique_together = ("user", "seq")
+        indexes = [
+            models.Index(fields=["user", "file_id", "seq"]),  # compaction
+            models.Index(fields=["created_at"]),
+        ]
@@ -0,0 +1,71 @@
+from config import Config
+from . import storage
+
+
+# S3 limits for multipart uploads
+MIN_PART_SIZE = 5 * 1024 * 1024  # every part but the last must be at least 5 MiB
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def part_size_for(file_size: int, requested: int | None = None) -> int:
+    # smallest part size >= the requested one that keeps the upload within MAX_PARTS
+    part_size = max(requested or Config.MULTIPART_PART_SIZE, MIN_PART_SIZE)
+    minimum = -(-file_size // MAX_PARTS)
+    return min(max(part_size, minimum), MAX_PART_SIZE)
+
+
+def part_count(file_size: int, part_size: int) -> int:
+    return max(1, -(-file_size // part_size))
+
+
+# compact [first, last] ranges of sorted, distinct chunk indexes
+def to_ranges(indexes: list[int]) -> list[list[int]]:
+    ranges: list[list[int]] = []
+    for index in indexes:
+        if ranges and ranges[-1][1] == index - 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    return ranges
+
+
+# The S3 calls themselves are made by the storage backend, see files/storage.py.
+
+
+def create_multipart_upload(object_name: str, content_type: str | None = None) -> str:
+    return storage.backend().create_multipart(object_name, content_type)
+
+
+# chunk_index is 0-based like FileChunk.chunk_index, S3 part numbers start at 1
+def presigned_part_url(object_name: str, upload_id: str, chunk_index: int) -> str:
+    return storage.presigned_put_url(
+        object_name,
+        extra_query={
+            "partNumber": str(chunk_index + 1),
+            "uploadId": upload_id,
+        },
+    )
+
+
+# uploads a part from Silo itself, for proxied uploads; returns its ETag
+def upload_part(object_name: str, upload_id: str, chunk_index: int, data: bytes) -> str:
+    return storage.backend().upload_part(object_name, upload_id, chunk_index + 1, data)
+
+
+def list_uploaded_parts(object_name: str, upload_id: str) -> dict[int, str]:
+    # chunk_index -> ETag of every part received so far
+    parts = storage.backend().list_parts(object_name, upload_id)
+    return {number - 1: etag for number, etag in parts.items()}
+
+
+def complete_multipart_upload(
+    object_name: str, upload_id: str, etags: dict[int, str]
+) -> None:
+    storage.backend().complete_multipart(
+        object_name, upload_id, {index + 1: etag for index, etag in etags.items()}
+    )
+
+
+def abort_multipart_upload(object_name: str, upload_id: str) -> None:
+    storage.backend().abort_multipart(object_name, upload_id)
@@ -0,0 +1,89 @@
+import threading
+from datetime import datetime, timezone
+from django.db import DatabaseError, connection
+from .models import FileAccessLog
+
+
+# Access logs are partitioned by month: every month gets its own table,
+# files_fileaccesslog_YYYYMM, created by the first write into it. Retention drops
+# whole tables (`manage.py prune_access_logs`), so old logs go without row DELETEs.
+# The tables are not part of the migration state, their models are built here from
+# FileAccessLog.
+
+TABLE_PREFIX = "files_fileaccesslog_"
+
+_models: dict[str, type[FileAccessLog]] = {}
+_created: set[str] = set()  # partitions known to exist
+_lock = threading.Lock()
+
+
+def month_of(timestamp: datetime) -> str:
+    return timestamp.astimezone(timezone.utc).strftime("%Y%m")
+
+
+def partition_model(month: str) -> type[FileAccessLog]:
+    model = _models.get(month)
+    if model is None:
+        with _lock:
+            model = _models.get(month)
+            if model is None:
+                meta = type(
+                    "Meta",
+                    (FileAccessLog.Meta,),
+                    {
+                        "app_label": "files",
+                        "db_table": TABLE_PREFIX + month,
+                        "managed": False,
+                    },
+                )
+                model = type(
+                    f"FileAccessLog{month}",
+                    (FileAccessLog,),
+                    {"__module__": FileAccessLog.__module__, "Meta": meta},
+                )
+                _models[month] = model
+    return model
+
+
+# months that have a partition, oldest first
+def existing_months() -> list[str]:
+    months = []
+    for table in connection.introspection.table_names():
+        month = table[len(TABLE_PREFIX) :]
+        if table.startswith(TABLE_PREFIX) and len(month) == 6 and month.isdigit():
+            months.append(month)
+    return sorted(months)
+
+
+def _create_table(editor, model: type[FileAccessLog]) -> None:
+    editor.create_model(model)
+    # create_model leaves out the indexes of unmanaged models
+    for index in model._meta.indexes:
+        editor.add_index(model, index)
+
+
+# creates the month's table unless it exists, must run outside a transaction unless
+# the caller passes its own schema editor (as migrations do)
+def ensure_partition(month: str, schema_editor=None) -> type[FileAccessLog]:
+    model = partition_model(month)
+    if month in _created:
+        return model
+    if month not in existing_months():
+        try:
+            if schema_editor is not None:
+                _create_table(schema_editor, model)
+            else:
+                with connection.schema_editor() as editor:
+                    _create_table(editor, model)
+        except DatabaseError:
+            # another process created it first
+            if month not in existing_months():
+                raise
+    _created.add(month)
+    return model
+
+
+def drop_partition(month: str) -> None:
+    with connection.schema_editor() as editor:
+        editor.delete_model(partition_model(month))
+    _created.discard(month)
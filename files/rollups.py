@@ -0,0 +1,83 @@
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+from django.db import connection
+from django.db.models import Model
+from django.utils.timezone import now
+from .models import AccessLogDaily, AccessLogHourly, FileAccessStats
+
+
+# Access counts rolled up from the log as it is written: per hour, per day and all
+# time per file. Reports read these instead of scanning log partitions, a file's
+# totals are at most one row per action.
+
+
+# adds counts to rows keyed by `key_fields`, creating missing rows, in one statement
+# per batch (INSERT ... ON CONFLICT DO UPDATE, SQLite 3.24+ and PostgreSQL)
+def _increment(
+    model: type[Model], key_fields: list[str], counts: dict[tuple, int]
+) -> None:
+    if not counts:
+        return
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in key_fields]
+    table = quote(model._meta.db_table)
+    columns = ", ".join(quote(field.column) for field in fields)
+    count = quote("count")
+    sql = (
+        f"INSERT INTO {table} ({columns}, {count}) "
+        f"VALUES ({', '.join(['%s'] * (len(fields) + 1))}) "
+        f"ON CONFLICT ({columns}) DO UPDATE SET {count} = {table}.{count} + EXCLUDED.{count}"
+    )
+    params = [
+        [
+            field.get_db_prep_value(value, connection)
+            for field, value in zip(fields, key)
+        ]
+        + [n]
+        for key, n in counts.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+# `stats_events` is the subset of `events` whose files still exist
+def record(events: list[dict[str, Any]], stats_events: list[dict[str, Any]]) -> None:
+    hourly: Counter = Counter()
+    daily: Counter = Counter()
+    for event in events:
+        timestamp = event["timestamp"].astimezone(timezone.utc)
+        key = (event["file_id"], event["user_id"], event["action"])
+        hourly[(timestamp.replace(minute=0, second=0, microsecond=0), *key)] += 1
+        daily[(timestamp.date(), *key)] += 1
+    totals = Counter((event["file_id"], event["action"]) for event in stats_events)
+
+    _increment(AccessLogHourly, ["hour", "file_id", "user_id", "action"], hourly)
+    _increment(AccessLogDaily, ["day", "file_id", "user_id", "action"], daily)
+    _increment(FileAccessStats, ["file_id", "action"], totals)
+
+
+def file_totals(file_id) -> dict[str, int]:
+    return dict(
+        FileAccessStats.objects.filter(file_id=file_id).values_list("action", "count")
+    )
+
+
+# per-day counts of one action for the last `days` days, oldest first
+def file_daily(file_id, action: str, days: int) -> list[tuple[date, int]]:
+    since = now().astimezone(timezone.utc).date() - timedelta(days=days - 1)
+    per_day: Counter = Counter()
+    for day, count in AccessLogDaily.objects.filter(
+        file_id=file_id, day__gte=since, action=action
+    ).values_list("day", "count"):
+        per_day[day] += count  # summed over users
+    return sorted(per_day.items())
+
+
+# deletes rollup rows older than the cutoffs, returns (hourly, daily) rows deleted
+def prune(hourly_before: datetime, daily_before: date | None) -> tuple[int, int]:
+    hourly, _ = AccessLogHourly.objects.filter(hour__lt=hourly_before).delete()
+    daily = 0
+    if daily_before is not None:
+        daily, _ = AccessLogDaily.objects.filter(day__lt=daily_before).delete()
+    return hourly, daily
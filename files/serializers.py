@@ -1,12 +1,52 @@
 from rest_framework import serializers
-from .models import File, FileChunk, FileAccessLog, SharedFileLink
+from config import Config
+from .models import File, FileChunk, SharedFileLink
+
+
+# file names become part of object names, so they can't be or contain a path
+def validate_file_name(value: str) -> str:
+    if value in (".", "..") or "/" in value or "\\" in value:
+        raise serializers.ValidationError(
+            "File name can't contain path separators or be . or .."
+        )
+    return value
+
+
+# SHA-256 in hex, lowercased so the same content always has the same checksum
+class Sha256Field(serializers.RegexField):
+    def __init__(self, **kwargs):
+        super().__init__(r"^[0-9a-fA-F]{64}$", **kwargs)
+
+    def to_internal_value(self, data) -> str:
+        return super().to_internal_value(data).lower()
 
 
 # this serializer is used when a user requests to upload a file
 class FileUploadRequestSerializer(serializers.ModelSerializer):
+    checksum = Sha256Field()
+
     class Meta:
         model = File
         fields = ["file_name", "file_size", "checksum", "file_type"]
+        extra_kwargs = {
+            "file_name": {"validators": [validate_file_name]},
+            "file_size": {"min_value": 0},  # a negative size would credit the quota
+        }
+
+
+# batch variants handle up to Config.BATCH_MAX_FILES files in one request
+class BatchUploadRequestSerializer(serializers.Serializer):
+    files = FileUploadRequestSerializer(
+        many=True, allow_empty=False, max_length=Config.BATCH_MAX_FILES
+    )
+
+
+class BatchFileIdsSerializer(serializers.Serializer):
+    file_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=Config.BATCH_MAX_FILES,
+    )
 
 
 # this serializer is used when a user uploads a file, so the system generates a file id, storage path, and presigned url
@@ -30,14 +70,110 @@ class FileDownloadResponseSerializer(serializers.Serializer):
     file_size = serializers.IntegerField()
 
 
+class FileIdSerializer(serializers.Serializer):
+    file_id = serializers.UUIDField()
+
+
+# multipart upload of large files, parts are recorded as FileChunk rows
+class MultipartUploadInitSerializer(serializers.ModelSerializer):
+    checksum = Sha256Field()
+    part_size = serializers.IntegerField(required=False, min_value=1)
+
+    class Meta:
+        model = File
+        fields = ["file_name", "file_size", "checksum", "file_type", "part_size"]
+        extra_kwargs = {
+            "file_name": {"validators": [validate_file_name]},
+            "file_size": {"min_value": 0},  # a negative size would credit the quota
+        }
+
+
+class MultipartPartURLsRequestSerializer(serializers.Serializer):
+    file_id = serializers.UUIDField()
+    # defaults to every part that hasn't been recorded yet
+    chunk_indexes = serializers.ListField(
+        child=serializers.IntegerField(min_value=0), required=False
+    )
+
+
+class MultipartPartSerializer(serializers.Serializer):
+    chunk_index = serializers.IntegerField(min_value=0)
+    etag = serializers.CharField(max_length=64)
+    checksum = serializers.CharField(max_length=64, required=False, default="")
+    chunk_size = serializers.IntegerField(min_value=0)
+
+
+class MultipartRecordPartsSerializer(serializers.Serializer):
+    file_id = serializers.UUIDField()
+    parts = MultipartPartSerializer(many=True, allow_empty=False)
+
+
+# chunked upload: the client sends the file's content-defined chunk list up front
+class ChunkDescriptorSerializer(serializers.Serializer):
+    checksum = Sha256Field()  # of the chunk
+    chunk_size = serializers.IntegerField(min_value=1)
+
+
+class ChunkedUploadInitSerializer(serializers.ModelSerializer):
+    checksum = Sha256Field()
+    chunks = ChunkDescriptorSerializer(many=True, allow_empty=False)
+
+    class Meta:
+        model = File
+        fields = ["file_name", "file_size", "checksum", "file_type", "chunks"]
+        extra_kwargs = {
+            "file_name": {"validators": [validate_file_name]},
+            "file_size": {"min_value": 0},  # a negative size would credit the quota
+        }
+
+
+class ChunkedUploadConfirmSerializer(serializers.Serializer):
+    file_id = serializers.UUIDField()
+    checksums = serializers.ListField(child=Sha256Field(), allow_empty=True)
+
+
+# query string of the per-file access stats
+class FileStatsQuerySerializer(serializers.Serializer):
+    days = serializers.IntegerField(min_value=1, max_value=366, default=30)
+
+
+# query string of the file listing
+class FileListQuerySerializer(serializers.Serializer):
+    uploaded = serializers.BooleanField(default=True)
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=Config.FILE_LIST_MAX_PAGE_SIZE,
+        default=Config.FILE_LIST_PAGE_SIZE,
+    )
+    cursor = serializers.CharField(required=False, max_length=200)
+
+
+# query string of the change feed
+class ChangeFeedQuerySerializer(serializers.Serializer):
+    cursor = serializers.IntegerField(min_value=0, default=0)  # last seq seen
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=Config.CHANGE_FEED_MAX_PAGE_SIZE,
+        default=Config.CHANGE_FEED_PAGE_SIZE,
+    )
+    # seconds to hold the request open while there are no changes
+    wait = serializers.FloatField(
+        min_value=0, max_value=Config.CHANGE_FEED_MAX_WAIT, default=0
+    )
+
+
 class CreateSharedLinkSerializer(serializers.Serializer):
     file_id = serializers.UUIDField()
     expires_at = serializers.DateTimeField(required=False)
-    max_downloads = serializers.IntegerField(required=False)
+    max_downloads = serializers.IntegerField(required=False, min_value=1)
     password = serializers.CharField(required=False, allow_blank=True)
     permission = serializers.ChoiceField(choices=["DOWNLOAD", "VIEW"])
 
 
+class RevokeSharedLinkSerializer(serializers.Serializer):
+    token = serializers.CharField(max_length=255)
+
+
 class SharedLinkResponseSerializer(serializers.ModelSerializer):
     class Meta:
         model = SharedFileLink
@@ -0,0 +1,162 @@
+from django.core import signing
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.urls import reverse
+from rest_framework.exceptions import AuthenticationFailed
+from config import Config
+from users import quota
+from users.authenticators import Auth0JWTAuthentication
+from . import (
+    access_log,
+    changes,
+    counters,
+    dedup,
+    integrity,
+    link_cache,
+    link_passwords,
+    storage,
+)
+from .models import File, FileChange, SharedFileLink
+
+
+# Steps shared by the DRF views (files/views.py) and their async variants
+# (files/async_views.py). All synchronous; async views call the ones touching the
+# database through sync_to_async.
+
+
+def upload_target(request, file_obj: File) -> tuple[str, dict[str, str]]:
+    if Config.UPLOAD_PROXY:
+        url = reverse("upload-stream", args=[file_obj.id])
+        return request.build_absolute_uri(url), {}
+    return integrity.presigned_put(file_obj.file_path, file_obj.checksum)
+
+
+# inserts a new, unconfirmed File and its CREATE change
+def create_file(file_obj: File) -> None:
+    with transaction.atomic():
+        file_obj.save(force_insert=True)
+        changes.record(file_obj.owner_id_id, FileChange.Kind.CREATE, [file_obj.id])
+
+
+# marks a file uploaded, charges it to the owner's storage and logs the upload;
+# only the first confirm of a file counts, a repeated one returns False. `verified`
+# when the server checked the content against the file's checksum
+def mark_uploaded(request, file_obj: File, verified: bool = False) -> bool:
+    with transaction.atomic():
+        if not File.objects.filter(id=file_obj.id, uploaded=False).update(
+            uploaded=True, upload_id=None
+        ):
+            return False
+        file_obj.uploaded = True
+        file_obj.upload_id = None
+        dedup.register_upload(file_obj, verified)
+        quota.charge(request.profile.id, file_obj.file_size)
+        changes.record(request.profile.id, FileChange.Kind.CONFIRM, [file_obj.id])
+
+    # Log upload action
+    access_log.log_access(request, [file_obj.id], "UPLOAD")
+    return True
+
+
+# plan quota check against stored bytes plus bytes reserved by unconfirmed uploads;
+# sizes are validated as non-negative, a negative one never frees up room
+def has_room(request, additional: int) -> bool:
+    if additional < 0:
+        return False
+    reserved: int | None = File.objects.filter(
+        owner_id=request.profile, uploaded=False, file_size__gt=0
+    ).aggregate(total=Sum("file_size"))["total"]
+    return quota.has_room(request.profile, additional, reserved or 0)
+
+
+# saves an unsaved File as a confirmed copy of identical stored content, if any
+def link_duplicate(request, file_obj: File) -> bool:
+    stored = dedup.find_stored_object(
+        request.profile, file_obj.checksum, file_obj.file_size
+    )
+    if stored is None or not dedup.link_existing(file_obj, stored):
+        return False
+    mark_uploaded(request, file_obj)
+    return True
+
+
+def stream_url(request, file_obj: File) -> str:
+    return request.build_absolute_uri(reverse("download-stream", args=[file_obj.id]))
+
+
+link_stream_signer = signing.TimestampSigner(salt="silo.shared-link-stream")
+
+
+# where a shared link's file is fetched from: a presigned GET URL, or with
+# Config.DOWNLOAD_PROXY a signed URL of StreamSharedLinkView
+def shared_download_url(request, shared_link: link_cache.SharedLinkInfo) -> str:
+    if not Config.DOWNLOAD_PROXY:
+        # reused for hot files until shortly before it expires
+        return storage.shared_get_urls.get(shared_link.file_path)
+    grant: str = link_stream_signer.sign(str(shared_link.id))
+    return request.build_absolute_uri(reverse("shared-link-stream", args=[grant]))
+
+
+# bearer token check for the plain Django views, which DRF doesn't authenticate
+def authenticate(request) -> bool:
+    try:
+        return Auth0JWTAuthentication().authenticate(request) is not None
+    except AuthenticationFailed:
+        return False
+
+
+# the fields listings and the change feed return per file
+FILE_LIST_FIELDS = (
+    "id",
+    "file_name",
+    "file_size",
+    "file_type",
+    "checksum",
+    "uploaded",
+    "uploaded_at",
+)
+
+
+# None when `password` opens the link, else the error's detail, status and headers.
+# A recent success with the same password skips the KDF.
+def check_link_password(
+    shared_link: link_cache.SharedLinkInfo, token: str, password: str
+) -> tuple[str, int, dict[str, str]] | None:
+    if not shared_link.password_hash:
+        return None
+    if not password:
+        return "Invalid password", 403, {}
+    if link_passwords.recently_verified(shared_link, password):
+        return None
+    if not link_passwords.allow_attempt(shared_link):
+        return (
+            "Too many password attempts, try again later",
+            429,
+            {"Retry-After": str(Config.SHARED_LINK_PASSWORD_WINDOW)},
+        )
+    if not link_passwords.verify(shared_link, token, password):
+        return "Invalid password", 403, {}
+    link_passwords.remember(shared_link, password)
+    return None
+
+
+# Counts a download of the link, returns why it can't be downloaded otherwise.
+# Without a limit the count is informational and may be buffered; with one, a
+# single conditional UPDATE checks and increments it so concurrent requests can't
+# exceed the limit.
+def count_link_download(shared_link: link_cache.SharedLinkInfo, current) -> str | None:
+    if shared_link.max_downloads is None and Config.SHARED_LINK_BUFFERED_COUNTS:
+        counters.link_downloads.add(shared_link.id)
+        return None
+    if (
+        SharedFileLink.objects.filter(id=shared_link.id)
+        .filter(
+            Q(max_downloads__isnull=True) | Q(download_count__lt=F("max_downloads"))
+        )
+        .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=current))
+        .update(download_count=F("download_count") + 1)
+    ):
+        return None
+    if shared_link.max_downloads is None:
+        return "Link expired"
+    return "Download limit reached"
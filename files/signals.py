@@ -0,0 +1,15 @@
+import functools
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .link_cache import invalidate
+from .models import SharedFileLink
+
+
+# keep the link cache from serving a changed or revoked link, and drop a negative
+# entry when a link is created with that token. After the commit: dropped earlier,
+# a concurrent lookup could cache the row as it was before the change
+@receiver(post_save, sender=SharedFileLink)
+@receiver(post_delete, sender=SharedFileLink)
+def invalidate_link(sender, instance: SharedFileLink, using: str, **kwargs) -> None:
+    transaction.on_commit(functools.partial(invalidate, instance.token), using=using)
@@ -0,0 +1,164 @@
+import functools
+import hmac
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from hashlib import sha256
+from urllib.parse import quote
+from config import Config
+
+
+# Presigned URLs (AWS Signature V4, query string auth) computed locally. The Minio
+# SDK can look the bucket region up over the network and derives the signing key on
+# every call; here the region is pinned in config and the derived key is cached per
+# (day, region, service), so signing a URL is a handful of HMACs and no I/O.
+# benchmarks/bench_signing.py measures the rate.
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+MAX_EXPIRY = 7 * 24 * 3600  # seconds, the SigV4 limit
+_SAFE_PATH = re.compile(r"[A-Za-z0-9/_.~-]*")
+
+
+def _quote(value: str, safe: str = "") -> str:
+    return quote(value, safe=safe)  # '~' is left alone since Python 3.7
+
+
+class PresignedURLSigner:
+    def __init__(
+        self,
+        endpoint: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        secure: bool = True,
+        service: str = "s3",
+    ):
+        host = endpoint.replace("http://", "").replace("https://", "").rstrip("/")
+        # the default port is not part of the Host header clients will send
+        if (secure and host.endswith(":443")) or (not secure and host.endswith(":80")):
+            host = host.rsplit(":", 1)[0]
+        self.host = host
+        self.base_url = f"{'https' if secure else 'http'}://{host}"
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.service = service
+        self._host_header = f"host:{host}\n"
+        self._signing_keys: dict[tuple[str, str, str], bytes] = {}
+        self._lock = threading.Lock()
+        self._last_context: tuple[int, tuple[str, str, str, bytes]] | None = None
+
+    @classmethod
+    def from_config(cls) -> "PresignedURLSigner":
+        return cls(
+            Config.MINIO_ENDPOINT,
+            Config.MINIO_ACCESS_KEY,
+            Config.MINIO_SECRET_KEY,
+            region=Config.MINIO_REGION,
+            secure=Config.MINIO_SECURE,
+        )
+
+    def signing_key(self, day: str) -> bytes:
+        cache_key = (day, self.region, self.service)
+        key = self._signing_keys.get(cache_key)
+        if key is None:
+            key = hmac.digest(
+                ("AWS4" + self.secret_key).encode(), day.encode(), "sha256"
+            )
+            for part in (self.region, self.service, "aws4_request"):
+                key = hmac.digest(key, part.encode(), "sha256")
+            with self._lock:
+                # keys of past days are useless, keep the dict from growing
+                self._signing_keys = {
+                    k: v for k, v in self._signing_keys.items() if k[0] >= day
+                }
+                self._signing_keys[cache_key] = key
+        return key
+
+    # per-second signing context: (amz_date, scope, quoted credential, signing key)
+    def _context(self, second: int) -> tuple[str, str, str, bytes]:
+        cached = self._last_context
+        if cached is not None and cached[0] == second:
+            return cached[1]
+        amz_date = datetime.fromtimestamp(second, timezone.utc).strftime(
+            "%Y%m%dT%H%M%SZ"
+        )
+        day = amz_date[:8]
+        scope = f"{day}/{self.region}/{self.service}/aws4_request"
+        context = (
+            amz_date,
+            scope,
+            _quote(f"{self.access_key}/{scope}"),
+            self.signing_key(day),
+        )
+        self._last_context = (second, context)
+        return context
+
+    def presign(
+        self,
+        method: str,
+        bucket: str,
+        object_name: str,
+        expires: int = 3600,
+        extra_query: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+        now: datetime | None = None,
+    ) -> str:
+        if not 1 <= expires <= MAX_EXPIRY:
+            raise ValueError("expires must be between 1 second and 7 days")
+        second = int(now.timestamp() if now else time.time())
+        amz_date, scope, credential, key = self._context(second)
+
+        if headers:
+            # extra headers the client must send with exactly these values
+            signed = {"host": self.host}
+            for name, value in headers.items():
+                signed[name.lower()] = value.strip()
+            signed_names = ";".join(sorted(signed))
+            canonical_headers = "".join(f"{k}:{signed[k]}\n" for k in sorted(signed))
+        else:
+            signed_names = "host"
+            canonical_headers = self._host_header
+
+        canonical_query = (
+            f"X-Amz-Algorithm={ALGORITHM}&X-Amz-Credential={credential}"
+            f"&X-Amz-Date={amz_date}&X-Amz-Expires={expires}"
+            f"&X-Amz-SignedHeaders={_quote(signed_names)}"
+        )
+        if extra_query:
+            extra = sorted((_quote(k), _quote(v)) for k, v in extra_query.items())
+            if extra[0][0] > "X-Amz-SignedHeaders":
+                # lowercase names like partNumber sort after the X-Amz-* block
+                canonical_query += "".join(f"&{k}={v}" for k, v in extra)
+            else:
+                query = {
+                    "X-Amz-Algorithm": ALGORITHM,
+                    "X-Amz-Credential": credential,
+                    "X-Amz-Date": amz_date,
+                    "X-Amz-Expires": str(expires),
+                    "X-Amz-SignedHeaders": _quote(signed_names),
+                    **dict(extra),
+                }
+                canonical_query = "&".join(f"{k}={v}" for k, v in sorted(query.items()))
+
+        # most object names need no escaping, skip quote() for those
+        if _SAFE_PATH.fullmatch(object_name) is None:
+            object_name = _quote(object_name, safe="/")
+        path = f"/{bucket}/{object_name}"
+        canonical_request = (
+            f"{method}\n{path}\n{canonical_query}\n"
+            f"{canonical_headers}\n{signed_names}\nUNSIGNED-PAYLOAD"
+        )
+        string_to_sign = (
+            f"{ALGORITHM}\n{amz_date}\n{scope}\n"
+            f"{sha256(canonical_request.encode()).hexdigest()}"
+        )
+        signature = hmac.digest(key, string_to_sign.encode(), "sha256").hex()
+        return f"{self.base_url}{path}?{canonical_query}&X-Amz-Signature={signature}"
+
+
+# built on first use, importing this module doesn't need the MinIO settings
+@functools.cache
+def signer() -> PresignedURLSigner:
+    return PresignedURLSigner.from_config()
@@ -0,0 +1,704 @@
+import abc
+import base64
+import functools
+import hashlib
+import hmac
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import BinaryIO
+from urllib.parse import urlencode
+from django.urls import reverse
+from django.utils.crypto import salted_hmac
+from config import Config
+from Silo import metrics
+from . import signing
+
+
+# Where file contents live. Views and helpers go through backend(), picked by
+# Config.STORAGE_BACKEND:
+#   "minio"  the S3 bucket, clients transfer directly with presigned URLs
+#   "local"  a directory on this node, for single-node installs without MinIO
+#   "memory" a dict in this process, for hermetic tests and benchmarks
+# The local and in-memory backends presign URLs to Silo itself, signed with
+# SECRET_KEY and served by StorageObjectView in files/views.py.
+
+READ_SIZE = 1024 * 1024
+
+
+class StorageError(Exception):
+    def __init__(self, code: str, message: str = ""):
+        super().__init__(f"{code}: {message}" if message else code)
+        self.code = code  # S3 error codes: NoSuchKey, NoSuchUpload, BadDigest...
+
+
+@dataclass(frozen=True)
+class ObjectStat:
+    size: int
+    etag: str
+    checksum: str | None = None  # base64 SHA-256, where the backend keeps it
+
+
+class StorageBackend(abc.ABC):
+    # whether objects are served by StorageObjectView rather than an object store
+    self_served = False
+
+    @abc.abstractmethod
+    def presign(
+        self,
+        method: str,
+        object_name: str,
+        expires: int,
+        headers: dict[str, str] | None = None,
+        extra_query: dict[str, str] | None = None,
+        now: datetime | None = None,
+    ) -> str:
+        raise NotImplementedError
+
+    # None when there is no such object
+    @abc.abstractmethod
+    def stat(self, object_name: str) -> ObjectStat | None:
+        raise NotImplementedError
+
+    def exists(self, object_name: str) -> bool:
+        return self.stat(object_name) is not None
+
+    # a reader with read(), readinto() and close(); length 0 reads to the end
+    @abc.abstractmethod
+    def open(self, object_name: str, offset: int = 0, length: int = 0):
+        raise NotImplementedError
+
+    # stores bytes or a readable stream, rejecting it with BadDigest when `checksum`
+    # (base64 SHA-256) doesn't match
+    @abc.abstractmethod
+    def put(
+        self, object_name: str, data: bytes | BinaryIO, checksum: str | None = None
+    ) -> ObjectStat:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def create_multipart(self, object_name: str, content_type: str | None) -> str:
+        raise NotImplementedError
+
+    # part numbers start at 1, returns the part's ETag
+    @abc.abstractmethod
+    def upload_part(
+        self,
+        object_name: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes | BinaryIO,
+    ) -> str:
+        raise NotImplementedError
+
+    # part number -> ETag of the parts received so far
+    @abc.abstractmethod
+    def list_parts(self, object_name: str, upload_id: str) -> dict[int, str]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def complete_multipart(
+        self, object_name: str, upload_id: str, parts: dict[int, str]
+    ) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def abort_multipart(self, object_name: str, upload_id: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def copy(self, source: str, destination: str) -> None:
+        raise NotImplementedError
+
+    # deleting a missing object is not an error
+    @abc.abstractmethod
+    def delete(self, object_name: str) -> None:
+        raise NotImplementedError
+
+
+class _MinioReader:
+    def __init__(self, response):
+        self._response = response
+
+    def read(self, size: int = -1) -> bytes:
+        return self._response.read(None if size < 0 else size)
+
+    def readinto(self, buffer) -> int:
+        return self._response.readinto(buffer)
+
+    def close(self) -> None:
+        self._response.close()
+        self._response.release_conn()
+
+
+class MinioBackend(StorageBackend):
+    def _call(self, method: str, *args, **kwargs):
+        from minio.error import S3Error
+
+        try:
+            with metrics.timed("s3", method.lstrip("_")):
+                return getattr(Config.s3_client, method)(
+                    Config.MINIO_BUCKET_NAME, *args, **kwargs
+                )
+        except S3Error as e:
+            raise StorageError(e.code, e.message) from e
+
+    def presign(
+        self,
+        method: str,
+        object_name: str,
+        expires: int,
+        headers: dict[str, str] | None = None,
+        extra_query: dict[str, str] | None = None,
+        now: datetime | None = None,
+    ) -> str:
+        # signed locally, see files/signing.py
+        return signing.signer().presign(
+            method,
+            Config.MINIO_BUCKET_NAME,
+            object_name,
+            expires,
+            extra_query=extra_query,
+            headers=headers,
+            now=now,
+        )
+
+    def stat(self, object_name: str) -> ObjectStat | None:
+        try:
+            stat = self._call(
+                "stat_object",
+                object_name,
+                extra_headers={"x-amz-checksum-mode": "ENABLED"},
+            )
+        except StorageError as e:
+            if e.code in ("NoSuchKey", "NotFound", "ResourceNotFound"):
+                return None
+            raise
+        return ObjectStat(
+            stat.size,
+            (stat.etag or "").strip('"'),
+            (stat.metadata or {}).get("x-amz-checksum-sha256"),
+        )
+
+    def open(self, object_name: str, offset: int = 0, length: int = 0):
+        return _MinioReader(
+            self._call("get_object", object_name, offset=offset, length=length)
+        )
+
+    def put(
+        self, object_name: str, data: bytes | BinaryIO, checksum: str | None = None
+    ) -> ObjectStat:
+        headers = {"x-amz-checksum-sha256": checksum} if checksum else None
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data, length = io.BytesIO(data), len(data)
+        else:
+            length = -1
+        result = self._call(
+            "put_object",
+            object_name,
+            data,
+            length,
+            part_size=Config.MULTIPART_PART_SIZE if length < 0 else 0,
+            metadata=headers,
+        )
+        return ObjectStat(max(length, 0), (result.etag or "").strip('"'), checksum)
+
+    # the SDK only exposes multipart uploads through put_object, which streams the
+    # data itself; clients upload parts directly to presigned URLs, so the
+    # individual S3 calls are made through its private helpers here, in one place
+
+    def create_multipart(self, object_name: str, content_type: str | None) -> str:
+        headers = {"Content-Type": content_type or "application/octet-stream"}
+        return self._call("_create_multipart_upload", object_name, headers)
+
+    def upload_part(
+        self,
+        object_name: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes | BinaryIO,
+    ) -> str:
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = data.read()
+        return self._call(
+            "_upload_part", object_name, data, None, upload_id, part_number
+        )
+
+    def list_parts(self, object_name: str, upload_id: str) -> dict[int, str]:
+        parts: dict[int, str] = {}
+        marker = None
+        while True:
+            result = self._call(
+                "_list_parts", object_name, upload_id, part_number_marker=marker
+            )
+            for part in result.parts:
+                parts[part.part_number] = part.etag
+            if not result.is_truncated:
+                return parts
+            marker = result.next_part_number_marker
+
+    def complete_multipart(
+        self, object_name: str, upload_id: str, parts: dict[int, str]
+    ) -> None:
+        from minio.datatypes import Part
+
+        self._call(
+            "_complete_multipart_upload",
+            object_name,
+            upload_id,
+            [Part(number, etag) for number, etag in sorted(parts.items())],
+        )
+
+    def abort_multipart(self, object_name: str, upload_id: str) -> None:
+        self._call("_abort_multipart_upload", object_name, upload_id)
+
+    def copy(self, source: str, destination: str) -> None:
+        from minio.commonconfig import CopySource
+
+        self._call(
+            "copy_object", destination, CopySource(Config.MINIO_BUCKET_NAME, source)
+        )
+
+    def delete(self, object_name: str) -> None:
+        self._call("remove_object", object_name)
+
+
+# Presigned URLs to StorageObjectView: an expiry and an HMAC (keyed with
+# SECRET_KEY) over the method, object, query and signed headers.
+class SelfServedBackend(StorageBackend):
+    self_served = True
+
+    def _signature(
+        self, method: str, object_name: str, query: dict[str, str], headers: dict
+    ) -> str:
+        signed = query.get("X-Silo-SignedHeaders", "")
+        message = "\n".join(
+            [
+                method,
+                object_name,
+                urlencode(sorted(query.items())),
+                *(f"{name}:{headers.get(name, '')}" for name in signed.split(";")),
+            ]
+        )
+        return salted_hmac("silo.storage", message, algorithm="sha256").hexdigest()
+
+    def presign(
+        self,
+        method: str,
+        object_name: str,
+        expires: int,
+        headers: dict[str, str] | None = None,
+        extra_query: dict[str, str] | None = None,
+        now: datetime | None = None,
+    ) -> str:
+        signed_at = int(now.timestamp() if now else time.time())
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        query = {**(extra_query or {}), "X-Silo-Expires": str(signed_at + expires)}
+        if headers:
+            query["X-Silo-SignedHeaders"] = ";".join(sorted(headers))
+        signature = self._signature(method, object_name, query, headers)
+        path = reverse("storage-object", args=[object_name])
+        return (
+            f"{Config.STORAGE_PUBLIC_URL.rstrip('/')}{path}"
+            f"?{urlencode({**query, 'X-Silo-Signature': signature})}"
+        )
+
+    # whether a request to StorageObjectView carries a valid, unexpired signature
+    def verify(self, method: str, object_name: str, query, headers) -> bool:
+        query = {name: query[name] for name in query}
+        signature = query.pop("X-Silo-Signature", "")
+        try:
+            if int(query.get("X-Silo-Expires", "")) < time.time():
+                return False
+        except ValueError:
+            return False
+        signed = query.get("X-Silo-SignedHeaders", "")
+        values = {name: headers.get(name, "") for name in signed.split(";") if name}
+        expected = self._signature(method, object_name, query, values)
+        return hmac.compare_digest(signature, expected)
+
+
+def _b64_sha256(digest) -> str:
+    return base64.b64encode(digest.digest()).decode()
+
+
+def _chunks(data: bytes | BinaryIO):
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        yield data
+        return
+    while chunk := data.read(READ_SIZE):
+        yield chunk
+
+
+# a byte range of a file read through mmap, straight from the page cache without a
+# read() call per chunk
+class _MappedReader:
+    def __init__(self, path: str, offset: int, length: int):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        end = min(offset + length, len(self._map)) if length else len(self._map)
+        self._view = memoryview(self._map)[offset:end]
+        self._position = 0
+
+    def readinto(self, buffer) -> int:
+        count = min(len(buffer), len(self._view) - self._position)
+        buffer[:count] = self._view[self._position : self._position + count]
+        self._position += count
+        return count
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size < 0 else self._position + size
+        data = bytes(self._view[self._position : end])
+        self._position += len(data)
+        return data
+
+    def close(self) -> None:
+        self._view.release()
+        self._map.close()
+
+
+class LocalBackend(SelfServedBackend):
+    def __init__(self, root: str = Config.STORAGE_LOCAL_ROOT):
+        self.root = os.path.realpath(root)
+        self._objects = os.path.join(self.root, "objects")
+        self._uploads = os.path.join(self.root, "uploads")
+
+    def _path(self, object_name: str) -> str:
+        # object names carry user-supplied file names, keep them inside the root;
+        # a name that normalizes to a different one ("a/../b", "./a", "/a") could
+        # reach another user's object
+        if os.path.isabs(object_name) or os.path.normpath(object_name) != object_name:
+            raise StorageError("InvalidObjectName", object_name)
+        path = os.path.realpath(os.path.join(self._objects, object_name))
+        if not path.startswith(self._objects + os.sep):
+            raise StorageError("InvalidObjectName", object_name)
+        return path
+
+    def _upload_dir(self, upload_id: str) -> str:
+        if not upload_id.isalnum():
+            raise StorageError("NoSuchUpload", upload_id)
+        path = os.path.join(self._uploads, upload_id)
+        if not os.path.isdir(path):
+            raise StorageError("NoSuchUpload", upload_id)
+        return path
+
+    # writes to a temporary file next to `path` and renames it into place, so
+    # readers never see a partial object
+    def _write(
+        self, path: str, data: bytes | BinaryIO, checksum: str | None = None
+    ) -> ObjectStat:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        sha256, md5, size = hashlib.sha256(), hashlib.md5(), 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in _chunks(data):
+                    out.write(chunk)
+                    sha256.update(chunk)
+                    md5.update(chunk)
+                    size += len(chunk)
+            if checksum is not None and _b64_sha256(sha256) != checksum:
+                raise StorageError("BadDigest", "checksum mismatch")
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            raise
+        return ObjectStat(size, md5.hexdigest(), _b64_sha256(sha256))
+
+    def stat(self, object_name: str) -> ObjectStat | None:
+        try:
+            stat = os.stat(self._path(object_name))
+        except FileNotFoundError:
+            return None
+        return ObjectStat(stat.st_size, f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+
+    def open(self, object_name: str, offset: int = 0, length: int = 0):
+        path = self._path(object_name)
+        try:
+            if (offset or length) and os.path.getsize(path):
+                return _MappedReader(path, offset, length)
+            # a real file, so a WSGI server can hand it to sendfile()
+            return open(path, "rb")
+        except FileNotFoundError:
+            raise StorageError("NoSuchKey", object_name) from None
+
+    def put(
+        self, object_name: str, data: bytes | BinaryIO, checksum: str | None = None
+    ) -> ObjectStat:
+        return self._write(self._path(object_name), data, checksum)
+
+    def create_multipart(self, object_name: str, content_type: str | None) -> str:
+        self._path(object_name)
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self._uploads, upload_id))
+        return upload_id
+
+    def upload_part(
+        self,
+        object_name: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes | BinaryIO,
+    ) -> str:
+        directory = self._upload_dir(upload_id)
+        stat = self._write(os.path.join(directory, f"{part_number:05d}"), data)
+        # the ETag is kept in the name, listing parts needn't read them
+        for name in os.listdir(directory):
+            if name.startswith(f"{part_number:05d}."):
+                os.unlink(os.path.join(directory, name))
+        os.replace(
+            os.path.join(directory, f"{part_number:05d}"),
+            os.path.join(directory, f"{part_number:05d}.{stat.etag}"),
+        )
+        return stat.etag
+
+    def list_parts(self, object_name: str, upload_id: str) -> dict[int, str]:
+        parts: dict[int, str] = {}
+        for name in os.listdir(self._upload_dir(upload_id)):
+            number, _, etag = name.partition(".")
+            if number.isdigit() and etag:
+                parts[int(number)] = etag
+        return parts
+
+    def complete_multipart(
+        self, object_name: str, upload_id: str, parts: dict[int, str]
+    ) -> None:
+        directory = self._upload_dir(upload_id)
+        received = self.list_parts(object_name, upload_id)
+        paths: list[str] = []
+        for number, etag in sorted(parts.items()):
+            if received.get(number) != etag.strip('"'):
+                raise StorageError("InvalidPart", str(number))
+            paths.append(os.path.join(directory, f"{number:05d}.{received[number]}"))
+
+        path = self._path(object_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for part in paths:
+                    with open(part, "rb") as source:
+                        # copied file to file in the kernel
+                        size, offset = os.fstat(source.fileno()).st_size, 0
+                        while offset < size:
+                            offset += os.sendfile(
+                                out.fileno(), source.fileno(), offset, size - offset
+                            )
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            raise
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def abort_multipart(self, object_name: str, upload_id: str) -> None:
+        shutil.rmtree(self._upload_dir(upload_id), ignore_errors=True)
+
+    def copy(self, source: str, destination: str) -> None:
+        source_path = self._path(source)
+        if not os.path.isfile(source_path):
+            raise StorageError("NoSuchKey", source)
+        path = self._path(destination)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        os.close(fd)
+        try:
+            shutil.copyfile(source_path, temporary)  # sendfile() on Linux
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            raise
+
+    def delete(self, object_name: str) -> None:
+        try:
+            os.unlink(self._path(object_name))
+        except FileNotFoundError:
+            pass
+
+
+class MemoryBackend(SelfServedBackend):
+    def __init__(self):
+        self._objects: dict[str, bytes] = {}
+        self._uploads: dict[str, tuple[str, dict[int, tuple[str, bytes]]]] = {}
+        self._lock = threading.Lock()
+
+    def stat(self, object_name: str) -> ObjectStat | None:
+        data = self._objects.get(object_name)
+        if data is None:
+            return None
+        return ObjectStat(
+            len(data),
+            hashlib.md5(data).hexdigest(),
+            _b64_sha256(hashlib.sha256(data)),
+        )
+
+    def open(self, object_name: str, offset: int = 0, length: int = 0):
+        data = self._objects.get(object_name)
+        if data is None:
+            raise StorageError("NoSuchKey", object_name)
+        end = offset + length if length else len(data)
+        return io.BytesIO(memoryview(data)[offset:end])
+
+    def put(
+        self, object_name: str, data: bytes | BinaryIO, checksum: str | None = None
+    ) -> ObjectStat:
+        data = b"".join(_chunks(data))
+        stat = ObjectStat(
+            len(data),
+            hashlib.md5(data).hexdigest(),
+            _b64_sha256(hashlib.sha256(data)),
+        )
+        if checksum is not None and stat.checksum != checksum:
+            raise StorageError("BadDigest", "checksum mismatch")
+        with self._lock:
+            self._objects[object_name] = data
+        return stat
+
+    def _parts(self, upload_id: str) -> dict[int, tuple[str, bytes]]:
+        upload = self._uploads.get(upload_id)
+        if upload is None:
+            raise StorageError("NoSuchUpload", upload_id)
+        return upload[1]
+
+    def create_multipart(self, object_name: str, content_type: str | None) -> str:
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = (object_name, {})
+        return upload_id
+
+    def upload_part(
+        self,
+        object_name: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes | BinaryIO,
+    ) -> str:
+        data = b"".join(_chunks(data))
+        etag = hashlib.md5(data).hexdigest()
+        with self._lock:
+            self._parts(upload_id)[part_number] = (etag, data)
+        return etag
+
+    def list_parts(self, object_name: str, upload_id: str) -> dict[int, str]:
+        with self._lock:
+            return {n: etag for n, (etag, _) in self._parts(upload_id).items()}
+
+    def complete_multipart(
+        self, object_name: str, upload_id: str, parts: dict[int, str]
+    ) -> None:
+        with self._lock:
+            received = self._parts(upload_id)
+            chunks: list[bytes] = []
+            for number, etag in sorted(parts.items()):
+                part = received.get(number)
+                if part is None or part[0] != etag.strip('"'):
+                    raise StorageError("InvalidPart", str(number))
+                chunks.append(part[1])
+            self._objects[object_name] = b"".join(chunks)
+            del self._uploads[upload_id]
+
+    def abort_multipart(self, object_name: str, upload_id: str) -> None:
+        with self._lock:
+            self._parts(upload_id)
+            del self._uploads[upload_id]
+
+    def copy(self, source: str, destination: str) -> None:
+        with self._lock:
+            if source not in self._objects:
+                raise StorageError("NoSuchKey", source)
+            self._objects[destination] = self._objects[source]
+
+    def delete(self, object_name: str) -> None:
+        with self._lock:
+            self._objects.pop(object_name, None)
+
+
+BACKENDS: dict[str, type[StorageBackend]] = {
+    "minio": MinioBackend,
+    "local": LocalBackend,
+    "memory": MemoryBackend,
+}
+
+
+@functools.cache
+def backend() -> StorageBackend:
+    try:
+        return BACKENDS[Config.STORAGE_BACKEND]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown STORAGE_BACKEND {Config.STORAGE_BACKEND!r}, "
+            f"expected one of {', '.join(BACKENDS)}"
+        ) from None
+
+
+def presigned_put_url(
+    object_name: str, expires: int = Config.PRESIGNED_URL_EXPIRY, **kwargs
+) -> str:
+    with metrics.timed("presign", "PUT"):
+        return backend().presign("PUT", object_name, expires, **kwargs)
+
+
+def presigned_get_url(
+    object_name: str, expires: int = Config.PRESIGNED_URL_EXPIRY, **kwargs
+) -> str:
+    with metrics.timed("presign", "GET"):
+        return backend().presign("GET", object_name, expires, **kwargs)
+
+
+# GET URLs of shared files reused while they have more than `margin` seconds left,
+# so a hot shared file is signed once per `expires - margin` seconds per worker
+class MemoizedGetURLs:
+    def __init__(
+        self,
+        expires: int = Config.PRESIGNED_URL_EXPIRY,
+        margin: int = Config.PRESIGNED_URL_REUSE_MARGIN,
+        max_size: int = Config.PRESIGNED_URL_CACHE_SIZE,
+        clock=time.time,
+    ):
+        if not 0 <= margin < expires:
+            raise ValueError("margin must be shorter than the URL expiry")
+        self.expires = expires
+        self.margin = margin
+        self.max_size = max_size
+        self.clock = clock
+        self._urls: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, object_name: str) -> str:
+        current = self.clock()
+        with self._lock:
+            entry = self._urls.get(object_name)
+            if entry is not None and current < entry[1]:
+                self._urls.move_to_end(object_name)
+                return entry[0]
+
+        signed_at = int(current)
+        url = presigned_get_url(
+            object_name,
+            self.expires,
+            now=datetime.fromtimestamp(signed_at, timezone.utc),
+        )
+        with self._lock:
+            self._urls[object_name] = (url, signed_at + self.expires - self.margin)
+            self._urls.move_to_end(object_name)
+            while len(self._urls) > self.max_size:
+                self._urls.popitem(last=False)
+        return url
+
+    def clear(self) -> None:
+        with self._lock:
+            self._urls.clear()
+
+
+shared_get_urls = MemoizedGetURLs()
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+from collections import deque
+from typing import AsyncIterator
+from django.http import (
+    HttpResponse,
+    HttpResponseNotModified,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils.http import content_disposition_header
+from config import Config
+from . import blocking, storage
+
+
+# Serving objects through Silo for deployments where the object store isn't
+# reachable by clients (Config.DOWNLOAD_PROXY). The object is relayed in chunks read
+# into buffers from a shared pool, so memory is bounded by the pool plus one chunk
+# in flight per download, whatever the object sizes. Blocking reads run on the
+# store pool of files/blocking.py; the event loop only waits on slow clients.
+
+
+# A buffer is lent to one read at a time and at most `max_buffers` are out. The
+# limit is shared by every event loop of the process (an ASGI server's, and the
+# short-lived ones async_to_sync starts), so it is kept under a thread lock and
+# waiters are woken on their own loop rather than through an asyncio.Semaphore,
+# which belongs to the first loop that uses it.
+class BufferPool:
+    def __init__(self, buffer_size: int, max_buffers: int):
+        self.buffer_size = buffer_size
+        self.max_buffers = max_buffers
+        self._free: list[bytearray] = []
+        self._available = max_buffers
+        self._waiters: deque[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> bytearray:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._available and not self._waiters:
+                self._available -= 1
+                return self._take()
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = (loop, waiter) in self._waiters
+                if queued:
+                    self._waiters.remove((loop, waiter))
+            # a slot handed over after all goes back, one handed to the cancelled
+            # waiter is given back by _wake
+            if not queued and waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            raise
+        with self._lock:
+            return self._take()
+
+    def release(self, buffer: bytearray) -> None:
+        with self._lock:
+            self._free.append(buffer)
+        self._release_slot()
+
+    # the caller holds the lock
+    def _take(self) -> bytearray:
+        return self._free.pop() if self._free else bytearray(self.buffer_size)
+
+    # passes the slot to the oldest waiter, on its loop, or puts it back
+    def _release_slot(self) -> None:
+        with self._lock:
+            if not self._waiters:
+                self._available += 1
+                return
+            loop, waiter = self._waiters.popleft()
+        try:
+            loop.call_soon_threadsafe(self._wake, waiter)
+        except RuntimeError:
+            # the waiter's loop is closed, nobody is waiting there any more
+            self._release_slot()
+
+    def _wake(self, waiter: asyncio.Future) -> None:
+        if waiter.cancelled():
+            self._release_slot()
+        else:
+            waiter.set_result(None)
+
+
+buffers = BufferPool(Config.DOWNLOAD_PROXY_CHUNK_SIZE, Config.DOWNLOAD_PROXY_BUFFERS)
+
+
+# (start, end), both inclusive, for a single "bytes=" Range header; None serves the
+# whole object (no header, one we don't handle, or several ranges). Raises
+# ValueError when the range lies outside the object.
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, sep, last = header[len("bytes=") :].strip().partition("-")
+    if not sep or not (first or last) or not (first + last).isdigit():
+        return None
+    if not first:
+        # suffix range, the last `last` bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+# whether an If-None-Match header matches `etag` (weak comparison)
+def etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+async def relay(response, pool: BufferPool = buffers) -> AsyncIterator[bytes]:
+    try:
+        while True:
+            buffer = await pool.acquire()
+            try:
+                read = await blocking.run(response.readinto, buffer)
+                # the response machinery keeps each chunk as bytes, copy it once
+                chunk = bytes(memoryview(buffer)[:read])
+            finally:
+                pool.release(buffer)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        response.close()
+
+
+async def open_object(object_name: str, offset: int = 0, length: int = 0):
+    return await blocking.run(storage.backend().open, object_name, offset, length)
+
+
+# Response streaming `size` bytes of an object, honouring a single Range (unless
+# If-Range names another version) and If-None-Match against `etag`. The flag is True
+# when the response starts at the first byte, a resumed download is not another
+# download.
+async def serve(
+    request,
+    object_name: str,
+    size: int,
+    etag: str,
+    file_name: str,
+    content_type: str | None = None,
+) -> tuple[HttpResponse, bool]:
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return HttpResponseNotModified(headers={"ETag": etag}), False
+
+    range_header = request.headers.get("Range")
+    if request.headers.get("If-Range", etag) != etag:
+        range_header = None  # the client's copy is outdated, send it all
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return HttpResponse(
+            status=416, headers={"Content-Range": f"bytes */{size}"}
+        ), False
+
+    start, end = byte_range if byte_range else (0, size - 1)
+    length = end - start + 1 if size else 0
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": content_disposition_header(True, file_name),
+    }
+    content_type = content_type or "application/octet-stream"
+    if not length:
+        response = HttpResponse(b"", content_type=content_type, headers=headers)
+    else:
+        try:
+            reader = await open_object(object_name, offset=start, length=length)
+        except storage.StorageError:
+            return JsonResponse({"detail": "File not found"}, status=404), False
+        response = StreamingHttpResponse(
+            relay(reader),
+            status=206 if byte_range else 200,
+            content_type=content_type,
+            headers={**headers, "Content-Length": str(length)},
+        )
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response, start == 0
@@ -1,3 +1,1451 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from unittest import mock
+from asgiref.sync import sync_to_async
+from urllib.parse import parse_qs, urlsplit
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from minio import Minio
+import config
+from config import Config
+from users.models import UserProfile
+from users.principals import principals
+from users.token_cache import verified_tokens
+from . import (
+    access_log,
+    changes,
+    counters,
+    dedup,
+    link_cache,
+    link_passwords,
+    multipart,
+    partitions,
+    rollups,
+    storage,
+    streaming,
+)
+from .counters import BufferedCounter
+from .models import (
+    AccessLogDaily,
+    AccessLogHourly,
+    File,
+    FileAccessStats,
+    FileChange,
+    FileChangeSequence,
+    FileChunk,
+    SharedFileLink,
+    StoredObject,
+    UserAgent,
+)
+from .serializers import FileUploadRequestSerializer
+from .signing import PresignedURLSigner
 
-# Create your tests here.
+CHECKSUM = "ab" * 32
+
+
+def _profile(name: str) -> UserProfile:
+    return UserProfile.objects.create(
+        auth0_id=f"auth0|{name}", email=f"{name}@example.com"
+    )
+
+
+def _file(owner: UserProfile, **fields) -> File:
+    defaults = {
+        "file_path": f"uploads/{owner.id}/{uuid.uuid4()}_a.txt",
+        "file_name": "a.txt",
+        "file_size": 10,
+        "checksum": CHECKSUM,
+        "uploaded": True,
+    }
+    return File.objects.create(id=uuid.uuid4(), owner_id=owner, **defaults | fields)
+
+
+def _upload_request(content: bytes, **fields) -> dict:
+    return {
+        "file_name": "a.bin",
+        "file_size": len(content),
+        "checksum": hashlib.sha256(content).hexdigest(),
+        **fields,
+    }
+
+
+# Requests authenticated as `sub` without an RS256 check, against an in-memory
+# object store. Access log events are captured by self.logged instead of written.
+class AuthenticatedTestCase(TestCase):
+    sub = "auth0|tester"
+
+    def setUp(self):
+        principals.clear()
+        token = f"test-token-{uuid.uuid4()}"
+        verified_tokens.set(token, {"sub": self.sub, "exp": time.time() + 600})
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        self.auth_headers = {"Authorization": f"Bearer {token}"}
+        self.profile = UserProfile.objects.create(
+            auth0_id=self.sub, email="tester@example.com"
+        )
+        self.storage = storage.MemoryBackend()
+        patchers = [
+            mock.patch.object(storage, "backend", return_value=self.storage),
+            mock.patch.object(access_log.writer, "enqueue"),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.logged = access_log.writer.enqueue
+
+    def post(self, path: str, data: dict):
+        return self.client.post(path, data, content_type="application/json")
+
+
+class MultipartTestCase(AuthenticatedTestCase):
+    PART = multipart.MIN_PART_SIZE
+
+    def _initiate(self, size: int) -> File:
+        response = self.post(
+            "/api/files/upload/multipart/",
+            _upload_request(
+                b"", file_size=size, checksum=CHECKSUM, part_size=self.PART
+            ),
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["part_count"], -(-size // self.PART))
+        return File.objects.get(id=response.json()["file_id"])
+
+    def _upload(self, file_obj: File, index: int, data: bytes) -> str:
+        return self.storage.upload_part(
+            file_obj.file_path, file_obj.upload_id, index + 1, data
+        )
+
+    def _record(self, file_obj: File, parts: dict[int, tuple[str, int]]) -> None:
+        response = self.post(
+            "/api/files/upload/multipart/record/",
+            {
+                "file_id": str(file_obj.id),
+                "parts": [
+                    {"chunk_index": i, "etag": etag, "chunk_size": size}
+                    for i, (etag, size) in parts.items()
+                ],
+            },
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def _complete(self, file_obj: File):
+        return self.post(
+            "/api/files/upload/multipart/complete/", {"file_id": str(file_obj.id)}
+        )
+
+
+class MultipartUploadTests(MultipartTestCase):
+    def test_parts_are_assembled_and_confirmed(self):
+        file_obj = self._initiate(self.PART + 10)
+        etag = self._upload(file_obj, 0, b"a" * self.PART)
+        self._upload(file_obj, 1, b"b" * 10)  # uploaded, never recorded
+        self._record(file_obj, {0: (etag, self.PART)})
+
+        response = self._complete(file_obj)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(response.json()["uploaded"])
+        self.assertEqual(self.storage.stat(file_obj.file_path).size, self.PART + 10)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.storage_used, self.PART + 10)
+
+    def test_missing_parts_are_listed(self):
+        file_obj = self._initiate(2 * self.PART + 1)
+        self._upload(file_obj, 1, b"b" * self.PART)
+        response = self._complete(file_obj)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["missing"], [0, 2])
+
+    def test_stored_etags_win_over_recorded_ones(self):
+        file_obj = self._initiate(10)
+        self._upload(file_obj, 0, b"x" * 10)
+        self._record(file_obj, {0: ("0" * 32, 10)})
+        self.assertEqual(self._complete(file_obj).status_code, 200)
+
+    def test_store_rejecting_the_parts_is_a_conflict(self):
+        file_obj = self._initiate(self.PART + 10)
+        self._upload(file_obj, 0, b"a" * self.PART)
+        # recorded, but the store never received it
+        self._record(file_obj, {1: ("0" * 32, 10)})
+        response = self._complete(file_obj)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn("InvalidPart", response.json()["detail"])
+        self.assertFalse(File.objects.get(id=file_obj.id).uploaded)
+
+    def test_parts_not_adding_up_drop_the_upload(self):
+        file_obj = self._initiate(self.PART + 10)
+        self._upload(file_obj, 0, b"a" * self.PART)
+        self._upload(file_obj, 1, b"b" * 11)
+        response = self._complete(file_obj)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(File.objects.filter(id=file_obj.id).exists())
+        self.assertIsNone(self.storage.stat(file_obj.file_path))
+        self.assertEqual(
+            FileChange.objects.filter(file_id=file_obj.id).last().kind,
+            FileChange.Kind.DELETE,
+        )
+
+    def test_abort_frees_the_upload(self):
+        file_obj = self._initiate(10)
+        response = self.post(
+            "/api/files/upload/multipart/abort/", {"file_id": str(file_obj.id)}
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(File.objects.filter(id=file_obj.id).exists())
+        self.assertFalse(self.storage._uploads)
+
+    def test_part_sizes_keep_uploads_within_the_part_limit(self):
+        size = 10 * multipart.MAX_PARTS * self.PART
+        part_size = multipart.part_size_for(size)
+        self.assertLessEqual(multipart.part_count(size, part_size), multipart.MAX_PARTS)
+        self.assertEqual(
+            multipart.to_ranges([0, 1, 2, 5, 7, 8]), [[0, 2], [5, 5], [7, 8]]
+        )
+
+
+class UploadSessionTests(MultipartTestCase):
+    def test_session_reports_received_and_missing_parts(self):
+        file_obj = self._initiate(4 * self.PART + 1)
+        for index in (0, 1, 3):
+            etag = self._upload(file_obj, index, b"a" * self.PART)
+            self._record(file_obj, {index: (etag, self.PART)})
+
+        response = self.client.get(f"/api/files/upload/session/{file_obj.id}/")
+        self.assertEqual(response.status_code, 200)
+        session = response.json()
+        self.assertEqual(session["part_count"], 5)
+        self.assertEqual(session["received_bytes"], 3 * self.PART)
+        self.assertEqual(session["received"], [[0, 1], [3, 3]])
+        self.assertEqual(session["missing"], [[2, 2], [4, 4]])
+        self.assertEqual([p["chunk_index"] for p in session["parts"]], [2, 4])
+        self.assertIn("partNumber=3", session["parts"][0]["upload_url"])
+
+    def test_sessions_of_other_users_are_not_found(self):
+        file_obj = self._initiate(10)
+        File.objects.filter(id=file_obj.id).update(owner_id=_profile("other"))
+        response = self.client.get(f"/api/files/upload/session/{file_obj.id}/")
+        self.assertEqual(response.status_code, 404)
+
+
+class ReapUploadSessionsTests(MultipartTestCase):
+    def _reap(self, *args: str) -> str:
+        out = io.StringIO()
+        call_command("reap_upload_sessions", "--older-than", "3600", *args, stdout=out)
+        return out.getvalue()
+
+    def _age(self, *file_objs: File) -> None:
+        File.objects.filter(id__in=[f.id for f in file_objs]).update(
+            uploaded_at=timezone.now() - timedelta(hours=2)
+        )
+
+    def test_stale_uploads_and_their_storage_are_freed(self):
+        single = _file(self.profile, uploaded=False)
+        self.storage.put(single.file_path, b"landed, never confirmed")
+        started = self._initiate(10)
+        self._upload(started, 0, b"x" * 10)
+        confirmed = _file(self.profile)
+        self.storage.put(confirmed.file_path, b"kept")
+        fresh = _file(self.profile, uploaded=False)
+        self._age(single, started, confirmed)
+
+        self.assertIn("Found 2", self._reap("--dry-run"))
+        self.assertTrue(File.objects.filter(id=single.id).exists())
+
+        self.assertIn("Reaped 2", self._reap("--batch-size", "1"))
+        remaining = set(File.objects.values_list("id", flat=True))
+        self.assertEqual(remaining, {confirmed.id, fresh.id})
+        self.assertIsNone(self.storage.stat(single.file_path))
+        self.assertEqual(self.storage.stat(confirmed.file_path).size, 4)
+        self.assertFalse(self.storage._uploads)
+        deleted = FileChange.objects.filter(kind=FileChange.Kind.DELETE)
+        self.assertEqual(
+            set(deleted.values_list("file_id", flat=True)), {single.id, started.id}
+        )
+
+    def test_aborted_uploads_are_not_an_error(self):
+        started = self._initiate(10)
+        self.storage.abort_multipart(started.file_path, started.upload_id)
+        self._age(started)
+        self.assertIn("Reaped 1", self._reap())
+
+
+class DedupScopeTests(TestCase):
+    def setUp(self):
+        self.alice = _profile("alice")
+        self.bob = _profile("bob")
+
+    def _register(self, owner: UserProfile, verified: bool) -> File:
+        file_obj = _file(owner)
+        dedup.register_upload(file_obj, verified)
+        return file_obj
+
+    @mock.patch.object(Config, "DEDUP_SCOPE", "global")
+    def test_global_scope_shares_only_verified_objects(self):
+        self._register(self.alice, verified=False)
+        self.assertIsNone(dedup.find_stored_object(self.bob, CHECKSUM, 10))
+        verified = self._register(self.alice, verified=True)
+        self.assertEqual(
+            dedup.find_stored_object(self.bob, CHECKSUM, 10).id,
+            verified.stored_object_id,
+        )
+
+    @mock.patch.object(Config, "DEDUP_SCOPE", "user")
+    def test_user_scope_reuses_the_owners_objects(self):
+        file_obj = self._register(self.alice, verified=False)
+        self.assertEqual(
+            dedup.find_stored_object(self.alice, CHECKSUM, 10).id,
+            file_obj.stored_object_id,
+        )
+        self.assertIsNone(dedup.find_stored_object(self.bob, CHECKSUM, 10))
+        self.assertIsNone(dedup.find_stored_object(self.alice, CHECKSUM, 11))
+
+    def test_release_returns_the_path_of_the_last_reference(self):
+        file_obj = self._register(self.alice, verified=True)
+        self.assertEqual(dedup.release(file_obj), file_obj.file_path)
+        self.assertFalse(StoredObject.objects.exists())
+
+
+@mock.patch.object(Config, "DEDUP_SCOPE", "user")
+class DedupUploadTests(AuthenticatedTestCase):
+    def test_known_content_is_linked_without_a_transfer(self):
+        content = b"same bytes"
+        response = self.post("/api/files/upload/", _upload_request(content))
+        first = File.objects.get(id=response.json()["file_id"])
+        self.storage.put(first.file_path, content)
+        response = self.post("/api/files/upload/confirm/", {"file_id": str(first.id)})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        response = self.post(
+            "/api/files/upload/",
+            _upload_request(
+                content, checksum=hashlib.sha256(content).hexdigest().upper()
+            ),
+        )
+        self.assertTrue(response.json()["already_present"])
+        self.assertIsNone(response.json()["upload_url"])
+        first.refresh_from_db()
+        second = File.objects.get(id=response.json()["file_id"])
+        self.assertTrue(second.uploaded)
+        self.assertEqual(second.stored_object_id, first.stored_object_id)
+        self.assertEqual(StoredObject.objects.get().ref_count, 2)
+
+        # the stored object goes with its last reference
+        self.assertIsNone(dedup.release(first))
+        self.assertEqual(dedup.release(second), first.file_path)
+
+
+@mock.patch.object(Config, "DEDUP_SCOPE", "user")
+class ChunkedUploadTests(AuthenticatedTestCase):
+    def _start(self, *contents: bytes):
+        content = b"".join(contents)
+        return self.post(
+            "/api/files/upload/chunked/",
+            _upload_request(
+                content,
+                chunks=[
+                    {"checksum": hashlib.sha256(c).hexdigest(), "chunk_size": len(c)}
+                    for c in contents
+                ],
+            ),
+        )
+
+    def _put_chunks(self, *contents: bytes) -> list[str]:
+        checksums = [hashlib.sha256(c).hexdigest() for c in contents]
+        for checksum, content in zip(checksums, contents):
+            self.storage.put(dedup.chunk_storage_path(self.profile, checksum), content)
+        return checksums
+
+    def _confirm(self, file_id: str, checksums: list[str]):
+        return self.post(
+            "/api/files/upload/chunked/confirm/",
+            {"file_id": file_id, "checksums": checksums},
+        )
+
+    def test_only_missing_chunks_are_uploaded(self):
+        response = self._start(b"aaaa", b"bbbb", b"aaaa")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["chunk_count"], 3)
+        self.assertEqual(len(response.json()["missing"]), 2)
+        first = response.json()["file_id"]
+
+        checksums = self._put_chunks(b"aaaa", b"bbbb")
+        response = self._confirm(first, checksums[:1])
+        self.assertEqual(response.json()["missing"], [checksums[1]])
+        response = self._confirm(first, checksums[1:])
+        self.assertTrue(response.json()["uploaded"])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.storage_used, 12)
+
+        # a second file only sends the chunk that isn't stored yet
+        response = self._start(b"aaaa", b"cccc")
+        self.assertEqual(
+            [m["checksum"] for m in response.json()["missing"]],
+            [hashlib.sha256(b"cccc").hexdigest()],
+        )
+
+    def test_unverified_chunks_stay_missing(self):
+        response = self._start(b"aaaa")
+        checksum = hashlib.sha256(b"aaaa").hexdigest()
+        self.storage.put(dedup.chunk_storage_path(self.profile, checksum), b"bbbb")
+        response = self._confirm(response.json()["file_id"], [checksum])
+        self.assertFalse(response.json()["uploaded"])
+        self.assertEqual(response.json()["missing"], [checksum])
+
+    def test_chunks_are_freed_with_their_last_file(self):
+        first = self._start(b"aaaa", b"bbbb").json()["file_id"]
+        checksums = self._put_chunks(b"aaaa", b"bbbb")
+        self._confirm(first, checksums)
+        second = self._start(b"aaaa").json()["file_id"]
+        self.assertTrue(self._confirm(second, []).json()["uploaded"])
+        shared, own = (dedup.chunk_storage_path(self.profile, c) for c in checksums)
+
+        self.post("/api/files/delete/", {"file_id": first})
+        self.assertIsNotNone(self.storage.stat(shared))
+        self.assertIsNone(self.storage.stat(own))
+        self.post("/api/files/delete/", {"file_id": second})
+        self.assertIsNone(self.storage.stat(shared))
+
+    def test_reaped_uploads_free_their_chunks(self):
+        file_id = self._start(b"aaaa", b"bbbb").json()["file_id"]
+        path = dedup.chunk_storage_path(self.profile, self._put_chunks(b"aaaa")[0])
+        File.objects.filter(id=file_id).update(
+            uploaded_at=timezone.now() - timedelta(hours=2)
+        )
+        call_command(
+            "reap_upload_sessions", "--older-than", "3600", stdout=io.StringIO()
+        )
+        self.assertFalse(File.objects.exists())
+        self.assertIsNone(self.storage.stat(path))
+
+    def test_chunk_sizes_must_add_up(self):
+        response = self.post(
+            "/api/files/upload/chunked/",
+            _upload_request(b"abc", chunks=[{"checksum": CHECKSUM, "chunk_size": 2}]),
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@mock.patch.object(Config, "DEDUP_SCOPE", "off")
+class BatchTests(AuthenticatedTestCase):
+    def _start(self, *contents: bytes) -> list[dict]:
+        response = self.post(
+            "/api/files/upload/batch/",
+            {"files": [_upload_request(content) for content in contents]},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["files"]
+
+    def _confirm(self, file_ids: list[str]) -> dict:
+        response = self.post("/api/files/upload/confirm/batch/", {"file_ids": file_ids})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_batch_is_confirmed_in_one_go(self):
+        sent, corrupt, lost = self._start(b"one", b"two", b"three")
+        self.storage.put(sent["file_path"], b"one")
+        self.storage.put(corrupt["file_path"], b"tw0")
+        unknown = str(uuid.uuid4())
+
+        result = self._confirm(
+            [sent["file_id"], corrupt["file_id"], lost["file_id"], unknown]
+        )
+        self.assertEqual(result["confirmed"], [sent["file_id"]])
+        self.assertCountEqual(
+            result["unverified"], [corrupt["file_id"], lost["file_id"]]
+        )
+        self.assertEqual(result["not_found"], [unknown])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.storage_used, 3)
+
+    def test_repeated_confirms_are_reported_as_confirmed(self):
+        (sent,) = self._start(b"one")
+        self.storage.put(sent["file_path"], b"one")
+        self._confirm([sent["file_id"]])
+
+        result = self._confirm([sent["file_id"]])
+        self.assertEqual(result["confirmed"], [])
+        self.assertEqual(result["already_confirmed"], [sent["file_id"]])
+        self.assertEqual(result["not_found"], [])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.storage_used, 3)
+
+    def test_batch_download_skips_other_users_files(self):
+        own = _file(self.profile)
+        foreign = _file(_profile("other"))
+        response = self.post(
+            "/api/files/download/batch/",
+            {"file_ids": [str(own.id), str(foreign.id)]},
+        )
+        self.assertEqual(
+            [f["file_id"] for f in response.json()["files"]], [str(own.id)]
+        )
+        self.assertEqual(response.json()["not_found"], [str(foreign.id)])
+
+
+class SignerTests(SimpleTestCase):
+    NOW = datetime(2026, 1, 2, 3, 4, 5, tzinfo=UTC)
+
+    def setUp(self):
+        self.signer = PresignedURLSigner(
+            "http://localhost:9000", "access", "secret", secure=False
+        )
+        # the region is given, so the SDK signs without asking the server for it
+        self.minio = Minio(
+            "localhost:9000",
+            access_key="access",
+            secret_key="secret",
+            secure=False,
+            region="us-east-1",
+        )
+
+    def assertSameURL(self, ours: str, theirs: str):
+        ours_parts, theirs_parts = urlsplit(ours), urlsplit(theirs)
+        self.assertEqual(ours_parts.netloc, theirs_parts.netloc)
+        self.assertEqual(ours_parts.path, theirs_parts.path)
+        self.assertEqual(parse_qs(ours_parts.query), parse_qs(theirs_parts.query))
+
+    def test_matches_the_sdk(self):
+        for method, object_name in (
+            ("GET", "uploads/1/report.pdf"),
+            ("PUT", "uploads/1/name with spaces+plus.txt"),
+            ("GET", "uploads/1/ünïcode.txt"),
+        ):
+            with self.subTest(method=method, object_name=object_name):
+                self.assertSameURL(
+                    self.signer.presign(method, "silo", object_name, 600, now=self.NOW),
+                    self.minio.get_presigned_url(
+                        method,
+                        "silo",
+                        object_name,
+                        expires=timedelta(seconds=600),
+                        request_date=self.NOW,
+                    ),
+                )
+
+    def test_matches_the_sdk_with_extra_query(self):
+        query = {"partNumber": "3", "uploadId": "upload/1"}
+        self.assertSameURL(
+            self.signer.presign(
+                "PUT", "silo", "chunks/x", 600, extra_query=query, now=self.NOW
+            ),
+            self.minio.get_presigned_url(
+                "PUT",
+                "silo",
+                "chunks/x",
+                expires=timedelta(seconds=600),
+                request_date=self.NOW,
+                extra_query_params=query,
+            ),
+        )
+
+    def test_expiry_is_bounded(self):
+        with self.assertRaises(ValueError):
+            self.signer.presign("GET", "silo", "x", 8 * 24 * 3600)
+
+
+def _events(count: int) -> list[dict]:
+    return [
+        {
+            "file_id": uuid.uuid4(),
+            "user_id": 1,
+            "action": "DOWNLOAD",
+            "ip_address": "127.0.0.1",
+            "user_agent": "test",
+            "timestamp": timezone.now(),
+        }
+        for _ in range(count)
+    ]
+
+
+class AccessLogWriterTests(SimpleTestCase):
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spill_dir)
+        patcher = mock.patch.object(access_log, "insert_events")
+        self.insert_events = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _writer(self, **options) -> access_log.AccessLogWriter:
+        writer = access_log.AccessLogWriter(
+            **{
+                "batch_size": 2,
+                "flush_interval": 60,
+                "max_queue": 4,
+                "spill_dir": self.spill_dir,
+                "slow_flush": 60,
+                "background": True,
+            }
+            | options
+        )
+        # flushed by hand instead of by the thread
+        writer._ensure_thread = mock.Mock()
+        return writer
+
+    def _spilled(self) -> list[dict]:
+        return [
+            access_log.decode_event(line)
+            for path in Path(self.spill_dir).glob("*.jsonl")
+            for line in path.read_text().splitlines()
+        ]
+
+    def test_events_are_written_in_batches(self):
+        writer = self._writer()
+        events = _events(5)
+        with self.assertLogs("files.access_log", "WARNING"):
+            writer.enqueue(events)
+        self.assertEqual(writer.dropped, 1)
+        self.insert_events.assert_not_called()
+
+        writer.flush()
+        batches = [c.args[0] for c in self.insert_events.call_args_list]
+        self.assertEqual(batches, [events[1:3], events[3:]])
+
+    def test_synchronous_writer_writes_right_away(self):
+        writer = self._writer(background=False)
+        events = _events(3)
+        writer.enqueue(events)
+        self.insert_events.assert_called_once_with(events)
+
+    def test_failed_inserts_spill_until_the_database_recovers(self):
+        writer = self._writer()
+        self.insert_events.side_effect = DatabaseError("down")
+        events = _events(3)
+        writer.enqueue(events)
+        with self.assertLogs("files.access_log", "ERROR"):
+            writer.flush()
+        # the first failure switches to disk for the next flush interval
+        self.assertEqual(self.insert_events.call_count, 1)
+        self.assertEqual(
+            [e["file_id"] for e in self._spilled()], [e["file_id"] for e in events]
+        )
+
+        self.insert_events.reset_mock(side_effect=True)
+        out = io.StringIO()
+        with mock.patch(
+            "files.management.commands.load_access_log_spill.insert_events"
+        ) as load:
+            call_command(
+                "load_access_log_spill", "--spill-dir", self.spill_dir, stdout=out
+            )
+        self.assertIn("Loaded 3", out.getvalue())
+        self.assertEqual(load.call_args.args[0][0]["timestamp"], events[0]["timestamp"])
+        self.assertFalse(list(Path(self.spill_dir).iterdir()))
+
+    def test_without_a_spill_dir_failures_are_raised(self):
+        writer = self._writer(background=False, spill_dir="")
+        self.insert_events.side_effect = DatabaseError("down")
+        with self.assertRaises(DatabaseError):
+            writer.enqueue(_events(1))
+
+
+class UserAgentCacheTests(TestCase):
+    def setUp(self):
+        access_log._user_agents.clear()
+
+    def tearDown(self):
+        access_log._user_agents.clear()
+
+    def test_ids_survive_a_cache_reset(self):
+        with mock.patch.object(access_log, "USER_AGENT_CACHE_SIZE", 2):
+            first = access_log._user_agent_ids({"curl/8", "wget/1"})
+            batch = access_log._user_agent_ids({"curl/8", "httpie/3", "firefox/1"})
+        self.assertEqual(set(batch), {"curl/8", "httpie/3", "firefox/1"})
+        self.assertEqual(batch["curl/8"], first["curl/8"])
+        for agent, agent_id in batch.items():
+            self.assertEqual(UserAgent.objects.get(id=agent_id).user_agent, agent)
+        self.assertLessEqual(len(access_log._user_agents), 2)
+
+    def test_known_agents_come_from_the_cache(self):
+        access_log._user_agent_ids({"curl/8"})
+        with self.assertNumQueries(0):
+            access_log._user_agent_ids({"curl/8"})
+
+
+# partition tables are created with DDL, which can't run in a test transaction
+class AccessLogPartitionTests(TransactionTestCase):
+    def setUp(self):
+        access_log._user_agents.clear()
+        self.addCleanup(self._drop_partitions)
+
+    def _drop_partitions(self):
+        for month in partitions.existing_months():
+            partitions.drop_partition(month)
+        access_log._user_agents.clear()
+
+    def _event(self, file_id, when: datetime, user_id: int = 2**40) -> dict:
+        return {
+            "file_id": file_id,
+            "user_id": user_id,
+            "action": "DOWNLOAD",
+            "ip_address": None,
+            "user_agent": "curl/8",
+            "timestamp": when,
+        }
+
+    def test_events_go_to_their_month_and_the_rollups(self):
+        file_obj = _file(_profile("alice"))
+        deleted = uuid.uuid4()
+        january = datetime(2025, 1, 31, 23, 30, tzinfo=UTC)
+        february = datetime(2025, 2, 1, 0, 30, tzinfo=UTC)
+        access_log.insert_events(
+            [
+                self._event(file_obj.id, january),
+                self._event(file_obj.id, january),
+                self._event(file_obj.id, february),
+                self._event(deleted, february),
+            ]
+        )
+
+        self.assertEqual(partitions.existing_months(), ["202501", "202502"])
+        self.assertEqual(partitions.partition_model("202501").objects.count(), 2)
+        self.assertEqual(
+            partitions.partition_model("202502").objects.get(file_id=deleted).user_id,
+            2**40,
+        )
+        self.assertEqual(
+            list(
+                AccessLogHourly.objects.filter(file_id=file_obj.id)
+                .order_by("hour")
+                .values_list("count", flat=True)
+            ),
+            [2, 1],
+        )
+        self.assertEqual(AccessLogDaily.objects.get(file_id=deleted).count, 1)
+        # deleted files get no all-time totals
+        self.assertEqual(rollups.file_totals(file_obj.id), {"DOWNLOAD": 3})
+        self.assertFalse(FileAccessStats.objects.filter(file_id=deleted).exists())
+
+        call_command("prune_access_logs", "--months", "1", stdout=io.StringIO())
+        self.assertEqual(partitions.existing_months(), [])
+
+
+class LegacyAccessLogMigrationTests(TransactionTestCase):
+    before = [("files", "0008_access_log_partitions"), ("users", "0001_initial")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        for month in partitions.existing_months():
+            partitions.drop_partition(month)
+
+    def test_legacy_rows_are_moved_into_partitions(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        profile = apps.get_model("users", "UserProfile").objects.create(
+            auth0_id="auth0|legacy", email="legacy@example.com"
+        )
+        file_obj = apps.get_model("files", "File").objects.create(
+            id=uuid.uuid4(),
+            owner_id=profile,
+            file_path="uploads/legacy",
+            file_name="legacy",
+            file_size=1,
+            checksum=CHECKSUM,
+        )
+        LegacyLog = apps.get_model("files", "FileAccessLog")
+        for when in (
+            datetime(2024, 5, 1, tzinfo=UTC),
+            datetime(2024, 6, 1, tzinfo=UTC),
+        ):
+            LegacyLog.objects.create(
+                file_id=file_obj,
+                user_id=profile,
+                user_agent="curl/8",
+                action="DOWNLOAD",
+                timestamp=when,
+            )
+
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+        self.assertEqual(partitions.existing_months(), ["202405", "202406"])
+        log = partitions.partition_model("202406").objects.get()
+        self.assertEqual(
+            (log.file_id, log.user_id, log.user_agent.user_agent),
+            (file_obj.id, profile.id, "curl/8"),
+        )
+        self.assertEqual(AccessLogDaily.objects.count(), 2)
+        self.assertEqual(rollups.file_totals(file_obj.id), {"DOWNLOAD": 2})
+
+
+class BufferedCounterTests(TestCase):
+    def setUp(self):
+        owner = _profile("counter")
+        file_obj = _file(owner)
+        self.links = [
+            SharedFileLink.objects.create(
+                id=uuid.uuid4(), owner=owner, file_id=file_obj, token=f"token-{i}"
+            )
+            for i in range(3)
+        ]
+        self.counter = BufferedCounter(SharedFileLink, "download_count", 60)
+        # no background thread, the tests flush themselves
+        self.counter._ensure_thread = lambda: None
+
+    def _counts(self) -> list[int]:
+        return [
+            SharedFileLink.objects.get(id=link.id).download_count for link in self.links
+        ]
+
+    def test_increments_are_written_on_flush(self):
+        for link in self.links:
+            self.counter.add(link.id, 2)
+        self.counter.add(self.links[0].id)
+        self.counter.flush()
+        self.assertEqual(self._counts(), [3, 2, 2])
+
+    def test_failed_flush_keeps_the_remainder(self):
+        for link in self.links:
+            self.counter.add(link.id)
+        filter_rows = SharedFileLink.objects.filter
+        calls = []
+
+        def fail_second(*args, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                raise RuntimeError("database went away")
+            return filter_rows(*args, **kwargs)
+
+        with (
+            mock.patch.object(SharedFileLink.objects, "filter", fail_second),
+            self.assertRaises(RuntimeError),
+        ):
+            self.counter.flush()
+        self.counter.add(self.links[0].id)
+        self.counter.flush()
+        self.assertEqual(self._counts(), [2, 1, 1])
+
+
+class SharedLinkTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def _share(self, **fields) -> str:
+        file_obj = _file(self.profile)
+        response = self.post(
+            "/api/files/share/create/",
+            {"file_id": str(file_obj.id), "permission": "DOWNLOAD", **fields},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["token"]
+
+    def _access(self, token: str, **data):
+        return self.client.post(
+            f"/api/files/share/access/{token}/", data, content_type="application/json"
+        )
+
+
+class SharedLinkDownloadLimitTests(SharedLinkTestCase):
+    def test_downloads_stop_at_the_limit(self):
+        token = self._share(max_downloads=2)
+        self.assertEqual(self._access(token).status_code, 200)
+        self.assertEqual(self._access(token).status_code, 200)
+        response = self._access(token)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()["detail"], "Download limit reached")
+        self.assertEqual(SharedFileLink.objects.get(token=token).download_count, 2)
+
+    def test_expired_links_are_refused(self):
+        token = self._share()
+        SharedFileLink.objects.filter(token=token).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        link_cache.invalidate(token)
+        self.assertEqual(self._access(token).status_code, 403)
+
+    @mock.patch.object(Config, "SHARED_LINK_BUFFERED_COUNTS", True)
+    def test_unlimited_links_are_counted_in_the_buffer(self):
+        token = self._share()
+        link = SharedFileLink.objects.get(token=token)
+        with mock.patch.object(counters.link_downloads, "add") as add:
+            self.assertEqual(self._access(token).status_code, 200)
+        add.assert_called_once_with(link.id)
+        self.assertEqual(SharedFileLink.objects.get(id=link.id).download_count, 0)
+
+
+# a fast hasher, the production KDF costs a few hundred milliseconds per check
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class SharedLinkPasswordTests(SharedLinkTestCase):
+    def test_passwords_are_checked_once_per_ttl(self):
+        token = self._share(password="hunter2")
+        self.assertTrue(
+            SharedFileLink.objects.get(token=token).password_hash.startswith("md5$")
+        )
+        self.assertEqual(self._access(token).status_code, 403)
+        self.assertEqual(self._access(token, password="wrong").status_code, 403)
+        with mock.patch.object(
+            link_passwords, "check_password", wraps=link_passwords.check_password
+        ) as check:
+            self.assertEqual(self._access(token, password="hunter2").status_code, 200)
+            self.assertEqual(self._access(token, password="hunter2").status_code, 200)
+        check.assert_called_once()
+
+    @mock.patch.object(Config, "SHARED_LINK_PASSWORD_ATTEMPTS", 2)
+    def test_guesses_are_rate_limited(self):
+        token = self._share(password="hunter2")
+        for _ in range(2):
+            self.assertEqual(self._access(token, password="wrong").status_code, 403)
+        response = self._access(token, password="hunter2")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(
+            response["Retry-After"], str(Config.SHARED_LINK_PASSWORD_WINDOW)
+        )
+
+    def test_legacy_hashes_are_upgraded(self):
+        token = self._share()
+        SharedFileLink.objects.filter(token=token).update(
+            password_hash=hashlib.sha256(b"hunter2").hexdigest()
+        )
+        link_cache.invalidate(token)
+        self.assertEqual(self._access(token, password="wrong").status_code, 403)
+        self.assertEqual(self._access(token, password="hunter2").status_code, 200)
+        self.assertTrue(
+            SharedFileLink.objects.get(token=token).password_hash.startswith("md5$")
+        )
+
+
+@mock.patch.object(link_cache, "ENABLED", True)
+class LinkCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = _profile("links")
+        self.file = _file(self.owner)
+        self.token = "shared-link-token-0123456789"
+
+    def test_unknown_tokens_are_cached_until_created(self):
+        self.assertIsNone(link_cache.resolve(self.token))
+        with self.captureOnCommitCallbacks(execute=True):
+            SharedFileLink.objects.create(
+                id=uuid.uuid4(), owner=self.owner, file_id=self.file, token=self.token
+            )
+        self.assertIsNotNone(link_cache.resolve(self.token))
+
+    def test_entries_are_dropped_after_commit(self):
+        link = SharedFileLink.objects.create(
+            id=uuid.uuid4(), owner=self.owner, file_id=self.file, token=self.token
+        )
+        self.assertIsNone(link_cache.resolve(self.token).max_downloads)
+        with self.captureOnCommitCallbacks() as callbacks:
+            link.max_downloads = 5
+            link.save()
+            # a lookup before the commit may only cache the old row
+            self.assertIsNone(link_cache.resolve(self.token).max_downloads)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(link_cache.resolve(self.token).max_downloads, 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            link.delete()
+        self.assertIsNone(link_cache.resolve(self.token))
+
+    def test_malformed_tokens_skip_the_database(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(link_cache.resolve("not a token!"))
+
+
+class StreamingTests(SimpleTestCase):
+    def test_the_limit_is_shared_between_event_loops(self):
+        pool = streaming.BufferPool(4, 1)
+        held = asyncio.run(pool.acquire())
+        taken = threading.Event()
+
+        async def take():
+            pool.release(await pool.acquire())
+            taken.set()
+
+        thread = threading.Thread(target=asyncio.run, args=(take(),))
+        thread.start()
+        self.assertFalse(taken.wait(0.1))
+        pool.release(held)
+        thread.join(5)
+        self.assertTrue(taken.is_set())
+        self.assertEqual(pool._available, 1)
+        self.assertEqual(len(pool._free), 1)
+
+    def test_cancelled_waiters_give_their_slot_back(self):
+        async def scenario():
+            pool = streaming.BufferPool(4, 1)
+            held = await pool.acquire()
+            waiting = asyncio.create_task(pool.acquire())
+            await asyncio.sleep(0)
+            pool.release(held)  # handed to the waiter, which is cancelled next
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            await asyncio.wait_for(pool.acquire(), 1)
+
+        asyncio.run(scenario())
+
+    def test_ranges(self):
+        for header, expected in (
+            (None, None),
+            ("bytes=0-9", (0, 9)),
+            ("bytes=5-", (5, 99)),
+            ("bytes=-10", (90, 99)),
+            ("bytes=90-200", (90, 99)),
+            ("bytes=0-1,5-6", None),
+            ("bytes=9-5", None),
+            ("items=0-1", None),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(streaming.parse_range(header, 100), expected)
+        with self.assertRaises(ValueError):
+            streaming.parse_range("bytes=100-", 100)
+
+
+@mock.patch.object(Config, "DOWNLOAD_PROXY", True)
+class StreamingDownloadTests(AuthenticatedTestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.file = _file(
+            self.profile,
+            file_size=len(self.content),
+            checksum=hashlib.sha256(self.content).hexdigest(),
+        )
+        self.storage.put(self.file.file_path, self.content)
+
+    async def _get(self, url: str, **headers):
+        response = await self.async_client.get(url, headers=headers)
+        body = (
+            b"".join([chunk async for chunk in response.streaming_content])
+            if response.streaming
+            else response.content
+        )
+        return response, body
+
+    async def test_ranges_and_revalidation(self):
+        url = f"/api/files/download/stream/{self.file.id}/"
+        response, body = await self._get(url, **self.auth_headers)
+        self.assertEqual((response.status_code, body), (200, self.content))
+        etag = response["ETag"]
+
+        response, body = await self._get(url, Range="bytes=10-19", **self.auth_headers)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.content)}")
+
+        response, _ = await self._get(url, If_None_Match=etag, **self.auth_headers)
+        self.assertEqual(response.status_code, 304)
+        response, _ = await self._get(url, Range="bytes=5000-", **self.auth_headers)
+        self.assertEqual(response.status_code, 416)
+        response, _ = await self._get(url)
+        self.assertEqual(response.status_code, 401)
+        # the resumed download and the revalidation aren't logged again
+        self.assertEqual(self.logged.call_count, 1)
+
+    async def test_shared_links_stream_through_silo(self):
+        response = await sync_to_async(self.post)(
+            "/api/files/share/create/",
+            {"file_id": str(self.file.id), "permission": "DOWNLOAD"},
+        )
+        token = response.json()["token"]
+        response = await sync_to_async(self.client.post)(
+            f"/api/files/share/access/{token}/", {}, content_type="application/json"
+        )
+        url = response.json()["download_url"]
+        self.assertIn("/api/files/share/stream/", url)
+
+        response, body = await self._get(url)
+        self.assertEqual((response.status_code, body), (200, self.content))
+        response, _ = await self._get(url[:-2] + "x/")
+        self.assertEqual(response.status_code, 403)
+
+        await SharedFileLink.objects.filter(token=token).adelete()
+        response, _ = await self._get(url)
+        self.assertEqual(response.status_code, 403)
+
+    async def test_manifest_chunks_stream_through_silo(self):
+        chunked = await sync_to_async(_file)(
+            self.profile, chunked=True, file_size=len(self.content)
+        )
+        half = len(self.content) // 2
+        for index, data in enumerate((self.content[:half], self.content[half:])):
+            checksum = hashlib.sha256(data).hexdigest()
+            path = dedup.chunk_storage_path(self.profile, checksum)
+            self.storage.put(path, data)
+            await FileChunk.objects.acreate(
+                id=uuid.uuid4(),
+                file_id=chunked,
+                chunk_index=index,
+                chunk_size=len(data),
+                checksum=checksum,
+                storage_path=path,
+                uploaded=True,
+            )
+
+        response = await sync_to_async(self.post)(
+            "/api/files/download/manifest/", {"file_id": str(chunked.id)}
+        )
+        body = b""
+        for chunk in response.json()["chunks"]:
+            self.assertIn("/chunks/", chunk["download_url"])
+            body += (await self._get(chunk["download_url"], **self.auth_headers))[1]
+        self.assertEqual(body, self.content)
+
+
+@mock.patch.object(Config, "UPLOAD_PROXY", True)
+@mock.patch.object(Config, "DEDUP_SCOPE", "off")
+class StreamingUploadTests(AuthenticatedTestCase):
+    def _put(self, content: bytes, body: bytes):
+        response = self.post("/api/files/upload/", _upload_request(content))
+        self.assertIn("/api/files/upload/stream/", response.json()["upload_url"])
+        file_id = response.json()["file_id"]
+        return file_id, self.client.put(
+            f"/api/files/upload/stream/{file_id}/",
+            body,
+            content_type="application/octet-stream",
+        )
+
+    def test_verified_body_is_confirmed(self):
+        file_id, response = self._put(b"payload", b"payload")
+        self.assertEqual(response.status_code, 200, response.content)
+        file_obj = File.objects.get(id=file_id)
+        self.assertTrue(file_obj.uploaded)
+        self.assertIsNone(file_obj.upload_id)
+        self.assertEqual(self.storage.stat(file_obj.file_path).size, 7)
+        self.assertTrue(file_obj.stored_object.verified)
+
+    def test_bodies_not_matching_the_file_are_refused(self):
+        for body, error in (
+            (b"pay1oad", "Checksum mismatch"),
+            (b"payload!", "Body is larger than the declared file size"),
+            (b"pay", "Body is smaller than the declared file size"),
+        ):
+            with self.subTest(body=body):
+                file_id, response = self._put(b"payload", body)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["detail"], error)
+                file_obj = File.objects.get(id=file_id)
+                self.assertFalse(file_obj.uploaded)
+                self.assertIsNone(file_obj.upload_id)
+                self.assertIsNone(self.storage.stat(file_obj.file_path))
+        self.assertFalse(self.storage._uploads)
+
+
+@mock.patch.object(Config, "DEDUP_SCOPE", "off")
+class AsyncViewTests(AuthenticatedTestCase):
+    async def _post(self, path: str, data: dict, **headers):
+        return await self.async_client.post(
+            path,
+            data,
+            content_type="application/json",
+            headers=headers or self.auth_headers,
+        )
+
+    async def test_upload_download_and_share(self):
+        content = b"async payload"
+        response = await self._post(
+            "/api/files/async/upload/", _upload_request(content)
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        upload = response.json()
+        self.assertFalse(upload["already_present"])
+        self.storage.put(upload["file_path"], content)
+
+        response = await self._post(
+            "/api/files/async/upload/confirm/", {"file_id": upload["file_id"]}
+        )
+        self.assertTrue(response.json()["uploaded"])
+        await self.profile.arefresh_from_db()
+        self.assertEqual(self.profile.storage_used, len(content))
+
+        response = await self._post(
+            "/api/files/async/download/", {"file_id": upload["file_id"]}
+        )
+        self.assertEqual(response.json()["file_size"], len(content))
+
+        link = await SharedFileLink.objects.acreate(
+            id=uuid.uuid4(),
+            owner=self.profile,
+            file_id_id=upload["file_id"],
+            token="async-shared-link-token",
+            max_downloads=1,
+        )
+        path = f"/api/files/async/share/access/{link.token}/"
+        self.assertEqual((await self._post(path, {})).status_code, 200)
+        response = await self._post(path, {})
+        self.assertEqual(response.json()["detail"], "Download limit reached")
+        self.assertEqual(
+            [call.args[0][0]["action"] for call in self.logged.call_args_list],
+            ["UPLOAD", "DOWNLOAD", "SHARE"],
+        )
+
+    async def test_requests_need_a_token(self):
+        response = await self._post(
+            "/api/files/async/upload/", {}, Authorization="Bearer unknown"
+        )
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.post(
+            "/api/files/async/upload/",
+            "[]",
+            content_type="application/json",
+            headers=self.auth_headers,
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ObjectStoreClientTests(SimpleTestCase):
+    def test_values_are_built_once_per_process(self):
+        factory = mock.Mock(side_effect=lambda: object())
+
+        class Holder:
+            value = config._ProcessLocal(factory)
+
+        first = Holder.value
+        self.assertIs(Holder.value, first)
+        with mock.patch.object(config.os, "getpid", return_value=-1):
+            forked = Holder.value
+            self.assertIs(Holder.value, forked)
+        self.assertIsNot(forked, first)
+        self.assertEqual(factory.call_count, 2)
+
+    @mock.patch.object(Config, "MINIO_POOL_SIZE", 3)
+    @mock.patch.object(Config, "MINIO_REGION", "eu-west-1")
+    def test_client_gets_its_own_pool_and_region(self):
+        with mock.patch.object(Config, "MINIO_ENDPOINT", "https://minio.test:9000"):
+            client = config._make_s3_client()
+        self.assertEqual(client._http.connection_pool_kw["maxsize"], 3)
+        self.assertEqual(client._get_region("silo"), "eu-west-1")
+        with (
+            mock.patch.object(Config, "MINIO_ENDPOINT", None),
+            self.assertRaises(RuntimeError),
+        ):
+            config._make_s3_client()
+
+    def test_importing_config_leaves_the_sdk_out(self):
+        result = subprocess.run(
+            [sys.executable, "-c", "import sys, config; print('minio' in sys.modules)"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+class UploadRequestTests(SimpleTestCase):
+    def _validate(self, **fields) -> FileUploadRequestSerializer:
+        serializer = FileUploadRequestSerializer(
+            data={"file_name": "a.txt", "file_size": 10, "checksum": CHECKSUM, **fields}
+        )
+        serializer.is_valid()
+        return serializer
+
+    def test_file_names_cannot_be_paths(self):
+        for name in ("../a.txt", "a/b.txt", "a\\b.txt", "..", "."):
+            with self.subTest(name=name):
+                self.assertIn("file_name", self._validate(file_name=name).errors)
+        self.assertNotIn("file_name", self._validate(file_name="..a.txt").errors)
+
+
+class LocalBackendTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.backend = storage.LocalBackend(directory.name)
+
+    def test_objects_round_trip(self):
+        self.backend.put("uploads/1/a.txt", b"hello")
+        self.assertEqual(self.backend.stat("uploads/1/a.txt").size, 5)
+        reader = self.backend.open("uploads/1/a.txt", offset=1, length=3)
+        self.assertEqual(reader.read(), b"ell")
+        reader.close()
+
+    def test_unnormalized_names_are_refused(self):
+        for name in ("../outside", "uploads/../../outside", "/etc/passwd", "a//b"):
+            with self.subTest(name=name), self.assertRaises(storage.StorageError):
+                self.backend.put(name, b"x")
+
+    def test_backends_implement_every_operation(self):
+        with self.assertRaises(TypeError):
+            storage.StorageBackend()
+
+        class Partial(storage.StorageBackend):
+            def stat(self, object_name):
+                return None
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+
+class FileListTests(AuthenticatedTestCase):
+    def test_keyset_pages_cover_every_file_once(self):
+        started = datetime(2026, 1, 1, tzinfo=UTC)
+        expected = []
+        for i in range(7):
+            file_obj = _file(self.profile)
+            # pairs of files uploaded in the same instant, ordered by id
+            File.objects.filter(id=file_obj.id).update(
+                uploaded_at=started + timedelta(seconds=i // 2)
+            )
+            expected.append((started + timedelta(seconds=i // 2), file_obj.id))
+        _file(self.profile, uploaded=False)
+        _file(_profile("other"))
+        expected.sort(reverse=True)
+
+        listed, cursor = [], None
+        while True:
+            query = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            page = self.client.get("/api/files/list/", query).json()
+            listed.extend(uuid.UUID(f["id"]) for f in page["files"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(listed, [file_id for _, file_id in expected])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get("/api/files/list/", {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ChangeFeedTests(AuthenticatedTestCase):
+    def test_changes_are_numbered_per_user(self):
+        other = _profile("other")
+        files = [_file(self.profile) for _ in range(3)]
+        changes.record(self.profile.id, FileChange.Kind.CREATE, [f.id for f in files])
+        changes.record(other.id, FileChange.Kind.CREATE, [_file(other).id])
+        changes.record(self.profile.id, FileChange.Kind.DELETE, [files[0].id])
+
+        rows, has_more, floor = changes.since(self.profile.id, 0, 10)
+        self.assertEqual([row["seq"] for row in rows], [1, 2, 3, 4])
+        self.assertEqual(rows[-1]["kind"], FileChange.Kind.DELETE)
+        self.assertFalse(has_more)
+        self.assertEqual(floor, 0)
+        self.assertEqual(len(changes.since(other.id, 0, 10)[0]), 1)
+
+    def test_numbering_leaves_the_profile_alone(self):
+        file_ids = [_file(self.profile).id for _ in range(2)]
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            changes.record(self.profile.id, FileChange.Kind.CREATE, file_ids[:1])
+            changes.record(self.profile.id, FileChange.Kind.CREATE, file_ids[1:])
+        self.assertFalse([q["sql"] for q in queries if "users_userprofile" in q["sql"]])
+        self.assertEqual(FileChangeSequence.objects.get(user=self.profile).last_seq, 2)
+
+    def test_changes_need_a_transaction(self):
+        connection = changes.transaction.get_connection()
+        with (
+            mock.patch.object(connection, "in_atomic_block", False),
+            self.assertRaises(RuntimeError),
+        ):
+            changes.record(self.profile.id, FileChange.Kind.CREATE, [uuid.uuid4()])
+
+    def test_feed_pages_from_the_cursor(self):
+        files = [_file(self.profile) for _ in range(3)]
+        changes.record(self.profile.id, FileChange.Kind.CREATE, [f.id for f in files])
+
+        page = self.client.get("/api/files/changes/", {"limit": 2}).json()
+        self.assertEqual([c["seq"] for c in page["changes"]], [1, 2])
+        self.assertTrue(page["has_more"])
+        self.assertEqual(page["changes"][0]["file"]["file_name"], "a.txt")
+
+        page = self.client.get("/api/files/changes/", {"cursor": page["cursor"]})
+        self.assertEqual([c["seq"] for c in page.json()["changes"]], [3])
+        self.assertFalse(page.json()["has_more"])
+
+    def test_cursor_below_the_floor_must_resync(self):
+        changes.record(
+            self.profile.id, FileChange.Kind.CREATE, [_file(self.profile).id]
+        )
+        FileChangeSequence.objects.filter(user=self.profile).update(floor=1)
+        response = self.client.get("/api/files/changes/", {"cursor": 0})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()["cursor"], 1)
+
+
+class ChangeSequenceMigrationTests(TransactionTestCase):
+    before = [
+        ("files", "0014_access_log_user_id_bigint"),
+        ("users", "0003_change_feed_sequence"),
+    ]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_positions_move_off_the_profiles(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        profiles = apps.get_model("users", "UserProfile").objects
+        active = profiles.create(
+            auth0_id="auth0|active", email="a@example.com", change_seq=7, change_floor=3
+        )
+        profiles.create(auth0_id="auth0|idle", email="i@example.com")
+
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+        sequence = FileChangeSequence.objects.get()
+        self.assertEqual(
+            (sequence.user_id, sequence.last_seq, sequence.floor), (active.id, 7, 3)
+        )
+
+
+@mock.patch.dict(Config.PLAN_QUOTAS, {"free": 1000})
+class QuotaTests(AuthenticatedTestCase):
+    def test_uploads_beyond_the_quota_are_refused(self):
+        response = self.post("/api/files/upload/", _upload_request(b"x" * 1001))
+        self.assertEqual(response.status_code, 403)
+        response = self.post("/api/files/upload/", _upload_request(b"x" * 600))
+        self.assertEqual(response.status_code, 200)
+        # the unconfirmed upload holds its space
+        response = self.post("/api/files/upload/", _upload_request(b"y" * 600))
+        self.assertEqual(response.status_code, 403)
+
+    def test_negative_sizes_are_rejected(self):
+        for path, extra in (
+            ("/api/files/upload/", {}),
+            ("/api/files/upload/multipart/", {}),
+            (
+                "/api/files/upload/chunked/",
+                {"chunks": [{"checksum": CHECKSUM, "chunk_size": 1}]},
+            ),
+        ):
+            with self.subTest(path=path):
+                response = self.post(
+                    path, _upload_request(b"", file_size=-(10**13), **extra)
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("file_size", response.json())
+        response = self.post(
+            "/api/files/upload/batch/",
+            {
+                "files": [
+                    _upload_request(b"", file_size=10**12),
+                    _upload_request(b"", file_size=-(10**12)),
+                ]
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(File.objects.exists())
+
+    def test_negative_reservations_free_no_room(self):
+        _file(self.profile, uploaded=False, file_size=-(10**13))
+        response = self.post("/api/files/upload/", _upload_request(b"x" * 1001))
+        self.assertEqual(response.status_code, 403)
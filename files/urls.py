@@ -1,5 +1,39 @@
 from django.urls import path
-from .views import GetUploadURLView, ConfirmUploadView, GetDownloadURLView, CreateSharedLinkView, AccessSharedLinkView
+from .async_views import (
+    AsyncAccessSharedLinkView,
+    ChangeFeedView,
+    AsyncConfirmUploadView,
+    AsyncGetDownloadURLView,
+    AsyncGetUploadURLView,
+)
+from .views import (
+    GetUploadURLView,
+    ConfirmUploadView,
+    StreamUploadView,
+    BatchUploadURLView,
+    BatchConfirmUploadView,
+    BatchDownloadURLView,
+    FileListView,
+    FileStatsView,
+    InitiateMultipartUploadView,
+    MultipartPartURLsView,
+    MultipartRecordPartsView,
+    UploadSessionView,
+    CompleteMultipartUploadView,
+    AbortMultipartUploadView,
+    ChunkedUploadView,
+    ConfirmChunksView,
+    ChunkManifestView,
+    DeleteFileView,
+    GetDownloadURLView,
+    StreamChunkView,
+    StreamDownloadView,
+    StreamSharedLinkView,
+    StorageObjectView,
+    CreateSharedLinkView,
+    RevokeSharedLinkView,
+    AccessSharedLinkView,
+)
 
 
 urlpatterns = [
@@ -9,13 +43,116 @@ urlpatterns = [
     path(
         "upload/confirm/", ConfirmUploadView.as_view(), name="confirm-upload"
     ),  # confirm upload finished
+    path(
+        "upload/stream/<uuid:file_id>/",
+        StreamUploadView.as_view(),
+        name="upload-stream",
+    ),  # upload a file through Silo, when Config.UPLOAD_PROXY is on
+    path(
+        "upload/batch/", BatchUploadURLView.as_view(), name="upload-batch"
+    ),  # presigned upload URLs for many files
+    path(
+        "upload/confirm/batch/",
+        BatchConfirmUploadView.as_view(),
+        name="confirm-upload-batch",
+    ),  # confirm many uploads at once
+    path(
+        "upload/multipart/",
+        InitiateMultipartUploadView.as_view(),
+        name="multipart-initiate",
+    ),  # start a multipart upload
+    path(
+        "upload/multipart/parts/",
+        MultipartPartURLsView.as_view(),
+        name="multipart-part-urls",
+    ),  # presigned PUT URLs for a batch of parts
+    path(
+        "upload/multipart/record/",
+        MultipartRecordPartsView.as_view(),
+        name="multipart-record-parts",
+    ),  # record uploaded parts
+    path(
+        "upload/session/<uuid:file_id>/",
+        UploadSessionView.as_view(),
+        name="upload-session",
+    ),  # received and missing parts of an upload, to resume it
+    path(
+        "upload/multipart/complete/",
+        CompleteMultipartUploadView.as_view(),
+        name="multipart-complete",
+    ),  # assemble the parts and confirm the upload
+    path(
+        "upload/multipart/abort/",
+        AbortMultipartUploadView.as_view(),
+        name="multipart-abort",
+    ),  # cancel a multipart upload
+    path(
+        "upload/chunked/", ChunkedUploadView.as_view(), name="chunked-upload"
+    ),  # start a chunked upload, returns the chunks the server is missing
+    path(
+        "upload/chunked/confirm/",
+        ConfirmChunksView.as_view(),
+        name="chunked-confirm",
+    ),  # record uploaded chunks
+    path(
+        "download/manifest/", ChunkManifestView.as_view(), name="chunk-manifest"
+    ),  # chunk list and URLs of a chunked file
+    path("delete/", DeleteFileView.as_view(), name="delete"),  # delete a file
     path(
         "download/", GetDownloadURLView.as_view(), name="download"
     ),  # request presigned download URL
+    path(
+        "download/batch/", BatchDownloadURLView.as_view(), name="download-batch"
+    ),  # presigned download URLs for many files
+    path(
+        "download/stream/<uuid:file_id>/",
+        StreamDownloadView.as_view(),
+        name="download-stream",
+    ),  # stream a file through Silo, when Config.DOWNLOAD_PROXY is on
+    path(
+        "download/stream/<uuid:file_id>/chunks/<int:chunk_index>/",
+        StreamChunkView.as_view(),
+        name="chunk-stream",
+    ),  # stream a chunk of a chunked file, the manifest's URLs with the proxy on
+    path(
+        "objects/<path:object_name>",
+        StorageObjectView.as_view(),
+        name="storage-object",
+    ),  # presigned URLs of the local and memory storage backends
+    path("list/", FileListView.as_view(), name="file-list"),  # the user's files
+    path(
+        "changes/", ChangeFeedView.as_view(), name="file-changes"
+    ),  # what changed since a cursor, with long polling
+    path(
+        "stats/<uuid:file_id>/", FileStatsView.as_view(), name="file-stats"
+    ),  # access counts of a file
     path(
         "share/create/", CreateSharedLinkView.as_view(), name="create-shared-link"
     ),  # create a shared link
     path(
-        "share/access/<str:token>/", AccessSharedLinkView.as_view(), name="access-shared-link"
+        "share/revoke/", RevokeSharedLinkView.as_view(), name="revoke-shared-link"
+    ),  # revoke a shared link
+    path(
+        "share/access/<str:token>/",
+        AccessSharedLinkView.as_view(),
+        name="access-shared-link",
     ),  # access a shared link
+    path(
+        "share/stream/<str:grant>/",
+        StreamSharedLinkView.as_view(),
+        name="shared-link-stream",
+    ),  # stream a shared file, URL handed out by the access endpoint with the proxy on
+    # async variants of the endpoints above, for ASGI deployments
+    path("async/upload/", AsyncGetUploadURLView.as_view(), name="async-upload"),
+    path(
+        "async/upload/confirm/",
+        AsyncConfirmUploadView.as_view(),
+        name="async-confirm-upload",
+    ),
+    path("async/download/", AsyncGetDownloadURLView.as_view(), name="async-download"),
+    path(
+        "async/share/access/<str:token>/",
+        AsyncAccessSharedLinkView.as_view(),
+        name="async-access-shared-link",
+    ),
 ]
@@ -1,14 +1,54 @@
-import hashlib
+import base64
 import secrets
 import uuid
+from collections import Counter
+from datetime import datetime
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q, Value
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    JsonResponse,
+)
+from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.utils.timezone import now
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from config import Config
+from Silo.db import first_or_primary, replica_reads
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-from users.models import UserProfile
-from .models import File, FileAccessLog, SharedFileLink
+from users import quota
+from . import (
+    access_log,
+    changes,
+    dedup,
+    integrity,
+    link_cache,
+    link_passwords,
+    multipart,
+    rollups,
+    services,
+    storage,
+    streaming,
+)
+from .models import File, FileChange, FileChunk, SharedFileLink, StoredObject
 from .serializers import (
+    BatchFileIdsSerializer,
+    BatchUploadRequestSerializer,
+    ChunkedUploadConfirmSerializer,
+    ChunkedUploadInitSerializer,
+    FileIdSerializer,
+    FileListQuerySerializer,
+    FileStatsQuerySerializer,
+    RevokeSharedLinkSerializer,
+    MultipartPartURLsRequestSerializer,
+    MultipartRecordPartsSerializer,
+    MultipartUploadInitSerializer,
     FileUploadConfirmSerializer,
     FileUploadRequestSerializer,
     FileDownloadResponseSerializer,
@@ -27,28 +67,47 @@ class GetUploadURLView(APIView):
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
-        # Create file record (not marked uploaded yet)
-        file_obj: File = File.objects.create(
+        if not services.has_room(request, data["file_size"]):
+            return Response({"detail": "Storage quota exceeded"}, status=403)
+
+        file_obj: File = File(
             id=uuid.uuid4(),
-            owner_id=request.user,  # mapped to UserProfile
+            owner_id=request.profile,
             file_name=data["file_name"],
             file_size=data["file_size"],
             checksum=data["checksum"],
-            file_path=f"uploads/{request.user.id}/{uuid.uuid4()}_{data['file_name']}",
+            file_type=data.get("file_type"),
         )
 
-        # Generate presigned PUT URL (MinIO)
-        presigned_url: str = Config.s3_client.presigned_put_object(
-            Config.MINIO_BUCKET_NAME,
-            file_obj.file_path,
-            expires=3600,
+        # Same content already stored, nothing needs to be transferred
+        if services.link_duplicate(request, file_obj):
+            return Response(
+                {
+                    "file_id": str(file_obj.id),
+                    "upload_url": None,
+                    "upload_headers": {},
+                    "file_path": file_obj.file_path,
+                    "already_present": True,
+                }
+            )
+
+        # Create file record (not marked uploaded yet)
+        file_obj.file_path = (
+            f"uploads/{request.profile.id}/{uuid.uuid4()}_{data['file_name']}"
         )
+        services.create_file(file_obj)
+
+        # Generate presigned PUT URL, signed locally; the client sends the returned
+        # headers with its PUT
+        upload_url, upload_headers = services.upload_target(request, file_obj)
 
         return Response(
             {
                 "file_id": str(file_obj.id),
-                "upload_url": presigned_url,
+                "upload_url": upload_url,
+                "upload_headers": upload_headers,
                 "file_path": file_obj.file_path,
+                "already_present": False,
             }
         )
 
@@ -60,73 +119,1063 @@ class ConfirmUploadView(APIView):
     def post(self, request) -> Response:
         file_id = request.data.get("file_id")
         try:
-            file_obj: File = File.objects.get(id=file_id, owner_id=request.user)
+            file_obj: File = File.objects.get(id=file_id, owner_id=request.profile)
         except File.DoesNotExist:
             return Response({"detail": "File not found"}, status=404)
 
-        # Mark file uploaded
-        file_obj.uploaded = True
-        file_obj.save(update_fields=["uploaded"])
+        if file_obj.upload_id or file_obj.chunked:
+            return Response(
+                {"detail": "Multipart and chunked uploads have their own confirm"},
+                status=409,
+            )
+
+        # the store verified the body against the signed checksum, check it was sent
+        if (
+            Config.UPLOAD_VERIFY_CHECKSUM
+            and not file_obj.uploaded
+            and not integrity.verify_object(file_obj)
+        ):
+            return Response(
+                {"detail": "Uploaded object is missing or doesn't match the file"},
+                status=409,
+            )
+
+        services.mark_uploaded(
+            request, file_obj, verified=Config.UPLOAD_VERIFY_CHECKSUM
+        )
+        return Response(FileUploadConfirmSerializer(file_obj).data)
+
+
+# receives the file body when Config.UPLOAD_PROXY is on, streams it to the bucket
+# verifying its checksum on the way, and confirms the upload
+class StreamUploadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, file_id) -> Response:
+        if not Config.UPLOAD_PROXY:
+            return Response({"detail": "Not found"}, status=404)
 
-        # Update user storage usage
-        user_profile: UserProfile = UserProfile.objects.get(id=request.user.id)
-        user_profile.storage_used += file_obj.file_size
-        user_profile.save(update_fields=["storage_used"])
+        file_obj: File | None = File.objects.filter(
+            id=file_id,
+            owner_id=request.profile,
+            uploaded=False,
+            chunked=False,
+            upload_id__isnull=True,
+        ).first()
+        if file_obj is None:
+            return Response({"detail": "Upload not found"}, status=404)
 
-        # Log upload action
-        FileAccessLog.objects.create(
-            file_id=file_obj,
-            user_id=request.user,
-            action="UPLOAD",
-            ip_address=request.META.get("REMOTE_ADDR"),
-            user_agent=request.META.get("HTTP_USER_AGENT", ""),
-            timestamp=now(),
+        # claim the file with its multipart upload so concurrent PUTs can't interleave
+        part_size: int = multipart.part_size_for(file_obj.file_size)
+        upload_id: str = multipart.create_multipart_upload(
+            file_obj.file_path, file_obj.file_type
         )
+        if not File.objects.filter(
+            id=file_obj.id, uploaded=False, upload_id__isnull=True
+        ).update(upload_id=upload_id, part_size=part_size):
+            multipart.abort_multipart_upload(file_obj.file_path, upload_id)
+            return Response({"detail": "Upload already in progress"}, status=409)
+        file_obj.part_size = part_size
 
+        try:
+            error: str | None = integrity.stream_upload(
+                request.stream, file_obj, upload_id
+            )
+        except Exception:
+            File.objects.filter(id=file_obj.id).update(upload_id=None)
+            raise
+        if error is not None:
+            File.objects.filter(id=file_obj.id).update(upload_id=None)
+            return Response({"detail": error}, status=400)
+
+        services.mark_uploaded(
+            request, file_obj, verified=True
+        )  # hashed while streaming
         return Response(FileUploadConfirmSerializer(file_obj).data)
 
 
-# returns presigned URL for downloading a file
-class GetDownloadURLView(APIView):
+# returns presigned upload URLs for many files, with one INSERT for all of them
+class BatchUploadURLView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request) -> Response:
-        serializer = FileDownloadRequestSerializer(data=request.data)
+        serializer = BatchUploadRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        file_id = serializer.validated_data["file_id"]
+        items: list[dict] = serializer.validated_data["files"]
+
+        if not services.has_room(request, sum(item["file_size"] for item in items)):
+            return Response({"detail": "Storage quota exceeded"}, status=403)
+
+        file_objs: list[File] = [
+            File(
+                id=uuid.uuid4(),
+                owner_id=request.profile,
+                file_name=item["file_name"],
+                file_size=item["file_size"],
+                checksum=item["checksum"],
+                file_type=item.get("file_type"),
+            )
+            for item in items
+        ]
+        existing = dedup.find_stored_objects(
+            request.profile, {(f.checksum, f.file_size) for f in file_objs}
+        )
+
+        with transaction.atomic():
+            # take references on stored objects that still exist
+            wanted = Counter(
+                existing[(f.checksum, f.file_size)].id
+                for f in file_objs
+                if (f.checksum, f.file_size) in existing
+            )
+            linked: set = {
+                stored_id
+                for stored_id, count in wanted.items()
+                if StoredObject.objects.filter(id=stored_id, ref_count__gt=0).update(
+                    ref_count=F("ref_count") + count
+                )
+            }
+
+            duplicates: list[File] = []
+            for file_obj in file_objs:
+                stored = existing.get((file_obj.checksum, file_obj.file_size))
+                if stored is not None and stored.id in linked:
+                    file_obj.stored_object = stored
+                    file_obj.file_path = stored.storage_path
+                    file_obj.uploaded = True
+                    duplicates.append(file_obj)
+                else:
+                    file_obj.file_path = (
+                        f"uploads/{request.profile.id}/{uuid.uuid4()}_"
+                        f"{file_obj.file_name}"
+                    )
+
+            File.objects.bulk_create(file_objs, batch_size=dedup.IN_BATCH_SIZE)
+            quota.charge(request.profile.id, sum(f.file_size for f in duplicates))
+            changes.record(
+                request.profile.id,
+                FileChange.Kind.CREATE,
+                [f.id for f in file_objs if not f.uploaded],
+            )
+            changes.record(
+                request.profile.id, FileChange.Kind.CONFIRM, [f.id for f in duplicates]
+            )
+        access_log.log_access(request, [f.id for f in duplicates], "UPLOAD")
+
+        files: list[dict] = []
+        for file_obj in file_objs:
+            upload_url, upload_headers = (
+                (None, {})
+                if file_obj.uploaded
+                else services.upload_target(request, file_obj)
+            )
+            files.append(
+                {
+                    "file_id": str(file_obj.id),
+                    "upload_url": upload_url,
+                    "upload_headers": upload_headers,
+                    "file_path": file_obj.file_path,
+                    "already_present": file_obj.uploaded,
+                }
+            )
+        return Response({"files": files})
 
+
+# confirms many single-PUT uploads and charges their storage in one transaction
+class BatchConfirmUploadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request) -> Response:
+        serializer = BatchFileIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file_ids: list = serializer.validated_data["file_ids"]
+
+        unverified: set = set()
+        if Config.UPLOAD_VERIFY_CHECKSUM:
+            candidates: list[File] = list(
+                File.objects.filter(
+                    id__in=file_ids,
+                    owner_id=request.profile,
+                    uploaded=False,
+                    upload_id__isnull=True,
+                    chunked=False,
+                ).only("id", "file_path", "file_size", "checksum")
+            )
+            verified: set = integrity.verify_objects(
+                [(f.id, f.file_path, f.file_size, f.checksum) for f in candidates]
+            )
+            unverified = {f.id for f in candidates} - verified
+            file_ids = [file_id for file_id in file_ids if file_id not in unverified]
+
+        with transaction.atomic():
+            file_objs: list[File] = list(
+                File.objects.select_for_update().filter(
+                    id__in=file_ids,
+                    owner_id=request.profile,
+                    uploaded=False,
+                    upload_id__isnull=True,
+                    chunked=False,
+                )
+            )
+            File.objects.filter(id__in=[f.id for f in file_objs]).update(uploaded=True)
+            for file_obj in file_objs:
+                file_obj.uploaded = True
+            dedup.register_uploads(file_objs, verified=Config.UPLOAD_VERIFY_CHECKSUM)
+            quota.charge(request.profile.id, sum(f.file_size for f in file_objs))
+            changes.record(
+                request.profile.id, FileChange.Kind.CONFIRM, [f.id for f in file_objs]
+            )
+        access_log.log_access(request, [f.id for f in file_objs], "UPLOAD")
+
+        confirmed = {f.id for f in file_objs}
+        # confirmed by an earlier request, a retried batch isn't told they're gone
+        already_confirmed: set = set(
+            File.objects.filter(
+                id__in=[file_id for file_id in file_ids if file_id not in confirmed],
+                owner_id=request.profile,
+                uploaded=True,
+            ).values_list("id", flat=True)
+        )
+        return Response(
+            {
+                "confirmed": [str(file_id) for file_id in confirmed],
+                "already_confirmed": [str(file_id) for file_id in already_confirmed],
+                # no object yet, or not the declared content
+                "unverified": [str(file_id) for file_id in unverified],
+                "not_found": [
+                    str(file_id)
+                    for file_id in file_ids
+                    if file_id not in confirmed and file_id not in already_confirmed
+                ],
+            }
+        )
+
+
+# in-progress multipart upload owned by the requesting user
+def _get_multipart_file(request, file_id) -> File | None:
+    return File.objects.filter(
+        id=file_id,
+        owner_id=request.profile,
+        uploaded=False,
+        upload_id__isnull=False,
+    ).first()
+
+
+# starts an S3 multipart upload for a large file, parts can then be uploaded in parallel
+class InitiateMultipartUploadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request) -> Response:
+        serializer = MultipartUploadInitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if not services.has_room(request, data["file_size"]):
+            return Response({"detail": "Storage quota exceeded"}, status=403)
+
+        file_obj: File = File(
+            id=uuid.uuid4(),
+            owner_id=request.profile,
+            file_name=data["file_name"],
+            file_size=data["file_size"],
+            checksum=data["checksum"],
+            file_type=data.get("file_type"),
+        )
+
+        # Same content already stored, nothing needs to be transferred
+        if services.link_duplicate(request, file_obj):
+            return Response(
+                {
+                    "file_id": str(file_obj.id),
+                    "file_path": file_obj.file_path,
+                    "already_present": True,
+                }
+            )
+
+        part_size: int = multipart.part_size_for(
+            data["file_size"], data.get("part_size")
+        )
+        file_obj.file_path = (
+            f"uploads/{request.profile.id}/{uuid.uuid4()}_{data['file_name']}"
+        )
+        file_obj.upload_id = multipart.create_multipart_upload(
+            file_obj.file_path, data.get("file_type")
+        )
+        file_obj.part_size = part_size
+        services.create_file(file_obj)
+
+        return Response(
+            {
+                "file_id": str(file_obj.id),
+                "file_path": file_obj.file_path,
+                "part_size": part_size,
+                "part_count": multipart.part_count(file_obj.file_size, part_size),
+                "already_present": False,
+            }
+        )
+
+
+# issues presigned PUT URLs for a batch of parts in one call
+class MultipartPartURLsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request) -> Response:
+        serializer = MultipartPartURLsRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        file_obj = _get_multipart_file(request, data["file_id"])
+        if file_obj is None:
+            return Response({"detail": "Upload not found"}, status=404)
+
+        count: int = multipart.part_count(file_obj.file_size, file_obj.part_size)
+        if "chunk_indexes" in data:
+            chunk_indexes: list[int] = sorted(set(data["chunk_indexes"]))
+        else:
+            recorded = set(
+                file_obj.chunks.filter(uploaded=True).values_list(
+                    "chunk_index", flat=True
+                )
+            )
+            chunk_indexes = [i for i in range(count) if i not in recorded]
+
+        if chunk_indexes and chunk_indexes[-1] >= count:
+            return Response({"detail": "Chunk index out of range"}, status=400)
+        chunk_indexes = chunk_indexes[: Config.MULTIPART_MAX_URLS_PER_REQUEST]
+
+        return Response(
+            {
+                "file_id": str(file_obj.id),
+                "parts": [
+                    {
+                        "chunk_index": index,
+                        "upload_url": multipart.presigned_part_url(
+                            file_obj.file_path, file_obj.upload_id, index
+                        ),
+                    }
+                    for index in chunk_indexes
+                ],
+            }
+        )
+
+
+# state of an in-progress multipart upload, so a client can resume after a drop
+class UploadSessionView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, file_id) -> Response:
+        file_obj = _get_multipart_file(request, file_id)
+        if file_obj is None:
+            return Response({"detail": "Upload not found"}, status=404)
+
+        count: int = multipart.part_count(file_obj.file_size, file_obj.part_size)
+        received: list[tuple[int, int]] = list(
+            file_obj.chunks.filter(uploaded=True)
+            .order_by("chunk_index")
+            .values_list("chunk_index", "chunk_size")
+        )
+        received_indexes = {index for index, _ in received}
+        missing: list[int] = [i for i in range(count) if i not in received_indexes]
+
+        return Response(
+            {
+                "file_id": str(file_obj.id),
+                "part_size": file_obj.part_size,
+                "part_count": count,
+                "received_bytes": sum(size for _, size in received),
+                "received": multipart.to_ranges([index for index, _ in received]),
+                "missing": multipart.to_ranges(missing),
+                # fresh URLs for the first missing parts, fetch more via parts/
+                "parts": [
+                    {
+                        "chunk_index": index,
+                        "upload_url": multipart.presigned_part_url(
+                            file_obj.file_path, file_obj.upload_id, index
+                        ),
+                    }
+                    for index in missing[: Config.MULTIPART_MAX_URLS_PER_REQUEST]
+                ],
+            }
+        )
+
+
+# records the ETag and checksum of parts the client has finished uploading
+class MultipartRecordPartsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request) -> Response:
+        serializer = MultipartRecordPartsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        file_obj = _get_multipart_file(request, data["file_id"])
+        if file_obj is None:
+            return Response({"detail": "Upload not found"}, status=404)
+
+        count: int = multipart.part_count(file_obj.file_size, file_obj.part_size)
+        if any(part["chunk_index"] >= count for part in data["parts"]):
+            return Response({"detail": "Chunk index out of range"}, status=400)
+
+        FileChunk.objects.bulk_create(
+            [
+                FileChunk(
+                    id=uuid.uuid4(),
+                    file_id=file_obj,
+                    chunk_index=part["chunk_index"],
+                    chunk_size=part["chunk_size"],
+                    checksum=part["checksum"],
+                    etag=part["etag"].strip('"'),
+                    storage_path=file_obj.file_path,
+                    uploaded=True,
+                )
+                for part in data["parts"]
+            ],
+            update_conflicts=True,
+            unique_fields=["file_id", "chunk_index"],
+            update_fields=["chunk_size", "checksum", "etag", "uploaded"],
+        )
+
+        return Response({"file_id": str(file_obj.id), "recorded": len(data["parts"])})
+
+
+# stitches the uploaded parts into the final object and confirms the upload
+class CompleteMultipartUploadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request) -> Response:
+        serializer = FileIdSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        file_obj = _get_multipart_file(request, serializer.validated_data["file_id"])
+        if file_obj is None:
+            return Response({"detail": "Upload not found"}, status=404)
+
+        # the store's list wins over ETags the client recorded: a part uploaded
+        # again, or recorded with a wrong ETag, would fail the completion
         try:
-            file_obj: File = File.objects.get(
-                id=file_id, owner_id=request.user, uploaded=True
+            etags: dict[int, str] = {
+                **dict(
+                    file_obj.chunks.filter(uploaded=True).values_list(
+                        "chunk_index", "etag"
+                    )
+                ),
+                **multipart.list_uploaded_parts(file_obj.file_path, file_obj.upload_id),
+            }
+        except storage.StorageError as e:
+            return Response({"detail": f"Upload can't be completed, {e}"}, status=409)
+        count: int = multipart.part_count(file_obj.file_size, file_obj.part_size)
+        missing: list[int] = [i for i in range(count) if i not in etags]
+        if missing:
+            return Response(
+                {"detail": "Upload is missing parts", "missing": missing}, status=409
             )
-        except File.DoesNotExist:
+
+        try:
+            multipart.complete_multipart_upload(
+                file_obj.file_path, file_obj.upload_id, etags
+            )
+        except storage.StorageError as e:
+            return Response({"detail": f"Upload can't be completed, {e}"}, status=409)
+        # the quota was checked, and is charged, against the declared size; parts
+        # adding up to anything else drop the upload and the space it reserved
+        stat = storage.backend().stat(file_obj.file_path)
+        if stat is None or stat.size != file_obj.file_size:
+            storage.backend().delete(file_obj.file_path)
+            with transaction.atomic():
+                changes.record(
+                    request.profile.id, FileChange.Kind.DELETE, [file_obj.id]
+                )
+                file_obj.delete()  # chunks cascade
+            return Response(
+                {"detail": "Uploaded parts don't add up to the file size"},
+                status=400,
+            )
+        services.mark_uploaded(request, file_obj)
+        return Response(FileUploadConfirmSerializer(file_obj).data)
+
+
+# cancels a multipart upload and frees the parts stored so far
+class AbortMultipartUploadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request) -> Response:
+        serializer = FileIdSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        file_obj = _get_multipart_file(request, serializer.validated_data["file_id"])
+        if file_obj is None:
+            return Response({"detail": "Upload not found"}, status=404)
+
+        multipart.abort_multipart_upload(file_obj.file_path, file_obj.upload_id)
+        with transaction.atomic():
+            changes.record(request.profile.id, FileChange.Kind.DELETE, [file_obj.id])
+            file_obj.delete()  # chunks cascade
+        return Response(status=204)
+
+
+# starts a chunked upload from the file's chunk list, only unknown chunks are uploaded
+class ChunkedUploadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request) -> Response:
+        serializer = ChunkedUploadInitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        chunks: list[dict] = data["chunks"]
+
+        if len(chunks) > Config.CDC_MAX_CHUNKS:
+            return Response({"detail": "Too many chunks"}, status=400)
+        if any(chunk["chunk_size"] > Config.CDC_MAX_CHUNK_SIZE for chunk in chunks):
+            return Response({"detail": "Chunk too large"}, status=400)
+        if sum(chunk["chunk_size"] for chunk in chunks) != data["file_size"]:
+            return Response(
+                {"detail": "Chunk sizes don't add up to the file size"}, status=400
+            )
+
+        if not services.has_room(request, data["file_size"]):
+            return Response({"detail": "Storage quota exceeded"}, status=403)
+
+        paths: list[str] = [
+            dedup.chunk_storage_path(request.profile, chunk["checksum"])
+            for chunk in chunks
+        ]
+        file_obj: File = File(
+            id=uuid.uuid4(),
+            owner_id=request.profile,
+            file_name=data["file_name"],
+            file_size=data["file_size"],
+            checksum=data["checksum"],
+            file_type=data.get("file_type"),
+            file_path=f"manifests/{request.profile.id}/{uuid.uuid4()}",
+            chunked=True,
+        )
+        with transaction.atomic():
+            present: set[str] = dedup.present_chunk_paths(set(paths))
+            file_obj.save(force_insert=True)
+            changes.record(request.profile.id, FileChange.Kind.CREATE, [file_obj.id])
+            FileChunk.objects.bulk_create(
+                [
+                    FileChunk(
+                        id=uuid.uuid4(),
+                        file_id=file_obj,
+                        chunk_index=index,
+                        chunk_size=chunk["chunk_size"],
+                        checksum=chunk["checksum"],
+                        storage_path=path,
+                        uploaded=path in present,
+                    )
+                    for index, (chunk, path) in enumerate(zip(chunks, paths))
+                ],
+                batch_size=dedup.IN_BATCH_SIZE,
+            )
+
+        # a chunk repeated within the file only has to be uploaded once
+        missing: dict[str, str] = {}
+        for chunk, path in zip(chunks, paths):
+            if path not in present:
+                missing.setdefault(chunk["checksum"], path)
+
+        uploads: list[dict] = []
+        for checksum, path in missing.items():
+            upload_url, upload_headers = integrity.presigned_put(path, checksum)
+            uploads.append(
+                {
+                    "checksum": checksum,
+                    "upload_url": upload_url,
+                    "upload_headers": upload_headers,
+                }
+            )
+        return Response(
+            {
+                "file_id": str(file_obj.id),
+                "chunk_count": len(chunks),
+                "missing": uploads,
+            }
+        )
+
+
+# records uploaded chunks, the file is confirmed once its manifest is complete
+class ConfirmChunksView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request) -> Response:
+        serializer = ChunkedUploadConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        file_obj: File | None = File.objects.filter(
+            id=data["file_id"],
+            owner_id=request.profile,
+            chunked=True,
+            uploaded=False,
+        ).first()
+        if file_obj is None:
+            return Response({"detail": "Upload not found"}, status=404)
+
+        checksums: list[str] = data["checksums"]
+        if Config.UPLOAD_VERIFY_CHECKSUM:
+            # only chunks whose objects are in the bucket with that content
+            claimed: dict[str, tuple[str, int]] = {}
+            for i in range(0, len(checksums), dedup.IN_BATCH_SIZE):
+                for checksum, path, size in file_obj.chunks.filter(
+                    checksum__in=checksums[i : i + dedup.IN_BATCH_SIZE],
+                    uploaded=False,
+                ).values_list("checksum", "storage_path", "chunk_size"):
+                    claimed[checksum] = (path, size)
+            checksums = list(
+                integrity.verify_objects(
+                    [
+                        (checksum, path, size, checksum)
+                        for checksum, (path, size) in claimed.items()
+                    ]
+                )
+            )
+        for i in range(0, len(checksums), dedup.IN_BATCH_SIZE):
+            file_obj.chunks.filter(
+                checksum__in=checksums[i : i + dedup.IN_BATCH_SIZE]
+            ).update(uploaded=True)
+
+        missing: list[str] = list(
+            file_obj.chunks.filter(uploaded=False)
+            .values_list("checksum", flat=True)
+            .distinct()
+        )
+        if not missing:
+            services.mark_uploaded(request, file_obj)
+        return Response(
+            {
+                "file_id": str(file_obj.id),
+                "uploaded": not missing,
+                "missing": missing,
+            }
+        )
+
+
+# ordered chunk list of a chunked file with presigned GET URLs to reassemble it
+class ChunkManifestView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @replica_reads
+    def post(self, request) -> Response:
+        serializer = FileIdSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        file_obj: File | None = first_or_primary(
+            File.objects.filter(
+                id=serializer.validated_data["file_id"],
+                owner_id=request.profile,
+                chunked=True,
+                uploaded=True,
+            )
+        )
+        if file_obj is None:
             return Response({"detail": "File not found"}, status=404)
 
-        # Generate presigned GET URL (MinIO)
-        presigned_url: str = Config.s3_client.presigned_get_object(
-            Config.MINIO_BUCKET_NAME,
-            file_obj.file_path,
-            expires=3600,
+        urls: dict[str, str] = {}
+        chunks: list[dict] = []
+        for index, checksum, size, path in file_obj.chunks.order_by(
+            "chunk_index"
+        ).values_list("chunk_index", "checksum", "chunk_size", "storage_path"):
+            if path not in urls:
+                urls[path] = (
+                    request.build_absolute_uri(
+                        reverse("chunk-stream", args=[file_obj.id, index])
+                    )
+                    if Config.DOWNLOAD_PROXY
+                    else storage.presigned_get_url(path)
+                )
+            chunks.append(
+                {
+                    "chunk_index": index,
+                    "checksum": checksum,
+                    "chunk_size": size,
+                    "download_url": urls[path],
+                }
+            )
+
+        return Response(
+            {
+                "file_id": str(file_obj.id),
+                "file_name": file_obj.file_name,
+                "file_size": file_obj.file_size,
+                "chunks": chunks,
+            }
         )
 
-        # Log download
-        FileAccessLog.objects.create(
-            file_id=file_obj,
-            user_id=request.user,
-            action="DOWNLOAD",
-            ip_address=request.META.get("REMOTE_ADDR"),
-            user_agent=request.META.get("HTTP_USER_AGENT", ""),
-            timestamp=now(),
+
+# deletes a file, its stored object goes away with the last file referencing it
+class DeleteFileView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request) -> Response:
+        serializer = FileIdSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        file_obj: File | None = File.objects.filter(
+            id=serializer.validated_data["file_id"], owner_id=request.profile
+        ).first()
+        if file_obj is None:
+            return Response({"detail": "File not found"}, status=404)
+
+        chunk_paths: set[str] = (
+            set(file_obj.chunks.values_list("storage_path", flat=True))
+            if file_obj.chunked
+            else set()
         )
+        with transaction.atomic():
+            orphaned_path: str | None = dedup.release(file_obj)
+            changes.record(request.profile.id, FileChange.Kind.DELETE, [file_obj.id])
+            file_obj.delete()  # chunks cascade
+            if file_obj.uploaded:
+                quota.charge(request.profile.id, -file_obj.file_size)
+
+        # Only touch the bucket once the rows are gone for good
+        if file_obj.upload_id:
+            multipart.abort_multipart_upload(file_obj.file_path, file_obj.upload_id)
+        elif orphaned_path:
+            storage.backend().delete(orphaned_path)
+        for path in dedup.orphaned_chunk_paths(chunk_paths):
+            storage.backend().delete(path)
+        return Response(status=204)
+
+
+# returns presigned URL for downloading a file
+class GetDownloadURLView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @replica_reads
+    def post(self, request) -> Response:
+        serializer = FileDownloadRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file_id = serializer.validated_data["file_id"]
+
+        file_obj: File | None = first_or_primary(
+            File.objects.filter(id=file_id, owner_id=request.profile, uploaded=True)
+        )
+        if file_obj is None:
+            return Response({"detail": "File not found"}, status=404)
+
+        if file_obj.chunked:
+            return Response(
+                {"detail": "Chunked files are downloaded through their manifest"},
+                status=409,
+            )
+
+        if Config.DOWNLOAD_PROXY:
+            # the streaming view logs the download when it is fetched
+            download_url: str = services.stream_url(request, file_obj)
+        else:
+            # Generate presigned GET URL, signed locally
+            download_url = storage.presigned_get_url(file_obj.file_path)
+            # Log download
+            access_log.log_access(request, [file_obj.id], "DOWNLOAD")
 
         response_data: dict[str, str | int] = {
-            "download_url": presigned_url,
+            "download_url": download_url,
             "file_name": file_obj.file_name,
             "file_size": file_obj.file_size,
         }
         return Response(FileDownloadResponseSerializer(response_data).data)
 
 
+# returns presigned download URLs for many files, fetched with a single query
+class BatchDownloadURLView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @replica_reads
+    def post(self, request) -> Response:
+        serializer = BatchFileIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file_ids: list = serializer.validated_data["file_ids"]
+
+        files = File.objects.filter(
+            owner_id=request.profile, uploaded=True, chunked=False
+        ).only("id", "file_name", "file_size", "file_path")
+        file_objs: list[File] = list(files.filter(id__in=file_ids))
+        missing: set = set(file_ids) - {f.id for f in file_objs}
+        if missing and files.db != DEFAULT_DB_ALIAS:
+            # just confirmed files may not have reached the replica yet
+            file_objs += files.using(DEFAULT_DB_ALIAS).filter(id__in=missing)
+        if not Config.DOWNLOAD_PROXY:
+            access_log.log_access(request, [f.id for f in file_objs], "DOWNLOAD")
+
+        found = {f.id for f in file_objs}
+        return Response(
+            {
+                "files": [
+                    {
+                        "file_id": str(file_obj.id),
+                        "download_url": services.stream_url(request, file_obj)
+                        if Config.DOWNLOAD_PROXY
+                        else storage.presigned_get_url(file_obj.file_path),
+                        "file_name": file_obj.file_name,
+                        "file_size": file_obj.file_size,
+                    }
+                    for file_obj in file_objs
+                ],
+                "not_found": [
+                    str(file_id) for file_id in file_ids if file_id not in found
+                ],
+            }
+        )
+
+
+# Streams a file through Silo (Config.DOWNLOAD_PROXY), with single-range requests
+# and If-None-Match. Async so that slow clients wait on the event loop under ASGI
+# instead of holding a worker each; see files/streaming.py.
+class StreamDownloadView(View):
+    async def get(self, request, file_id) -> HttpResponse:
+        if not Config.DOWNLOAD_PROXY:
+            return JsonResponse(
+                {"detail": "Streaming downloads are disabled"}, status=404
+            )
+        if not await sync_to_async(services.authenticate)(request):
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."}, status=401
+            )
+
+        file_obj: File | None = await File.objects.filter(
+            id=file_id, owner_id=request.profile, uploaded=True, chunked=False
+        ).afirst()
+        if file_obj is None:
+            return JsonResponse({"detail": "File not found"}, status=404)
+
+        # the SHA-256 identifies the content, whatever the object's name
+        response, first_byte = await streaming.serve(
+            request,
+            file_obj.file_path,
+            file_obj.file_size,
+            f'"{file_obj.checksum}"',
+            file_obj.file_name,
+            file_obj.file_type,
+        )
+        if first_byte:
+            await access_log.alog_access(request, [file_obj.id], "DOWNLOAD")
+        return response
+
+
+# One chunk of a chunked file, for the manifest's URLs with Config.DOWNLOAD_PROXY
+class StreamChunkView(View):
+    async def get(self, request, file_id, chunk_index: int) -> HttpResponse:
+        if not Config.DOWNLOAD_PROXY:
+            return JsonResponse(
+                {"detail": "Streaming downloads are disabled"}, status=404
+            )
+        if not await sync_to_async(services.authenticate)(request):
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."}, status=401
+            )
+
+        chunk: FileChunk | None = await FileChunk.objects.filter(
+            file_id=file_id,
+            file_id__owner_id=request.profile,
+            file_id__uploaded=True,
+            chunk_index=chunk_index,
+        ).afirst()
+        if chunk is None:
+            return JsonResponse({"detail": "Chunk not found"}, status=404)
+        response, _ = await streaming.serve(
+            request,
+            chunk.storage_path,
+            chunk.chunk_size,
+            f'"{chunk.checksum}"',
+            f"{file_id}.{chunk_index}",
+        )
+        return response
+
+
+# The file of a shared link, with Config.DOWNLOAD_PROXY. The URL is handed out by
+# the access endpoint after the password check and the download count, and carries
+# the link id signed with SECRET_KEY; it stops working when it expires, or the link
+# does or is revoked.
+class StreamSharedLinkView(View):
+    async def get(self, request, grant: str) -> HttpResponse:
+        if not Config.DOWNLOAD_PROXY:
+            return JsonResponse(
+                {"detail": "Streaming downloads are disabled"}, status=404
+            )
+        try:
+            link_id = services.link_stream_signer.unsign(
+                grant, max_age=Config.PRESIGNED_URL_EXPIRY
+            )
+        except signing.BadSignature:
+            return JsonResponse({"detail": "Invalid or expired link"}, status=403)
+
+        shared_link: SharedFileLink | None = (
+            await SharedFileLink.objects.filter(id=link_id, file_id__uploaded=True)
+            .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now()))
+            .select_related("file_id")
+            .afirst()
+        )
+        if shared_link is None:
+            return JsonResponse({"detail": "Invalid or expired link"}, status=403)
+        file_obj: File = shared_link.file_id
+        response, _ = await streaming.serve(
+            request,
+            file_obj.file_path,
+            file_obj.file_size,
+            f'"{file_obj.checksum}"',
+            file_obj.file_name,
+            file_obj.file_type,
+        )
+        return response
+
+
+# Objects of the local and in-memory storage backends, reached through the URLs
+# they presign (see files/storage.py); with MinIO, clients talk to the bucket and
+# this answers 404. Sync, so that under a WSGI server a whole local file goes out
+# through wsgi.file_wrapper (sendfile); ranges are read through mmap.
+@method_decorator(csrf_exempt, name="dispatch")
+class StorageObjectView(View):
+    http_method_names = ["get", "head", "put"]
+
+    def dispatch(self, request, object_name: str) -> HttpResponse:
+        backend = storage.backend()
+        if not backend.self_served:
+            return JsonResponse({"detail": "Not found"}, status=404)
+        # HEAD is allowed with a GET URL, like S3
+        method: str = "GET" if request.method == "HEAD" else request.method
+        if not backend.verify(method, object_name, request.GET, request.headers):
+            return JsonResponse({"detail": "Invalid or expired signature"}, status=403)
+        return super().dispatch(request, object_name)
+
+    def get(self, request, object_name: str) -> HttpResponse:
+        backend = storage.backend()
+        stat: storage.ObjectStat | None = backend.stat(object_name)
+        if stat is None:
+            return JsonResponse({"detail": "Not found"}, status=404)
+        try:
+            byte_range = streaming.parse_range(request.headers.get("Range"), stat.size)
+        except ValueError:
+            return HttpResponse(
+                status=416, headers={"Content-Range": f"bytes */{stat.size}"}
+            )
+
+        headers = {"Accept-Ranges": "bytes", "ETag": f'"{stat.etag}"'}
+        try:
+            if byte_range is None:
+                return FileResponse(backend.open(object_name), headers=headers)
+            start, end = byte_range
+            response = FileResponse(
+                backend.open(object_name, start, end - start + 1),
+                status=206,
+                headers={
+                    **headers,
+                    "Content-Length": str(end - start + 1),
+                    "Content-Range": f"bytes {start}-{end}/{stat.size}",
+                },
+            )
+        except storage.StorageError:
+            return JsonResponse({"detail": "Not found"}, status=404)
+        response.block_size = storage.READ_SIZE
+        return response
+
+    def put(self, request, object_name: str) -> HttpResponse:
+        backend = storage.backend()
+        upload_id: str | None = request.GET.get("uploadId")
+        try:
+            if upload_id:
+                part_number = int(request.GET.get("partNumber", ""))
+                etag: str = backend.upload_part(
+                    object_name, upload_id, part_number, request
+                )
+            else:
+                checksum: str | None = request.headers.get(integrity.CHECKSUM_HEADER)
+                etag = backend.put(object_name, request, checksum).etag
+        except ValueError:
+            return JsonResponse({"detail": "Invalid partNumber"}, status=400)
+        except storage.StorageError as e:
+            status: int = 404 if e.code in ("NoSuchUpload", "NoSuchKey") else 400
+            return JsonResponse({"detail": str(e)}, status=status)
+        return HttpResponse(status=200, headers={"ETag": f'"{etag}"'})
+
+
+# opaque cursor: the (uploaded_at, id) of the last file of a page
+def _encode_list_cursor(uploaded_at: datetime, file_id: uuid.UUID) -> str:
+    raw = f"{uploaded_at.isoformat()}|{file_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_list_cursor(cursor: str) -> tuple[datetime, uuid.UUID] | None:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        uploaded_at, file_id = raw.split("|")
+        return datetime.fromisoformat(uploaded_at), uuid.UUID(file_id)
+    except ValueError:
+        return None
+
+
+# lists the user's files, newest first. Pages continue from a keyset cursor rather
+# than an OFFSET, so every page is one range scan of the files_file_listing index
+# however many files the user has, and rows are fetched as dicts, not model instances
+class FileListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @replica_reads
+    def get(self, request) -> Response:
+        serializer = FileListQuerySerializer(data=request.query_params.dict())
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        limit: int = data["limit"]
+
+        # compared with a parameter: SQLite can't use the index for the bare boolean
+        # column Django writes for uploaded=True
+        files = File.objects.filter(
+            owner_id=request.profile, uploaded=Value(data["uploaded"])
+        )
+        if "cursor" in data:
+            position = _decode_list_cursor(data["cursor"])
+            if position is None:
+                return Response({"detail": "Invalid cursor"}, status=400)
+            uploaded_at, file_id = position
+            # (uploaded_at, id) < position; the first condition alone bounds the
+            # index scan, the databases don't all do that for the OR
+            files = files.filter(
+                Q(uploaded_at__lte=uploaded_at)
+                & (Q(uploaded_at__lt=uploaded_at) | Q(id__lt=file_id))
+            )
+
+        page: list[dict] = list(
+            files.order_by("-uploaded_at", "-id").values(*services.FILE_LIST_FIELDS)[
+                : limit + 1
+            ]
+        )
+        next_cursor: str | None = None
+        if len(page) > limit:
+            del page[limit:]
+            next_cursor = _encode_list_cursor(page[-1]["uploaded_at"], page[-1]["id"])
+        return Response({"files": page, "next_cursor": next_cursor})
+
+
+# access counts of a file from the rollups: all-time totals per action and
+# downloads per day
+class FileStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @replica_reads
+    def get(self, request, file_id) -> Response:
+        serializer = FileStatsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        days: int = serializer.validated_data["days"]
+
+        if not File.objects.filter(id=file_id, owner_id=request.profile).exists():
+            return Response({"detail": "File not found"}, status=404)
+
+        totals: dict[str, int] = rollups.file_totals(file_id)
+        return Response(
+            {
+                "file_id": str(file_id),
+                "downloads": totals.get("DOWNLOAD", 0),
+                "shared_downloads": totals.get("SHARE", 0),
+                "uploads": totals.get("UPLOAD", 0),
+                "daily_downloads": [
+                    {"day": day.isoformat(), "count": count}
+                    for day, count in rollups.file_daily(file_id, "DOWNLOAD", days)
+                ],
+            }
+        )
+
+
 class CreateSharedLinkView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -137,7 +1186,7 @@ class CreateSharedLinkView(APIView):
 
         try:
             file_obj: File = File.objects.get(
-                id=data["file_id"], owner_id=request.user, uploaded=True
+                id=data["file_id"], owner_id=request.profile, uploaded=True
             )
         except File.DoesNotExist:
             return Response({"detail": "File not found"}, status=404)
@@ -146,75 +1195,84 @@ class CreateSharedLinkView(APIView):
             32
         )  # Return a random URL-safe text string, in Base64 encoding.
         password_hash: str = (
-            hashlib.sha256(data["password"].encode()).hexdigest()
+            link_passwords.hash_password(data["password"])
             if data.get("password")
             else None
         )
 
-        shared_link: SharedFileLink = SharedFileLink.objects.create(
-            id=uuid.uuid4(),
-            owner=request.user,
-            file_id=file_obj,
-            token=token,
-            expires_at=data.get("expires_at"),
-            max_downloads=data.get("max_downloads"),
-            permission=data["permission"],
-            password_hash=password_hash,
-        )
+        with transaction.atomic():
+            shared_link: SharedFileLink = SharedFileLink.objects.create(
+                id=uuid.uuid4(),
+                owner=request.profile,
+                file_id=file_obj,
+                token=token,
+                expires_at=data.get("expires_at"),
+                max_downloads=data.get("max_downloads"),
+                permission=data["permission"],
+                password_hash=password_hash,
+            )
+            changes.record(request.profile.id, FileChange.Kind.SHARE, [file_obj.id])
 
         return Response(SharedLinkResponseSerializer(shared_link).data)
 
 
-class AccessSharedLinkView(APIView):
+# revokes a link; the link cache is invalidated by the delete signal
+class RevokeSharedLinkView(APIView):
+    permission_classes = [IsAuthenticated]
+
     def post(self, request) -> Response:
-        token: str = request.data.get("token")
+        serializer = RevokeSharedLinkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        shared_link: SharedFileLink | None = SharedFileLink.objects.filter(
+            token=serializer.validated_data["token"], owner=request.profile
+        ).first()
+        if shared_link is None:
+            return Response({"detail": "Link not found"}, status=404)
+        with transaction.atomic():
+            shared_link.delete()
+            changes.record(
+                request.profile.id, FileChange.Kind.UNSHARE, [shared_link.file_id_id]
+            )
+        return Response({"detail": "Link revoked"})
+
+
+class AccessSharedLinkView(APIView):
+    def post(self, request, token: str) -> Response:
         password: str = request.data.get("password")
 
-        try:
-            shared_link: SharedFileLink = SharedFileLink.objects.select_related(
-                "file_id"
-            ).get(token=token)
-        except SharedFileLink.DoesNotExist:
+        # cached link metadata, unknown tokens are cached as such
+        shared_link: link_cache.SharedLinkInfo | None = link_cache.resolve(token)
+        if shared_link is None:
             return Response({"detail": "Invalid link"}, status=404)
 
         # Check expiry
-        if shared_link.expires_at and shared_link.expires_at < now():
+        current = now()
+        if shared_link.expires_at and shared_link.expires_at <= current:
             return Response({"detail": "Link expired"}, status=403)
 
-        # Check max downloads
-        if (
-            shared_link.max_downloads
-            and shared_link.download_count >= shared_link.max_downloads
-        ):
-            return Response({"detail": "Download limit reached"}, status=403)
-
         # Check password
-        if shared_link.password_hash:
-            if (
-                not password
-                or hashlib.sha256(password.encode()).hexdigest()
-                != shared_link.password_hash
-            ):
-                return Response({"detail": "Invalid password"}, status=403)
-
-        # Generate presigned GET URL
-        file_obj = shared_link.file_id
-        presigned_url: str = Config.s3_client.presigned_get_object(
-            Config.MINIO_BUCKET_NAME,
-            file_obj.file_path,
-            expires=3600,
-        )
+        error = services.check_link_password(shared_link, token, password)
+        if error is not None:
+            detail, status, headers = error
+            return Response({"detail": detail}, status=status, headers=headers)
+
+        if shared_link.chunked:
+            return Response(
+                {"detail": "Chunked files are downloaded through their manifest"},
+                status=409,
+            )
+
+        # Count the download
+        detail: str | None = services.count_link_download(shared_link, current)
+        if detail is not None:
+            return Response({"detail": detail}, status=403)
 
-        # Update counters
-        shared_link.download_count += 1
-        shared_link.save(update_fields=["download_count"])
+        download_url: str = services.shared_download_url(request, shared_link)
 
-        FileAccessLog.objects.create(
-            file_id=file_obj,
-            user_id=shared_link.owner,  # link owner is logged
-            action="SHARE",
-            ip_address=request.META.get("REMOTE_ADDR"),
-            user_agent=request.META.get("HTTP_USER_AGENT", ""),
+        # link owner is logged
+        access_log.log_access(
+            request, [shared_link.file_id], "SHARE", user_id=shared_link.owner_id
         )
 
-        return Response({"download_url": presigned_url})
+        return Response({"download_url": download_url})
@@ -1,41 +1,137 @@
+import threading
+import time
 import requests
-from typing import Any
+from typing import Any, Callable
 from jose import jwk, jwt
-from jose.utils import base64url_decode
+from jose.backends.base import Key
 from config import Config
+from Silo import metrics
 
 
-JWKS_URL = f"https://{Config.AUTH0_DOMAIN}/.well-known/jwks.json"
+JWKS_URL = Config.AUTH0_JWKS_URL
 
 
-def get_jwks() -> requests.Response:
-    return requests.get(JWKS_URL).json()
+def get_jwks() -> dict[str, Any]:
+    response = requests.get(JWKS_URL, timeout=Config.AUTH0_JWKS_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
 
 
-def verify_jwt(token) -> dict[str, Any]:
-    jwks = get_jwks()
-    unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
-    for key in jwks["keys"]:
-        if key["kid"] == unverified_header.get("kid"):
+# Holds the constructed public keys of the JWKS by kid, so verifying a token never
+# waits on Auth0. Keys older than `ttl` are still served while a background thread
+# refetches them (stale-while-revalidate). An unknown kid triggers a synchronous
+# refetch, but at most once per `min_refresh_interval` so forged kids can't stampede
+# Auth0. Concurrent refetches collapse into one (single-flight).
+class JWKSCache:
+    def __init__(
+        self,
+        fetcher: Callable[[], dict[str, Any]] = get_jwks,
+        ttl: int = Config.AUTH0_JWKS_TTL,
+        min_refresh_interval: int = Config.AUTH0_JWKS_MIN_REFRESH_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.fetcher = fetcher  # swap for a local JWKS stub in tests
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.clock = clock
+        self._keys: dict[str, Key] = {}
+        self._fetched_at: float | None = None
+        self._last_attempt: float | None = None
+        self._generation = 0  # bumped on every fetch attempt
+        self._lock = threading.Lock()
+        self._revalidating = False
+
+    def get_key(self, kid: str | None) -> Key:
+        if self._fetched_at is None:
+            self._refresh(self._generation)
+        elif self.clock() - self._fetched_at >= self.ttl and self._may_refetch():
+            self._revalidate_in_background()
+
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+
+        # unknown kid: the signing key may have just been rotated
+        if self._may_refetch():
+            self._refresh(self._generation)
+            key = self._keys.get(kid)
+        if key is None:
+            raise Exception("Unable to find appropriate key")
+        return key
+
+    def _may_refetch(self) -> bool:
+        return (
+            self._last_attempt is None
+            or self.clock() - self._last_attempt >= self.min_refresh_interval
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+            self._last_attempt = None
+            self._generation += 1
+
+    def _refresh(self, seen_generation: int) -> None:
+        with self._lock:
+            if self._generation != seen_generation:
+                return  # another thread fetched while we waited for the lock
+            self._generation += 1
+            self._last_attempt = self.clock()
+            try:
+                with metrics.timed("jwks", "fetch"):
+                    jwks = self.fetcher()
+            except Exception:
+                if not self._keys:
+                    raise
+                return  # keep serving the keys we have
+            self._keys = self._construct_keys(jwks)
+            self._fetched_at = self.clock()
+
+    def _revalidate_in_background(self) -> None:
+        with self._lock:
+            if self._revalidating:
+                return
+            self._revalidating = True
+        generation = self._generation
+
+        def revalidate():
+            try:
+                self._refresh(generation)
+            except Exception:
+                pass
+            finally:
+                self._revalidating = False
+
+        threading.Thread(target=revalidate, name="jwks-revalidate", daemon=True).start()
+
+    @staticmethod
+    def _construct_keys(jwks: dict[str, Any]) -> dict[str, Key]:
+        keys: dict[str, Key] = {}
+        for key in jwks.get("keys", []):
+            if key.get("kty") != "RSA" or key.get("use", "sig") != "sig":
+                continue
             rsa_key = {
                 "kty": key["kty"],
                 "kid": key["kid"],
-                "use": key["use"],
+                "use": key.get("use", "sig"),
                 "n": key["n"],
                 "e": key["e"],
             }
-            break
-    if not rsa_key:
-        raise Exception("Unable to find appropriate key")
+            keys[key["kid"]] = jwk.construct(
+                rsa_key, algorithm=Config.AUTH0_ALGORITHMS[0]
+            )
+        return keys
 
-    public_key = jwk.construct(rsa_key)
-    message, encoded_signature = token.rsplit(".", 1)
-    decoded_signature = base64url_decode(encoded_signature.encode("utf-8"))
 
-    if not public_key.verify(message.encode("utf-8"), decoded_signature):
-        raise Exception("Signature verification failed")
+jwks_cache = JWKSCache()
+
+
+def verify_jwt(token) -> dict[str, Any]:
+    unverified_header = jwt.get_unverified_header(token)
+    public_key = jwks_cache.get_key(unverified_header.get("kid"))
 
+    # jwt.decode checks the signature itself, so there is no separate verify step
     payload = jwt.decode(
         token,
         public_key,
@@ -1,5 +1,8 @@
 from rest_framework import authentication, exceptions
+from Silo import metrics
 from .auth0_jwt import verify_jwt
+from .principals import resolve_principal
+from .token_cache import verified_tokens
 
 
 class Auth0JWTAuthentication(authentication.BaseAuthentication):
@@ -8,22 +11,21 @@ class Auth0JWTAuthentication(authentication.BaseAuthentication):
         if not auth_header.startswith("Bearer "):
             return None
         token = auth_header.split(" ")[1]
-        try:
-            payload = verify_jwt(token)
-        except Exception as e:
-            raise exceptions.AuthenticationFailed(f"Invalid JWT: {str(e)}")
+        # skip the RS256 check for tokens this worker has already verified
+        payload = verified_tokens.get(token)
+        if payload is None:
+            try:
+                with metrics.timed("jwt", "verify"):
+                    payload = verify_jwt(token)
+            except Exception as e:
+                raise exceptions.AuthenticationFailed(f"Invalid JWT: {str(e)}")
+            verified_tokens.set(token, payload)
         # `payload["sub"]` is usually the unique user id in Auth0
         user_id = payload.get("sub")
         if not user_id:
             raise exceptions.AuthenticationFailed("Token missing subject claim")
-        # Optionally fetch or create a local Django user to represent this
-        from django.contrib.auth import get_user_model
-
-        User = get_user_model()
-        user, _ = User.objects.get_or_create(
-            username=user_id,
-            defaults={
-                "email": payload.get("email", ""),
-            },
-        )
+        # local Django user and profile representing this subject, cached per worker
+        user, profile = resolve_principal(user_id, payload)
+        # views read the profile from the request instead of querying it again
+        request.profile = profile
         return (user, None)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from users import quota
+
+
+# Run periodically when STORAGE_COUNTER_SHARDS > 0, UserProfile.storage_used lags
+# behind by whatever is still pending in the shard rows.
+class Command(BaseCommand):
+    help = "Fold sharded storage usage counters into UserProfile.storage_used"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Profiles per pass"
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            reconciled = quota.reconcile(options["batch_size"])
+            total += reconciled
+            if reconciled < options["batch_size"]:
+                break
+        self.stdout.write(f"Reconciled storage usage of {total} profile(s)")
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0002_storage_usage_shard"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="change_floor",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="change_seq",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:48
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0003_change_feed_sequence"),
+        # the positions are copied to files.FileChangeSequence first
+        ("files", "0015_file_change_sequence"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="userprofile",
+            name="change_floor",
+        ),
+        migrations.RemoveField(
+            model_name="userprofile",
+            name="change_seq",
+        ),
+    ]
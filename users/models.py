@@ -1,12 +1,12 @@
 from django.db import models
-from config import Config
+from choices import PLAN_CHOICES
 
 
 # this is a local mirror to what data is stored in auth0
 # we store auth0_id to link to the auth0 user
 class UserProfile(models.Model):
     auth0_id = models.CharField(max_length=100, unique=True, db_index=True)
-    plan = models.CharField(max_length=20, default="free", choices=Config.PLAN_CHOICES)
+    plan = models.CharField(max_length=20, default="free", choices=PLAN_CHOICES)
     email = models.EmailField(unique=True)
     name = models.CharField(max_length=100, blank=True)
     bio = models.TextField(blank=True)
@@ -21,3 +21,19 @@ class UserProfile(models.Model):
         verbose_name = "User Profile"
 
     verbose_name_plural = "User Profiles"
+
+
+# Pending storage_used deltas for heavy parallel uploaders, so concurrent confirms
+# update one of several rows instead of serializing on the profile row.
+class StorageUsageShard(models.Model):
+    profile = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="storage_shards"
+    )
+    shard = models.PositiveSmallIntegerField()
+    bytes = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.profile} shard {self.shard}: {self.bytes} bytes"
+
+    class Meta:
+        unique_together = ("profile", "shard")
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from rest_framework import exceptions
+from config import Config
+from .models import UserProfile
+
+
+# Maps an Auth0 `sub` to its local (User, UserProfile) pair. Resolved pairs are kept
+# in process for PRINCIPAL_CACHE_TTL seconds, and optionally their primary keys are
+# shared between workers through Django's cache framework, so the authenticator only
+# takes the get_or_create write path the first time a subject is seen.
+class PrincipalCache:
+    def __init__(
+        self,
+        ttl: int = Config.PRINCIPAL_CACHE_TTL,
+        max_size: int = Config.PRINCIPAL_CACHE_SIZE,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[Any, UserProfile, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sub: str) -> tuple[Any, UserProfile] | None:
+        with self._lock:
+            entry = self._entries.get(sub)
+            if entry is None:
+                return None
+            user, profile, cached_at = entry
+            if time.monotonic() - cached_at >= self.ttl:
+                del self._entries[sub]
+                return None
+            self._entries.move_to_end(sub)
+            return user, profile
+
+    def set(self, sub: str, user, profile: UserProfile) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[sub] = (user, profile, time.monotonic())
+            self._entries.move_to_end(sub)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, sub: str) -> None:
+        with self._lock:
+            self._entries.pop(sub, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+principals = PrincipalCache()
+
+
+def _shared_cache_key(sub: str) -> str:
+    return f"silo:principal:{sub}"
+
+
+def _load_shared(sub: str) -> tuple[Any, UserProfile] | None:
+    ids = cache.get(_shared_cache_key(sub))
+    if ids is None:
+        return None
+    user_id, profile_id = ids
+    User = get_user_model()
+    try:
+        return User.objects.get(pk=user_id), UserProfile.objects.get(pk=profile_id)
+    except (User.DoesNotExist, UserProfile.DoesNotExist):
+        cache.delete(_shared_cache_key(sub))
+        return None
+
+
+def _create_or_fetch(sub: str, claims: dict[str, Any]) -> tuple[Any, UserProfile]:
+    User = get_user_model()
+    email = claims.get("email", "")
+    try:
+        with transaction.atomic():
+            user, _ = User.objects.get_or_create(
+                username=sub,
+                defaults={
+                    "email": email,
+                },
+            )
+            profile, _ = UserProfile.objects.get_or_create(
+                auth0_id=sub,
+                defaults={
+                    # email is unique on the profile, tokens without one get a
+                    # placeholder
+                    "email": email or f"{sub}@users.silo.invalid",
+                    "name": claims.get("name", ""),
+                },
+            )
+    except IntegrityError:
+        # get_or_create already retried a concurrent creation of this sub, so the
+        # email belongs to another identity's profile
+        raise exceptions.AuthenticationFailed(
+            "Email is already used by another account"
+        ) from None
+    return user, profile
+
+
+def resolve_principal(sub: str, claims: dict[str, Any]) -> tuple[Any, UserProfile]:
+    resolved = principals.get(sub)
+    if resolved is not None:
+        return resolved
+
+    resolved = _load_shared(sub) if Config.PRINCIPAL_CACHE_SHARED else None
+    if resolved is None:
+        resolved = _create_or_fetch(sub, claims)
+        if Config.PRINCIPAL_CACHE_SHARED:
+            user, profile = resolved
+            cache.set(
+                _shared_cache_key(sub),
+                (user.pk, profile.pk),
+                Config.PRINCIPAL_CACHE_TTL,
+            )
+
+    principals.set(sub, *resolved)
+    return resolved
+
+
+def invalidate_principal(sub: str) -> None:
+    principals.discard(sub)
+    if Config.PRINCIPAL_CACHE_SHARED:
+        cache.delete(_shared_cache_key(sub))
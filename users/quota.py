@@ -0,0 +1,86 @@
+import random
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from config import Config
+from .models import StorageUsageShard, UserProfile
+
+
+# Storage accounting. Every change to a user's storage goes through charge(), an
+# atomic F() update, either on UserProfile.storage_used or, with
+# STORAGE_COUNTER_SHARDS > 0, on one of the user's shard rows picked at random.
+
+
+def charge(profile_id: int, delta: int) -> None:
+    if not delta:
+        return
+    if Config.STORAGE_COUNTER_SHARDS <= 0:
+        UserProfile.objects.filter(id=profile_id).update(
+            storage_used=F("storage_used") + delta
+        )
+        return
+
+    shard = random.randrange(Config.STORAGE_COUNTER_SHARDS)
+    shards = StorageUsageShard.objects.filter(profile_id=profile_id, shard=shard)
+    if shards.update(bytes=F("bytes") + delta):
+        return
+    try:
+        with transaction.atomic():
+            StorageUsageShard.objects.create(
+                profile_id=profile_id, shard=shard, bytes=delta
+            )
+    except IntegrityError:
+        # created concurrently, the row exists now
+        shards.update(bytes=F("bytes") + delta)
+
+
+def storage_used(profile_id: int) -> int:
+    used = (
+        UserProfile.objects.filter(id=profile_id)
+        .values_list("storage_used", flat=True)
+        .first()
+    ) or 0
+    pending = StorageUsageShard.objects.filter(profile_id=profile_id).aggregate(
+        total=Sum("bytes")
+    )["total"]
+    return used + (pending or 0)
+
+
+def quota_for(plan: str) -> int | None:
+    quota = Config.PLAN_QUOTAS.get(plan, 0)
+    return quota or None  # 0 means unlimited
+
+
+# Whether `additional` bytes fit in the user's plan. `reserved` is the size of uploads
+# that were started but not confirmed yet. The check isn't locked, so concurrent
+# requests can overshoot the quota by at most their own sizes.
+def has_room(profile: UserProfile, additional: int, reserved: int = 0) -> bool:
+    quota = quota_for(profile.plan)
+    if quota is None:
+        return True
+    return storage_used(profile.id) + reserved + additional <= quota
+
+
+# folds shard rows back into UserProfile.storage_used, returns the profiles touched
+def reconcile(batch_size: int = 500) -> int:
+    profile_ids = list(
+        StorageUsageShard.objects.exclude(bytes=0)
+        .values_list("profile_id", flat=True)
+        .distinct()[:batch_size]
+    )
+    for profile_id in profile_ids:
+        with transaction.atomic():
+            shards = list(
+                StorageUsageShard.objects.select_for_update().filter(
+                    profile_id=profile_id
+                )
+            )
+            for shard in shards:
+                if shard.bytes:
+                    StorageUsageShard.objects.filter(id=shard.id).update(
+                        bytes=F("bytes") - shard.bytes
+                    )
+            total = sum(shard.bytes for shard in shards)
+            UserProfile.objects.filter(id=profile_id).update(
+                storage_used=F("storage_used") + total
+            )
+    return len(profile_ids)
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import UserProfile
+from .principals import invalidate_principal
+
+
+# keep the resolved-principal cache from serving a changed or deleted profile
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile(sender, instance: UserProfile, **kwargs) -> None:
+    invalidate_principal(instance.auth0_id)
@@ -0,0 +1,74 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+from config import Config
+
+
+# Bounded LRU of verified JWT payloads, keyed by a digest of the raw token so the
+# bearer tokens themselves are never kept in memory. Entries live until the token's
+# `exp` claim; one instance is shared by every thread of a worker process.
+class VerifiedTokenCache:
+    PURGE_INTERVAL = 60  # seconds
+
+    def __init__(
+        self,
+        max_size: int = Config.AUTH0_TOKEN_CACHE_SIZE,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_size = max_size
+        self.clock = clock  # wall clock, `exp` is a unix timestamp
+        self._entries: OrderedDict[bytes, tuple[dict[str, Any], float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> dict[str, Any] | None:
+        key = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, token: str, payload: dict[str, Any]) -> None:
+        exp = payload.get("exp")
+        if self.max_size <= 0 or not isinstance(exp, (int, float)):
+            return  # tokens without an expiry are never cached
+        key = self._digest(token)
+        with self._lock:
+            self._entries[key] = (payload, float(exp))
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._purge_expired()
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)  # least recently used
+
+    def _purge_expired(self) -> None:
+        # a full scan, so run it at most once per PURGE_INTERVAL
+        now = self.clock()
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        expired = [k for k, (_, exp) in self._entries.items() if exp <= now]
+        for key in expired:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+verified_tokens = VerifiedTokenCache()
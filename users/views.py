@@ -21,9 +21,9 @@ class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request) -> Response:
-        auth0_id = request.user.sub
-        # sub is an attribute of the authenticated user object, typically set by Auth0. It represents the unique identifier for the user in Auth0. This value is used to look up the corresponding user profile in your database.
-
-        profile = UserProfile.objects.get(auth0_id=auth0_id)
+        # the profile is resolved from the token's `sub` claim by the authenticator and
+        # cached, read it again for current usage; from the primary, as the profile
+        # may have been created by this very request
+        profile: UserProfile = UserProfile.objects.get(pk=request.profile.pk)
         serializer = UserProfileSerializer(profile)
         return Response(serializer.data)